@@ -0,0 +1,211 @@
+"""Content-addressed cache of text embeddings, stored in SQLite.
+
+Vectors are keyed by (provider, model, sha256(text)) and stored as float32
+blobs, so an unchanged chunk is never sent to the embedding provider twice —
+not after an edit elsewhere in the note, not on `sync --force`, and not
+after the Qdrant collection is reset.
+
+The cache is bounded by size: `evict()` drops the least recently used
+entries until the stored vectors fit in `max_bytes`.
+
+QueryEmbeddingCache does the same for search queries, keyed by the
+normalised query string, with a time-to-live and an entry cap.
+"""
+
+import hashlib
+import re
+import sqlite3
+import time
+from array import array
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+
+DEFAULT_CACHE_MB = 512
+DEFAULT_QUERY_CACHE_ENTRIES = 1000
+DEFAULT_QUERY_CACHE_TTL_HOURS = 168  # One week
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 hex digest of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector: Sequence[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(blob: bytes) -> List[float]:
+    vec = array("f")
+    vec.frombytes(blob)
+    return vec.tolist()
+
+
+class EmbeddingCache:
+    """SQLite-backed LRU cache of embedding vectors."""
+
+    def __init__(self, path: Path, max_bytes: int = DEFAULT_CACHE_MB * 1024 * 1024):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (provider, model, text_hash)
+            ) WITHOUT ROWID
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_used)")
+        self._db.commit()
+
+    def get_many(self, provider: str, model: str,
+                 texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Look up vectors for texts; None where the text is not cached."""
+        hashes = [text_hash(t) for t in texts]
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(unique), 500):
+            part = unique[i:i + 500]
+            rows = self._db.execute(
+                f"SELECT text_hash, vector FROM embeddings "
+                f"WHERE provider = ? AND model = ? AND text_hash IN ({','.join('?' * len(part))})",
+                [provider, model, *part],
+            ).fetchall()
+            found.update((h, unpack_vector(blob)) for h, blob in rows)
+
+        if found:
+            now = time.time()
+            self._db.executemany(
+                "UPDATE embeddings SET last_used = ? "
+                "WHERE provider = ? AND model = ? AND text_hash = ?",
+                [(now, provider, model, h) for h in found],
+            )
+            self._db.commit()
+
+        results = [found.get(h) for h in hashes]
+        hit_count = sum(1 for r in results if r is not None)
+        self.hits += hit_count
+        self.misses += len(results) - hit_count
+        return results
+
+    def put_many(self, provider: str, model: str, texts: Sequence[str],
+                 vectors: Sequence[Optional[Sequence[float]]]):
+        """Store vectors for texts. Entries whose vector is None are skipped."""
+        now = time.time()
+        rows = [(provider, model, text_hash(t), pack_vector(v), now)
+                for t, v in zip(texts, vectors) if v is not None]
+        if rows:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings "
+                "(provider, model, text_hash, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+
+    def size_bytes(self) -> int:
+        row = self._db.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+        return row[0]
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the cache fits in max_bytes.
+
+        Returns the number of entries removed.
+        """
+        excess = self.size_bytes() - self.max_bytes
+        if excess <= 0:
+            return 0
+        freed = 0
+        doomed = []
+        cursor = self._db.execute(
+            "SELECT provider, model, text_hash, LENGTH(vector) FROM embeddings "
+            "ORDER BY last_used")
+        for provider, model, h, size in cursor:
+            doomed.append((provider, model, h))
+            freed += size
+            if freed >= excess:
+                break
+        cursor.close()
+        self._db.executemany(
+            "DELETE FROM embeddings WHERE provider = ? AND model = ? AND text_hash = ?",
+            doomed,
+        )
+        self._db.commit()
+        return len(doomed)
+
+    def close(self):
+        self._db.close()
+
+
+def normalise_query(query: str) -> str:
+    """Case-fold and collapse whitespace, so trivially different queries share a vector."""
+    return re.sub(r"\s+", " ", query).strip().casefold()
+
+
+class QueryEmbeddingCache:
+    """SQLite-backed LRU cache of query vectors with a time-to-live.
+
+    Entries older than `ttl_seconds` are ignored and purged; beyond
+    `max_entries` the least recently used are dropped.
+    """
+
+    def __init__(self, path: Path, max_entries: int = DEFAULT_QUERY_CACHE_ENTRIES,
+                 ttl_seconds: float = DEFAULT_QUERY_CACHE_TTL_HOURS * 3600):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS queries (
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                query TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (provider, model, query)
+            ) WITHOUT ROWID
+        """)
+        self._db.commit()
+
+    def get(self, provider: str, model: str, query: str) -> Optional[List[float]]:
+        """The cached vector for a query, or None if absent or expired."""
+        key = normalise_query(query)
+        now = time.time()
+        row = self._db.execute(
+            "SELECT vector FROM queries WHERE provider = ? AND model = ? AND query = ? "
+            "AND created >= ?",
+            (provider, model, key, now - self.ttl_seconds)).fetchone()
+        if row is None:
+            return None
+        self._db.execute(
+            "UPDATE queries SET last_used = ? WHERE provider = ? AND model = ? AND query = ?",
+            (now, provider, model, key))
+        self._db.commit()
+        return unpack_vector(row[0])
+
+    def put(self, provider: str, model: str, query: str, vector: Sequence[float]):
+        """Store a query vector, then drop expired and least recently used entries."""
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO queries (provider, model, query, vector, created, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (provider, model, normalise_query(query), pack_vector(vector), now, now))
+        self._db.execute("DELETE FROM queries WHERE created < ?", (now - self.ttl_seconds,))
+        self._db.execute(
+            "DELETE FROM queries WHERE (provider, model, query) IN ("
+            "SELECT provider, model, query FROM queries "
+            "ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,319 @@
+"""Asynchronous embedding providers with adaptive batching and rate limiting.
+
+Every provider implements one coroutine, `embed_batch(texts)`, that embeds a
+single batch. AsyncEmbedder drives a provider: it cuts the input into
+batches, keeps up to `concurrency` of them in flight, halves a batch that
+fails until the bad text is isolated, and records the latency of every
+request. Only a provider's per-input errors are split that way: when the
+provider itself is unreachable (EmbeddingUnavailable) the whole call fails
+at once.
+
+The batch size adapts as it goes. It shrinks when a request fails or takes
+longer than the target latency and grows back (up to its ceiling) while
+requests are fast, so a model that slows down under load is not buried in
+time-outs. Remote providers can also be held to a request rate with a
+token bucket.
+
+Blocking work (an HTTP request, a sentence-transformers encode) runs in a
+worker thread, so the event loop only schedules.
+"""
+
+import abc
+import asyncio
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from http_pool import HTTPConnectError, HTTPStatusError, get_pool
+
+
+DEFAULT_TARGET_LATENCY = 10.0   # seconds; slower batches shrink the batch size
+OLLAMA_TIMEOUT = 120            # seconds per /api/embed request
+
+Vector = List[float]
+
+
+class EmbeddingError(RuntimeError):
+    """Some texts could not be embedded.
+
+    `vectors` holds one entry per input text: the vector, or None for each
+    text that failed on its own. `errors` maps those indexes to the error.
+    """
+
+    def __init__(self, message: str, vectors: List[Optional[Vector]],
+                 errors: Dict[int, Exception]):
+        super().__init__(message)
+        self.vectors = vectors
+        self.errors = errors
+
+
+class EmbeddingUnavailable(RuntimeError):
+    """The embedding service cannot be used: it is unreachable, timed out or failing.
+
+    Retrying smaller batches cannot help, so the embedder stops at the first
+    one instead of splitting, and sync aborts rather than skipping every note.
+    """
+
+
+# ── Flow control ──────────────────────────────────────────────────────────
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, in bursts of up to `burst`.
+
+    Thread-safe, so one bucket can pace every event loop that shares a
+    provider.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Take a token if one is available; otherwise return the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+class AdaptiveBatchSize:
+    """Batch size tuned by additive increase, multiplicative decrease.
+
+    A failed batch halves the size; a batch slower than `target_latency`
+    cuts it by a quarter. A full-size batch that finishes in time grows it
+    by `step`, never past `maximum`.
+    """
+
+    def __init__(self, initial: int, maximum: Optional[int] = None, minimum: int = 1,
+                 target_latency: float = DEFAULT_TARGET_LATENCY):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum or initial)
+        self.size = min(max(self.minimum, initial), self.maximum)
+        self.step = max(1, self.size // 4)
+        self.target_latency = target_latency
+        self._lock = threading.Lock()
+
+    def record(self, size: int, latency: float, ok: bool):
+        with self._lock:
+            if not ok:
+                self.size = max(self.minimum, min(self.size, size // 2))
+            elif latency > self.target_latency:
+                self.size = max(self.minimum, min(self.size, size * 3 // 4))
+            elif size >= self.size:
+                self.size = min(self.maximum, self.size + self.step)
+
+
+# ── Providers ─────────────────────────────────────────────────────────────
+
+class EmbeddingProvider(abc.ABC):
+    """Embeds one batch of texts per call.
+
+    `max_concurrency` caps the batches in flight whatever the embedder is
+    configured with (None = no cap); `remote` providers are rate limited.
+    """
+
+    name = ""
+    model = ""
+    max_concurrency: Optional[int] = None
+    remote = False
+
+    @abc.abstractmethod
+    async def embed_batch(self, texts: List[str]) -> List[Vector]:
+        """Vectors for `texts`, in order."""
+
+
+class OllamaProvider(EmbeddingProvider):
+    """Ollama's /api/embed endpoint, over the shared keep-alive pool."""
+
+    name = "ollama"
+    remote = True
+
+    def __init__(self, url: str, model: str, timeout: float = OLLAMA_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+
+    def _request(self, texts: List[str]) -> List[Vector]:
+        payload = json.dumps({"model": self.model, "input": texts}).encode()
+        try:
+            body = get_pool().request("POST", f"{self.url}/api/embed", body=payload,
+                                      headers={"Content-Type": "application/json"},
+                                      timeout=self.timeout)
+            vectors = json.loads(body)["embeddings"]
+        except HTTPStatusError as e:
+            error_body = e.body.decode(errors="replace")
+            message = f"Ollama embedding failed ({e.status}): {error_body}"
+            # Rejected input (bad request, over the model's context): worth splitting
+            if e.status < 500 or "context length" in error_body:
+                raise RuntimeError(message) from e
+            raise EmbeddingUnavailable(message) from e
+        except HTTPConnectError as e:
+            raise EmbeddingUnavailable(
+                f"Cannot reach Ollama at {self.url}: {e.reason}\n"
+                "Is Ollama running? Start with: ollama serve") from e
+        except (ValueError, KeyError, IndexError) as e:
+            raise EmbeddingUnavailable(f"Ollama embedding failed: {e}") from e
+        if len(vectors) != len(texts):
+            raise RuntimeError(f"Ollama embedding failed: expected {len(texts)} vectors, "
+                               f"got {len(vectors)}")
+        return vectors
+
+    async def embed_batch(self, texts: List[str]) -> List[Vector]:
+        return await asyncio.to_thread(self._request, texts)
+
+
+class SentenceTransformersProvider(EmbeddingProvider):
+    """A local sentence-transformers model.
+
+    `encode` does the blocking work (loading the model once, and using a
+    multi-process pool for large inputs). One encode runs at a time: it
+    already keeps every core busy.
+    """
+
+    name = "sentence-transformers"
+    max_concurrency = 1
+
+    def __init__(self, model: str, encode: Callable[[List[str]], List[Vector]]):
+        self.model = model
+        self._encode = encode
+
+    async def embed_batch(self, texts: List[str]) -> List[Vector]:
+        return await asyncio.to_thread(self._encode, texts)
+
+
+# ── Embedder ──────────────────────────────────────────────────────────────
+
+class AsyncEmbedder:
+    """Embed texts through a provider with bounded concurrency.
+
+    Args:
+        provider: The EmbeddingProvider to call.
+        batch_size: Starting texts per batch.
+        max_batch_size: Ceiling for the adaptive batch size (default batch_size).
+        concurrency: Batches in flight at once.
+        target_latency: Seconds per batch above which the batch size shrinks.
+        rate_limit: Requests per second for remote providers (0 = unlimited).
+        on_batch: Called with the metrics dict of every batch sent.
+    """
+
+    def __init__(self, provider: EmbeddingProvider, batch_size: int = 32,
+                 max_batch_size: Optional[int] = None, concurrency: int = 2,
+                 target_latency: float = DEFAULT_TARGET_LATENCY, rate_limit: float = 0.0,
+                 on_batch: Optional[Callable[[Dict], None]] = None):
+        self.provider = provider
+        concurrency = max(1, concurrency)
+        self.concurrency = min(concurrency, provider.max_concurrency or concurrency)
+        self.batching = AdaptiveBatchSize(batch_size, max_batch_size,
+                                          target_latency=target_latency)
+        self.limiter = (TokenBucket(rate_limit, burst=self.concurrency)
+                        if rate_limit > 0 and provider.remote else None)
+        self.on_batch = on_batch
+        self.metrics: List[Dict] = []
+        self._metrics_lock = threading.Lock()
+
+    async def _send(self, texts: Sequence[str]) -> Tuple[Optional[List[Vector]],
+                                                          Optional[Exception]]:
+        if self.limiter:
+            await self.limiter.acquire()
+        started = time.monotonic()
+        try:
+            vectors, error = await self.provider.embed_batch(list(texts)), None
+        except Exception as e:
+            vectors, error = None, e
+        latency = time.monotonic() - started
+        self.batching.record(len(texts), latency, error is None)
+        metric = {"provider": self.provider.name, "size": len(texts),
+                  "latency_ms": round(latency * 1000, 1), "ok": error is None,
+                  "next_batch_size": self.batching.size}
+        with self._metrics_lock:
+            self.metrics.append(metric)
+        if self.on_batch:
+            self.on_batch(metric)
+        return vectors, error
+
+    async def embed(self, texts: Sequence[str]) -> Tuple[List[Optional[Vector]],
+                                                          List[Tuple[int, Exception]]]:
+        """Embed texts; return vectors in input order and the (index, error) of failures.
+
+        Failed batches are split in half and retried, depth first, so a
+        single bad text costs a handful of requests and gets None. An
+        EmbeddingUnavailable error stops every worker and is raised.
+        """
+        results: List[Optional[Vector]] = [None] * len(texts)
+        errors: List[Tuple[int, Exception]] = []
+        retry: List[Tuple[int, int]] = []   # Halves of failed batches, next on top
+        cursor = 0
+        unavailable: Optional[EmbeddingUnavailable] = None
+
+        async def worker():
+            nonlocal cursor, unavailable
+            while True:
+                if unavailable is not None:
+                    return
+                if retry:
+                    start, end = retry.pop()
+                elif cursor < len(texts):
+                    start, end = cursor, min(len(texts), cursor + self.batching.size)
+                    cursor = end
+                else:
+                    return
+                vectors, error = await self._send(texts[start:end])
+                if error is None:
+                    results[start:end] = vectors
+                elif isinstance(error, EmbeddingUnavailable):
+                    unavailable = unavailable or error
+                elif end - start > 1:
+                    mid = (start + end) // 2
+                    retry.extend([(mid, end), (start, mid)])
+                else:
+                    errors.append((start, error))
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        if unavailable is not None:
+            raise unavailable
+        errors.sort(key=lambda e: e[0])
+        return results, errors
+
+    def embed_sync(self, texts: Sequence[str]) -> List[Vector]:
+        """Embed texts from synchronous code.
+
+        Raises EmbeddingError if some texts fail, and EmbeddingUnavailable if
+        the provider cannot be used at all.
+        """
+        if not texts:
+            return []
+        results, errors = asyncio.run(self.embed(texts))
+        if errors:
+            raise EmbeddingError(str(errors[0][1]), results, dict(errors))
+        return results
+
+    def latency_summary(self, since: int = 0) -> Dict[str, float]:
+        """Batch count, failures and latency percentiles (ms) of metrics[since:]."""
+        with self._metrics_lock:
+            metrics = self.metrics[since:]
+        latencies = sorted(m["latency_ms"] for m in metrics)
+        failed = sum(1 for m in metrics if not m["ok"])
+        if not latencies:
+            return {"batches": 0, "failed": 0}
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {"batches": len(latencies), "failed": failed,
+                "p50_ms": percentile(0.5), "p95_ms": percentile(0.95),
+                "max_ms": latencies[-1], "batch_size": self.batching.size}
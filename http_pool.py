@@ -0,0 +1,170 @@
+"""Pooled HTTP/1.1 keep-alive client built on http.client (stdlib only).
+
+Shared by the Qdrant REST client and the Ollama embedding provider so that
+batches, scroll pages and searches reuse open TCP (and TLS) connections
+instead of paying a fresh handshake per call.
+
+Each host gets at most `max_per_host` concurrent connections. Idle
+connections are kept for reuse; a connection the server has quietly closed
+is replaced transparently. Connection failures and 429/502/503/504 replies
+are retried with exponential backoff; timeouts are not.
+"""
+
+import http.client
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+DEFAULT_MAX_PER_HOST = 4
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5          # seconds; doubles on each retry
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class HTTPStatusError(Exception):
+    """The server replied with an error status (>= 400)."""
+
+    def __init__(self, status: int, body: bytes):
+        self.status = status
+        self.body = body
+        super().__init__(f"HTTP {status}: {body.decode(errors='replace')}")
+
+
+class HTTPConnectError(Exception):
+    """The server could not be reached (refused, reset, DNS failure, ...)."""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        super().__init__(reason)
+
+
+# Errors that mean a reused keep-alive socket was closed by the server
+_STALE_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError,
+                 ConnectionResetError, ConnectionAbortedError)
+
+
+class ConnectionPool:
+    """Thread-safe pool of keep-alive connections, keyed by (scheme, host, port)."""
+
+    def __init__(self, max_per_host: int = DEFAULT_MAX_PER_HOST,
+                 retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF):
+        self.max_per_host = max(1, max_per_host)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._idle = defaultdict(list)   # key -> [HTTPConnection]
+        self._slots = {}                 # key -> BoundedSemaphore
+        self.connections_opened = 0      # For diagnostics and tests
+
+    def _slot(self, key: Tuple) -> threading.BoundedSemaphore:
+        with self._lock:
+            if key not in self._slots:
+                self._slots[key] = threading.BoundedSemaphore(self.max_per_host)
+            return self._slots[key]
+
+    def _checkout(self, key: Tuple, timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        """Return (connection, reused). Caller must hold a slot for `key`."""
+        with self._lock:
+            idle = self._idle[key]
+            if idle:
+                conn = idle.pop()
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+            self.connections_opened += 1
+        scheme, host, port = key
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=timeout), False
+
+    def _checkin(self, key: Tuple, conn: http.client.HTTPConnection):
+        with self._lock:
+            self._idle[key].append(conn)
+
+    def request(self, method: str, url: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None,
+                timeout: float = 30) -> bytes:
+        """Send a request and return the response body.
+
+        Raises HTTPStatusError for error statuses and HTTPConnectError when
+        the server cannot be reached after all retries.
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        target = parts.path or "/"
+        if parts.query:
+            target += f"?{parts.query}"
+
+        attempt = 0
+        while True:
+            try:
+                status, data = self._send(key, method, target, body, headers or {}, timeout)
+            except TimeoutError as e:
+                # Not retried: the server is up but slow, and waiting again rarely helps
+                raise HTTPConnectError(f"timed out after {timeout}s") from e
+            except OSError as e:
+                if attempt >= self.retries:
+                    raise HTTPConnectError(str(e) or e.__class__.__name__) from e
+            else:
+                if status < 400:
+                    return data
+                if status not in RETRY_STATUSES or attempt >= self.retries:
+                    raise HTTPStatusError(status, data)
+            time.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+    def _send(self, key: Tuple, method: str, target: str, body: Optional[bytes],
+              headers: Dict[str, str], timeout: float) -> Tuple[int, bytes]:
+        slot = self._slot(key)
+        with slot:
+            while True:
+                conn, reused = self._checkout(key, timeout)
+                try:
+                    conn.request(method, target, body=body, headers=headers)
+                    resp = conn.getresponse()
+                    data = resp.read()
+                except _STALE_ERRORS:
+                    conn.close()
+                    if reused:
+                        continue  # Server dropped an idle connection; open a new one
+                    raise
+                except (OSError, http.client.HTTPException) as e:
+                    conn.close()
+                    if isinstance(e, OSError):
+                        raise
+                    raise ConnectionError(str(e)) from e
+                if resp.will_close:
+                    conn.close()
+                else:
+                    self._checkin(key, conn)
+                return resp.status, data
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle.clear()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide pool, creating it from env settings on first use."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ConnectionPool(
+                max_per_host=int(os.getenv("NOTES_EXPORT_HTTP_MAX_CONNECTIONS",
+                                           str(DEFAULT_MAX_PER_HOST))),
+                retries=int(os.getenv("NOTES_EXPORT_HTTP_RETRIES", str(DEFAULT_RETRIES))),
+            )
+        return _default_pool
@@ -0,0 +1,504 @@
+"""Embedded local vector index: a Qdrant-free backend for AI search.
+
+Implements the part of the QdrantHTTP interface this project uses
+(collections, upsert, delete, set_payload, search, scroll, count) on files
+in a local directory, so `--ai-search` works without Docker or a server.
+Select it with NOTES_EXPORT_VECTOR_BACKEND=local.
+
+Each collection is a directory holding:
+    vectors.npy    memory-mapped float32/float16 matrix, one L2-normalised row per point
+    points.sqlite  point id -> row number and JSON payload
+    meta.json      dimension, dtype, row count (rechecked against points.sqlite on open)
+    ivf.npz        approximate index, only above `ann_threshold` points
+
+Search is exact, vectorised cosine similarity over the matrix. Once a
+collection reaches `ann_threshold` points an inverted-file (IVF) index is
+built: rows are grouped by their nearest k-means centroid and a query only
+scores the `nprobe` closest groups.
+
+Requires numpy (pip install numpy).
+"""
+
+import json
+import math
+import re
+import shutil
+import sqlite3
+import threading
+from functools import wraps
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - checked when the backend is created
+    np = None
+
+
+DEFAULT_DTYPE = "float32"
+DEFAULT_ANN_THRESHOLD = 50000    # points before the IVF index is used
+DEFAULT_NPROBE = 16              # IVF lists scored per query
+INITIAL_CAPACITY = 1024          # rows allocated when a collection is created
+SEARCH_BLOCK_ROWS = 65536        # rows scored per matrix multiply
+
+
+def _field_expr(key: str) -> str:
+    if not re.fullmatch(r"\w+", key):
+        raise ValueError(f"Unsupported payload key: {key!r}")
+    return f"json_extract(payload, '$.{key}')"
+
+
+def _filter_sql(query_filter: Dict) -> Tuple[str, List]:
+    """Translate the subset of Qdrant filters used here into an SQL condition.
+
+    Supports a "must" list of match-value, match-any and range conditions.
+    """
+    clauses, params = [], []
+    for condition in query_filter.get("must", []):
+        expr = _field_expr(condition["key"])
+        if "match" in condition:
+            match = condition["match"]
+            if "any" in match:
+                clauses.append(f"{expr} IN ({','.join('?' * len(match['any']))})")
+                params.extend(match["any"])
+            else:
+                clauses.append(f"{expr} = ?")
+                params.append(match["value"])
+        elif "range" in condition:
+            for op, sql_op in (("gt", ">"), ("gte", ">="), ("lt", "<"), ("lte", "<=")):
+                if op in condition["range"]:
+                    clauses.append(f"{expr} {sql_op} ?")
+                    params.append(condition["range"][op])
+        else:
+            raise ValueError(f"Unsupported filter condition: {condition}")
+    return " AND ".join(clauses) or "1", params
+
+
+def _locked(method):
+    """Run a _Collection method under the collection's lock.
+
+    Sync upserts from a thread pool while it records batches (payload
+    updates, deletions) on the main thread, and all of them share one SQLite
+    connection, the memmap and the row count.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _write_meta(path: Path, meta: Dict):
+    """Replace meta.json atomically so a crash never leaves it half-written."""
+    tmp = path / "meta.json.tmp"
+    tmp.write_text(json.dumps(meta))
+    tmp.replace(path / "meta.json")
+
+
+def _normalise(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class _Collection:
+    """One collection's files, opened for reading and writing."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.RLock()
+        self.meta = json.loads((path / "meta.json").read_text())
+        self.dim = self.meta["dim"]
+        self.dtype = np.dtype(self.meta["dtype"])
+        self.vectors = np.load(path / "vectors.npy", mmap_mode="r+")
+        self.db = sqlite3.connect(str(path / "points.sqlite"), check_same_thread=False)
+        # Rows are dense, so the committed points table is the source of truth:
+        # meta.json lags it if a write stopped between the two
+        self.meta["rows"] = self.db.execute("SELECT COUNT(*) FROM points").fetchone()[0]
+        self.centroids = None
+        self.assign = None
+        ivf_path = path / "ivf.npz"
+        if ivf_path.exists():
+            with np.load(ivf_path) as ivf:
+                self.centroids = ivf["centroids"]
+                self.assign = ivf["assign"]
+
+    @classmethod
+    def create(cls, path: Path, dim: int, dtype: str,
+               metadata: Optional[Dict] = None) -> "_Collection":
+        path.mkdir(parents=True, exist_ok=True)
+        np.lib.format.open_memmap(path / "vectors.npy", mode="w+", dtype=dtype,
+                                  shape=(INITIAL_CAPACITY, dim)).flush()
+        db = sqlite3.connect(str(path / "points.sqlite"))
+        db.execute("CREATE TABLE IF NOT EXISTS points ("
+                   "id INTEGER PRIMARY KEY, row INTEGER NOT NULL UNIQUE, payload TEXT NOT NULL)")
+        db.commit()
+        db.close()
+        _write_meta(path, {"dim": dim, "dtype": dtype, "rows": 0, "metadata": metadata or {}})
+        return cls(path)
+
+    @property
+    def rows(self) -> int:
+        return self.meta["rows"]
+
+    def _save_meta(self):
+        _write_meta(self.path, self.meta)
+
+    def _ensure_capacity(self, needed: int):
+        capacity = self.vectors.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        tmp = self.path / "vectors.tmp.npy"
+        grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=self.dtype,
+                                          shape=(new_capacity, self.dim))
+        grown[:self.rows] = self.vectors[:self.rows]
+        grown.flush()
+        del grown
+        self.vectors = None
+        tmp.replace(self.path / "vectors.npy")
+        self.vectors = np.load(self.path / "vectors.npy", mmap_mode="r+")
+
+    # ── Writes ──
+
+    @_locked
+    def upsert(self, points: List[Dict]):
+        if not points:
+            return
+        # Last write wins for duplicate ids within one call, as in Qdrant
+        by_id = {int(p["id"]): p for p in points}
+        ids = list(by_id)
+        matrix = np.asarray([by_id[i]["vector"] for i in ids], dtype=np.float32)
+        if matrix.shape[1] != self.dim:
+            raise RuntimeError(f"Vector dimension {matrix.shape[1]} does not match "
+                               f"collection dimension {self.dim}")
+        matrix = _normalise(matrix)
+
+        existing = self._rows_for_ids(ids)
+        new_ids = [i for i in ids if i not in existing]
+        self._ensure_capacity(self.rows + len(new_ids))
+        for offset, point_id in enumerate(new_ids):
+            existing[point_id] = self.rows + offset
+        rows = np.asarray([existing[i] for i in ids])
+        self.vectors[rows] = matrix.astype(self.dtype)
+
+        self.db.executemany(
+            "INSERT OR REPLACE INTO points (id, row, payload) VALUES (?, ?, ?)",
+            [(i, existing[i], json.dumps(by_id[i].get("payload", {}))) for i in ids])
+        self.meta["rows"] += len(new_ids)
+        if self.centroids is not None:
+            self._grow_assign()
+            self.assign[rows] = self._nearest_centroid(matrix)
+        self._commit()
+
+    @_locked
+    def delete(self, ids: List[int]):
+        """Delete points, moving the last row into each freed slot to stay dense."""
+        for point_id in ids:
+            found = self.db.execute("SELECT row FROM points WHERE id = ?",
+                                    (int(point_id),)).fetchone()
+            if not found:
+                continue
+            row, last = found[0], self.rows - 1
+            self.db.execute("DELETE FROM points WHERE id = ?", (int(point_id),))
+            if row != last:
+                self.vectors[row] = self.vectors[last]
+                self.db.execute("UPDATE points SET row = ? WHERE row = ?", (row, last))
+                if self.assign is not None:
+                    self.assign[row] = self.assign[last]
+            self.meta["rows"] -= 1
+        self._commit()
+
+    @_locked
+    def set_payload(self, payload: Dict, ids: List[int]):
+        for point_id in ids:
+            found = self.db.execute("SELECT payload FROM points WHERE id = ?",
+                                    (int(point_id),)).fetchone()
+            if found:
+                merged = {**json.loads(found[0]), **payload}
+                self.db.execute("UPDATE points SET payload = ? WHERE id = ?",
+                                (json.dumps(merged), int(point_id)))
+        self.db.commit()
+
+    @_locked
+    def _commit(self):
+        self.vectors.flush()
+        self.db.commit()
+        self._save_meta()
+        if self.assign is not None:
+            self._save_ivf()
+
+    # ── Reads ──
+
+    def _rows_for_ids(self, ids: List[int]) -> Dict[int, int]:
+        found = {}
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            found.update(self.db.execute(
+                f"SELECT id, row FROM points WHERE id IN ({','.join('?' * len(part))})", part))
+        return found
+
+    def _points_for_rows(self, rows: List[int]) -> Dict[int, Tuple[int, Dict]]:
+        found = {}
+        for i in range(0, len(rows), 500):
+            part = rows[i:i + 500]
+            for point_id, row, payload in self.db.execute(
+                    f"SELECT id, row, payload FROM points WHERE row IN ({','.join('?' * len(part))})",
+                    part):
+                found[row] = (point_id, json.loads(payload))
+        return found
+
+    def _score_rows(self, query, rows=None):
+        """Cosine scores for the given rows (all live rows if None), block by block."""
+        if rows is None:
+            blocks = [self.vectors[start:min(start + SEARCH_BLOCK_ROWS, self.rows)]
+                      for start in range(0, self.rows, SEARCH_BLOCK_ROWS)]
+        else:
+            blocks = [self.vectors[rows[start:start + SEARCH_BLOCK_ROWS]]
+                      for start in range(0, len(rows), SEARCH_BLOCK_ROWS)]
+        if not blocks:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate([block.astype(np.float32) @ query for block in blocks])
+
+    def _scored(self, vector: List[float], ann_threshold: int, nprobe: int,
+                query_filter: Optional[Dict]):
+        """Scores for the candidate rows and the rows they belong to (None means all rows)."""
+        query = _normalise(np.asarray([vector], dtype=np.float32))[0]
+        candidates = None
+        if query_filter:
+            # Score only the rows the filter allows (exactly, no IVF probing)
+            where, params = _filter_sql(query_filter)
+            candidates = np.asarray(
+                sorted(row for (row,) in self.db.execute(
+                    f"SELECT row FROM points WHERE {where}", params)), dtype=np.int64)
+        elif self.rows >= ann_threshold:
+            self._ensure_ivf()
+            probes = np.argsort(self.centroids @ query)[::-1][:nprobe]
+            candidates = np.nonzero(np.isin(self.assign[:self.rows], probes))[0]
+        return self._score_rows(query, candidates), candidates
+
+    def _hits(self, scores, candidates, k: int, score_threshold: float) -> List[Dict]:
+        """The k best-scoring points, best first."""
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if score_threshold > 0:
+            top = top[scores[top] >= score_threshold]
+        rows = [int(candidates[t]) if candidates is not None else int(t) for t in top]
+        points = self._points_for_rows(rows)
+        return [{"id": points[row][0], "score": float(scores[t]), "payload": points[row][1]}
+                for t, row in zip(top, rows) if row in points]
+
+    @_locked
+    def search(self, vector: List[float], limit: int, score_threshold: float,
+               ann_threshold: int, nprobe: int,
+               query_filter: Optional[Dict] = None, offset: int = 0) -> List[Dict]:
+        if self.rows == 0 or limit <= 0:
+            return []
+        scores, candidates = self._scored(vector, ann_threshold, nprobe, query_filter)
+        return self._hits(scores, candidates, offset + limit, score_threshold)[offset:]
+
+    @_locked
+    def search_groups(self, vector: List[float], limit: int, group_by: str,
+                      score_threshold: float, ann_threshold: int, nprobe: int,
+                      query_filter: Optional[Dict] = None) -> List[Dict]:
+        """Best point for each of the top `limit` distinct `group_by` payload values.
+
+        Widens the candidate pool until enough groups are found or every
+        candidate has been seen; points without the field are skipped.
+        """
+        if self.rows == 0 or limit <= 0:
+            return []
+        scores, candidates = self._scored(vector, ann_threshold, nprobe, query_filter)
+        k = limit * 4
+        while True:
+            hits = self._hits(scores, candidates, k, score_threshold)
+            groups = {}
+            for hit in hits:
+                key = hit["payload"].get(group_by)
+                if key is not None and key not in groups:
+                    groups[key] = hit
+                    if len(groups) == limit:
+                        break
+            if len(groups) == limit or k >= len(scores) or len(hits) < k:
+                return list(groups.values())
+            k *= 4
+
+    @_locked
+    def scroll(self, limit: int, offset: Optional[int], with_payload: Union[bool, List[str]],
+               with_vector: bool) -> Tuple[List[Dict], Optional[int]]:
+        columns = "id, row, payload" if with_payload else "id, row, NULL"
+        rows = self.db.execute(
+            f"SELECT {columns} FROM points WHERE id >= ? ORDER BY id LIMIT ?",
+            (int(offset) if offset is not None else -(2 ** 63), limit + 1)).fetchall()
+        next_offset = rows[limit][0] if len(rows) > limit else None
+        points = []
+        for point_id, row, payload in rows[:limit]:
+            point = {"id": point_id}
+            if with_payload:
+                point["payload"] = json.loads(payload)
+                if isinstance(with_payload, list):
+                    point["payload"] = {k: v for k, v in point["payload"].items()
+                                        if k in with_payload}
+            if with_vector:
+                point["vector"] = self.vectors[row].astype(np.float32).tolist()
+            points.append(point)
+        return points, next_offset
+
+    @_locked
+    def payload_indexes(self) -> List[str]:
+        names = self.db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'payload_%'")
+        return [name[len("payload_"):] for (name,) in names]
+
+    @_locked
+    def create_payload_index(self, field: str):
+        self.db.execute(f'CREATE INDEX IF NOT EXISTS "payload_{field}" '
+                        f"ON points ({_field_expr(field)})")
+        self.db.commit()
+
+    # ── Approximate index ──
+
+    def _ensure_ivf(self):
+        """Build the IVF index if missing, or rebuild it once the collection has doubled."""
+        if self.centroids is not None and self.rows <= 2 * self.meta.get("ivf_rows", 0):
+            return
+        nlist = max(1, min(4096, int(math.sqrt(self.rows))))
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(self.rows, size=min(self.rows, nlist * 40),
+                                         replace=False))
+        sample = self.vectors[sample_rows].astype(np.float32)
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+        for _ in range(8):  # Spherical k-means
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _normalise(centroids)
+
+        self.centroids = centroids
+        self.assign = np.zeros(self.vectors.shape[0], dtype=np.int32)
+        for start in range(0, self.rows, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, self.rows)
+            self.assign[start:end] = self._nearest_centroid(
+                self.vectors[start:end].astype(np.float32))
+        self.meta["ivf_rows"] = self.rows
+        self._save_meta()
+        self._save_ivf()
+
+    def _nearest_centroid(self, matrix):
+        return np.argmax(matrix @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _grow_assign(self):
+        if len(self.assign) < self.vectors.shape[0]:
+            grown = np.zeros(self.vectors.shape[0], dtype=np.int32)
+            grown[:len(self.assign)] = self.assign
+            self.assign = grown
+
+    def _save_ivf(self):
+        with open(self.path / "ivf.npz", "wb") as f:
+            np.savez(f, centroids=self.centroids, assign=self.assign)
+
+    @_locked
+    def close(self):
+        self.db.close()
+        self.vectors = None
+
+
+class LocalVectorIndex:
+    """Drop-in replacement for QdrantHTTP that stores collections on local disk."""
+
+    def __init__(self, directory: Path, dtype: str = DEFAULT_DTYPE,
+                 ann_threshold: int = DEFAULT_ANN_THRESHOLD, nprobe: int = DEFAULT_NPROBE):
+        if np is None:
+            raise ImportError(
+                "numpy is required for the local vector backend. "
+                "Install with: pip install numpy"
+            )
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported local vector dtype: {dtype}")
+        self.directory = Path(directory)
+        self.url = f"local:{self.directory}"
+        self.dtype = dtype
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+        self._collections: Dict[str, _Collection] = {}
+
+    def _collection(self, name: str) -> _Collection:
+        if name not in self._collections:
+            if not self.collection_exists(name):
+                raise RuntimeError(f"Local collection '{name}' does not exist")
+            self._collections[name] = _Collection(self.directory / name)
+        return self._collections[name]
+
+    def collection_exists(self, name: str) -> bool:
+        return (self.directory / name / "meta.json").exists()
+
+    def create_collection(self, name: str, vector_size: int,
+                          metadata: Optional[Dict] = None, **kwargs):
+        # Qdrant storage options (quantization, on_disk, HNSW) do not apply here
+        self.delete_collection(name)
+        self._collections[name] = _Collection.create(self.directory / name,
+                                                     vector_size, self.dtype, metadata)
+
+    def collection_metadata(self, name: str) -> Dict:
+        """Metadata stored at creation, plus the vector `dimension`."""
+        collection = self._collection(name)
+        return {**collection.meta.get("metadata", {}), "dimension": collection.dim}
+
+    def delete_collection(self, name: str):
+        if name in self._collections:
+            self._collections.pop(name).close()
+        shutil.rmtree(self.directory / name, ignore_errors=True)
+
+    def upsert_points(self, collection: str, points: List[Dict], wait: bool = True):
+        # Writes are synchronous, so there is nothing to wait for
+        self._collection(collection).upsert(points)
+
+    def get_indexing_threshold(self, collection: str) -> Optional[int]:
+        return None
+
+    def set_indexing_threshold(self, collection: str, threshold: Optional[int]):
+        # The IVF index is built lazily at search time, so loads never pay for it
+        pass
+
+    def delete_points(self, collection: str, ids: List[Any]):
+        if ids:
+            self._collection(collection).delete([int(i) for i in ids])
+
+    def set_payload(self, collection: str, payload: Dict, ids: List[int]):
+        if ids:
+            self._collection(collection).set_payload(payload, ids)
+
+    def search(self, collection: str, vector: List[float], limit: int = 10,
+               score_threshold: float = 0.0,
+               query_filter: Optional[Dict] = None, offset: int = 0) -> List[Dict]:
+        return self._collection(collection).search(vector, limit, score_threshold,
+                                                   self.ann_threshold, self.nprobe,
+                                                   query_filter, offset)
+
+    def search_groups(self, collection: str, vector: List[float], limit: int = 10,
+                      group_by: str = "note_id", score_threshold: float = 0.0,
+                      query_filter: Optional[Dict] = None) -> List[Dict]:
+        return self._collection(collection).search_groups(vector, limit, group_by,
+                                                          score_threshold,
+                                                          self.ann_threshold, self.nprobe,
+                                                          query_filter)
+
+    def payload_indexes(self, collection: str) -> Set[str]:
+        return set(self._collection(collection).payload_indexes())
+
+    def create_payload_index(self, collection: str, field: str, schema: str):
+        # SQLite expression indexes are untyped, so the schema is not needed
+        self._collection(collection).create_payload_index(field)
+
+    def count(self, collection: str) -> int:
+        return self._collection(collection).rows
+
+    def scroll(self, collection: str, limit: int = 100, offset: Optional[int] = None,
+               with_payload: Union[bool, List[str]] = True,
+               with_vector: bool = False) -> Tuple:
+        return self._collection(collection).scroll(limit, offset, with_payload, with_vector)
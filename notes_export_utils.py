@@ -71,10 +71,16 @@ class NotesExportTracker:
             return {}
     
     def save_notebook_data(self, json_file_path: str, data: Dict[str, Any]):
-        """Save notebook data to JSON file"""
+        """Save notebook data to JSON file.
+
+        Written to a temporary file and renamed into place, so an interrupted
+        save never leaves a truncated tracking file behind.
+        """
+        tmp_path = f"{json_file_path}.tmp"
         try:
-            with open(json_file_path, 'w', encoding='utf-8') as f:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, json_file_path)
         except Exception as e:
             print(f"Error saving notebook data to {json_file_path}: {e}")
     
@@ -6,17 +6,39 @@ and semantic search via embeddings.
 Supports Ollama (local, default) or sentence-transformers for embeddings.
 """
 
+import atexit
 import hashlib
+import importlib.util
 import json
 import os
+import queue
 import re
 import sys
+import threading
 import urllib.request
-import urllib.error
+from bisect import bisect_left
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
-
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from embedding_cache import (
+    DEFAULT_CACHE_MB, DEFAULT_QUERY_CACHE_ENTRIES, DEFAULT_QUERY_CACHE_TTL_HOURS,
+    EmbeddingCache, QueryEmbeddingCache, text_hash,
+)
+from embedding_providers import (
+    DEFAULT_TARGET_LATENCY, AsyncEmbedder, EmbeddingError, EmbeddingUnavailable,
+    OllamaProvider, SentenceTransformersProvider,
+)
+from http_pool import HTTPConnectError, HTTPStatusError, get_pool
 from notes_export_utils import NotesExportTracker, get_tracker
+from query_notes import parse_apple_date
+from related_notes import DEFAULT_NEIGHBOURS
+from sync_manifest import SyncManifest
+from text_normalise import NormalisedText, normalise_text
+from vector_snapshot import SnapshotWriter, read_snapshot, validate_snapshot
 import output_format as fmt
 
 
@@ -28,9 +50,30 @@ DEFAULT_EMBEDDING_PROVIDER = "ollama"       # "ollama" or "sentence-transformers
 DEFAULT_OLLAMA_URL = "http://localhost:11434"
 DEFAULT_OLLAMA_MODEL = "mxbai-embed-large"  # 1024 dims
 DEFAULT_ST_MODEL = "all-MiniLM-L6-v2"       # 384 dims
-
-
-def _get_config() -> Dict[str, str]:
+DEFAULT_EMBED_BATCH_SIZE = 32               # texts per embedding request
+DEFAULT_CHUNK_TOKENS = 200                  # tokens per chunk with a chunk tokenizer
+DEFAULT_CHUNK_OVERLAP_TOKENS = 50           # token overlap between chunks
+DEFAULT_EMBED_CONCURRENCY = 2               # embedding requests in flight at once
+DEFAULT_UPSERT_BATCH_POINTS = 256           # points per Qdrant upsert request
+DEFAULT_UPSERT_BATCH_MB = 8                 # request body cap (Qdrant's limit is 32 MB)
+DEFAULT_UPSERT_PARALLEL = 4                 # upsert requests in flight at once
+DEFAULT_BULK_LOAD_POINTS = 10000            # upserts in one sync that defer HNSW indexing
+DEFAULT_INDEXING_THRESHOLD = 20000          # Qdrant's default optimizer indexing_threshold (KB)
+SCROLL_PAGE_SIZE = 2000                     # points per page when scrolling IDs or a few fields
+SNAPSHOT_PAGE_SIZE = 500                    # points per page (with vectors) in snapshots
+# Tracking keys that record a note as indexed; carried in snapshots
+STAMP_KEYS = ("lastIndexedToQdrant", "qdrantChunkCount")
+# Payload fields indexed for filtered search, with their Qdrant index types
+PAYLOAD_INDEXES = {"notebook": "keyword", "note_id": "keyword", "note_key": "keyword",
+                   "modified_ts": "integer"}
+# Fields added to the note-level payload after collections were first built;
+# a missing index for one means indexed notes need a one-time payload update
+BACKFILLED_FIELDS = ("modified_ts", "note_key")
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+DEFAULT_OVERSAMPLING = 2.0                  # candidates fetched per result when quantized
+
+
+def _get_config() -> Dict[str, Any]:
     return {
         "qdrant_url": os.getenv("NOTES_EXPORT_QDRANT_URL", DEFAULT_QDRANT_URL),
         "qdrant_api_key": os.getenv("NOTES_EXPORT_QDRANT_API_KEY", ""),  # For Qdrant Cloud
@@ -39,67 +82,259 @@ def _get_config() -> Dict[str, str]:
         "ollama_url": os.getenv("NOTES_EXPORT_OLLAMA_URL", DEFAULT_OLLAMA_URL),
         "ollama_model": os.getenv("NOTES_EXPORT_OLLAMA_MODEL", DEFAULT_OLLAMA_MODEL),
         "st_model": os.getenv("NOTES_EXPORT_EMBEDDING_MODEL", DEFAULT_ST_MODEL),
+        "embed_batch_size": int(os.getenv("NOTES_EXPORT_EMBED_BATCH_SIZE",
+                                          str(DEFAULT_EMBED_BATCH_SIZE))),
+        "embed_concurrency": int(os.getenv("NOTES_EXPORT_EMBED_CONCURRENCY",
+                                           str(DEFAULT_EMBED_CONCURRENCY))),
+        "st_processes": int(os.getenv("NOTES_EXPORT_ST_PROCESSES", "0")),
+        # Adaptive batching: the batch size grows up to this (0 = embed_batch_size)
+        # while batches finish within the target latency, and shrinks when they don't
+        "embed_max_batch_size": int(os.getenv("NOTES_EXPORT_EMBED_MAX_BATCH_SIZE", "0")),
+        "embed_target_latency": float(os.getenv("NOTES_EXPORT_EMBED_TARGET_SECONDS",
+                                                str(DEFAULT_TARGET_LATENCY))),
+        # Ollama requests per second (0 = unlimited), for shared or remote servers
+        "embed_rate_limit": float(os.getenv("NOTES_EXPORT_EMBED_RATE_LIMIT", "0")),
+        # Local state (embedding cache etc.); defaults to <export root>/vectors
+        "vector_dir": os.getenv("NOTES_EXPORT_VECTOR_DIR", ""),
+        "embedding_cache": os.getenv("NOTES_EXPORT_EMBEDDING_CACHE", "true").lower() == "true",
+        "embedding_cache_mb": int(os.getenv("NOTES_EXPORT_EMBEDDING_CACHE_MB",
+                                            str(DEFAULT_CACHE_MB))),
+        # Strip markup (tags, data URIs, link syntax, long URLs) before chunking
+        "normalise_text": os.getenv("NOTES_EXPORT_NORMALISE_TEXT", "true").lower() == "true",
+        # "chars" (size in characters), "model" (the sentence-transformers model's
+        # tokenizer) or "hf:<name>" (a Hugging Face tokenizer); sizes then in tokens
+        "chunk_tokenizer": os.getenv("NOTES_EXPORT_CHUNK_TOKENIZER", "chars"),
+        "chunk_tokens": int(os.getenv("NOTES_EXPORT_CHUNK_TOKENS", str(DEFAULT_CHUNK_TOKENS))),
+        "chunk_overlap_tokens": int(os.getenv("NOTES_EXPORT_CHUNK_OVERLAP_TOKENS",
+                                              str(DEFAULT_CHUNK_OVERLAP_TOKENS))),
+        "query_cache": os.getenv("NOTES_EXPORT_QUERY_CACHE", "true").lower() == "true",
+        "query_cache_entries": int(os.getenv("NOTES_EXPORT_QUERY_CACHE_ENTRIES",
+                                             str(DEFAULT_QUERY_CACHE_ENTRIES))),
+        "query_cache_ttl_hours": float(os.getenv("NOTES_EXPORT_QUERY_CACHE_TTL_HOURS",
+                                                 str(DEFAULT_QUERY_CACHE_TTL_HOURS))),
+        "upsert_batch_points": int(os.getenv("NOTES_EXPORT_QDRANT_BATCH_POINTS",
+                                             str(DEFAULT_UPSERT_BATCH_POINTS))),
+        "upsert_batch_mb": float(os.getenv("NOTES_EXPORT_QDRANT_BATCH_MB",
+                                           str(DEFAULT_UPSERT_BATCH_MB))),
+        "upsert_parallel": int(os.getenv("NOTES_EXPORT_QDRANT_PARALLEL",
+                                         str(DEFAULT_UPSERT_PARALLEL))),
+        # Notebooks read and chunked concurrently during sync (helps on slow or network disks)
+        "sync_workers": int(os.getenv("NOTES_EXPORT_QDRANT_SYNC_WORKERS", "1")),
+        # Points upserted in one sync before HNSW indexing is deferred to the end (0 = never)
+        "bulk_load_points": int(os.getenv("NOTES_EXPORT_QDRANT_BULK_POINTS",
+                                          str(DEFAULT_BULK_LOAD_POINTS))),
+        # "qdrant" (server) or "local" (embedded index under vector_dir, needs numpy)
+        "vector_backend": os.getenv("NOTES_EXPORT_VECTOR_BACKEND", "qdrant").lower(),
+        "local_vector_dtype": os.getenv("NOTES_EXPORT_LOCAL_VECTOR_DTYPE", "float32"),
+        "local_ann_threshold": int(os.getenv("NOTES_EXPORT_LOCAL_ANN_THRESHOLD", "50000")),
+        "local_ann_nprobe": int(os.getenv("NOTES_EXPORT_LOCAL_ANN_NPROBE", "16")),
+        # Collection storage, applied on creation or by `reset --reconfigure`
+        "quantization": os.getenv("NOTES_EXPORT_QDRANT_QUANTIZATION", "none").lower(),
+        "quantization_oversampling": float(os.getenv("NOTES_EXPORT_QDRANT_OVERSAMPLING",
+                                                     str(DEFAULT_OVERSAMPLING))),
+        "vectors_on_disk": os.getenv("NOTES_EXPORT_QDRANT_ON_DISK", "false").lower() == "true",
+        "hnsw_m": int(os.getenv("NOTES_EXPORT_QDRANT_HNSW_M", "0")),  # 0 = server default
+        "hnsw_ef_construct": int(os.getenv("NOTES_EXPORT_QDRANT_HNSW_EF_CONSTRUCT", "0")),
     }
 
 
+def collection_options(config: Dict) -> Dict[str, Any]:
+    """Storage options for the collection: on-disk vectors, HNSW and quantization.
+
+    Scalar quantization keeps an int8 copy of each vector in RAM (4x smaller),
+    binary keeps one bit per dimension (32x smaller); either way the full
+    vectors can then live on disk and are only read to rescore the top hits.
+    """
+    mode = config.get("quantization", "none")
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization '{mode}' "
+                         f"(expected one of: {', '.join(QUANTIZATION_MODES)})")
+    quantization = None
+    if mode == "scalar":
+        quantization = {"scalar": {"type": "int8", "quantile": 0.99, "always_ram": True}}
+    elif mode == "binary":
+        quantization = {"binary": {"always_ram": True}}
+    hnsw = {}
+    if config.get("hnsw_m"):
+        hnsw["m"] = config["hnsw_m"]
+    if config.get("hnsw_ef_construct"):
+        hnsw["ef_construct"] = config["hnsw_ef_construct"]
+    return {"on_disk": config.get("vectors_on_disk", False),
+            "hnsw_config": hnsw or None,
+            "quantization_config": quantization}
+
+
+def _vector_dir(config: Dict, tracker=None) -> Path:
+    """Directory for local vector state (embedding cache, manifest, local index)."""
+    configured = config.get("vector_dir")
+    if configured:
+        return Path(configured)
+    return Path((tracker or get_tracker()).root_directory) / "vectors"
+
+
+def related_graph_path(config: Dict, tracker=None) -> Path:
+    """Where `related` saves the related-notes graph for the configured collection."""
+    return _vector_dir(config, tracker) / f"related-{config['collection']}.json"
+
+
+def _embedding_model_name(config: Dict) -> str:
+    """The model used by the configured embedding provider."""
+    if config["embedding_provider"] == "ollama":
+        return config["ollama_model"]
+    return config["st_model"]
+
+
+def _model_identity(config: Dict) -> Dict[str, str]:
+    """Provider and model that produce the collection's vectors."""
+    provider = config["embedding_provider"]
+    if provider == "st":
+        provider = "sentence-transformers"
+    return {"embedding_provider": provider, "embedding_model": _embedding_model_name(config)}
+
+
+class EmbeddingModelMismatch(RuntimeError):
+    """The collection was built with a different embedding model or dimension."""
+
+
 # ── Embedding Providers ───────────────────────────────────────────────────
 
 def _embed_ollama(texts: List[str], config: Dict) -> List[List[float]]:
-    """Get embeddings from a local Ollama server."""
-    url = f"{config['ollama_url']}/api/embed"
-    vectors = []
-    for text in texts:
-        # Chunks should already be right-sized, but guard against edge cases
-        text = text.strip()
-        if not text:
-            text = "(empty note)"
-
-        payload = json.dumps({"model": config["ollama_model"], "input": text}).encode()
-        req = urllib.request.Request(url, data=payload,
-                                     headers={"Content-Type": "application/json"})
-        try:
-            with urllib.request.urlopen(req, timeout=120) as resp:
-                result = json.loads(resp.read())
-            vectors.append(result["embeddings"][0])
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode() if e.fp else ""
-            raise RuntimeError(f"Ollama embedding failed ({e.code}): {error_body}") from e
-        except (urllib.error.URLError, KeyError, IndexError) as e:
-            raise RuntimeError(f"Ollama embedding failed: {e}") from e
-    return vectors
+    """Get embeddings from a local Ollama server.
+
+    Texts are sent in batches of up to `embed_batch_size` per request, with
+    up to `embed_concurrency` requests in flight. Vectors come back in input
+    order; EmbeddingError is raised if any text cannot be embedded.
+    """
+    # Chunks should already be right-sized, but guard against edge cases
+    texts = [t.strip() or "(empty note)" for t in texts]
+    return get_embedder(config).embed_sync(texts)
+
+
+# Loaded once per process: loading a model from disk costs far more than encoding a batch
+_st_models: Dict[str, Any] = {}
+_st_pools: Dict[str, Any] = {}
+_st_lock = threading.Lock()
+
+
+def _get_st_model(model_name: str):
+    """Return the process-wide SentenceTransformer for a model, loading it on first use."""
+    with _st_lock:
+        if model_name not in _st_models:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError:
+                raise ImportError(
+                    "sentence-transformers not installed. "
+                    "Install with: pip install sentence-transformers"
+                )
+            _st_models[model_name] = SentenceTransformer(model_name)
+        return _st_models[model_name]
+
+
+def _get_st_pool(model_name: str, processes: int):
+    """Return a multi-process encoding pool for a model, started on first use."""
+    model = _get_st_model(model_name)
+    with _st_lock:
+        if model_name not in _st_pools:
+            _st_pools[model_name] = model.start_multi_process_pool(
+                target_devices=["cpu"] * processes)
+            atexit.register(model.stop_multi_process_pool, _st_pools[model_name])
+        return _st_pools[model_name]
 
 
 def _embed_sentence_transformers(texts: List[str], config: Dict) -> List[List[float]]:
-    """Get embeddings using sentence-transformers (local)."""
-    try:
-        from sentence_transformers import SentenceTransformer
-    except ImportError:
-        raise ImportError(
-            "sentence-transformers not installed. "
-            "Install with: pip install sentence-transformers"
-        )
-    model = SentenceTransformer(config["st_model"])
-    embeddings = model.encode(texts, show_progress_bar=False)
+    """Get embeddings using sentence-transformers (local).
+
+    With `st_processes` > 1, large inputs are encoded across that many CPU
+    worker processes.
+    """
+    model = _get_st_model(config["st_model"])
+    batch_size = max(1, config.get("embed_batch_size", DEFAULT_EMBED_BATCH_SIZE))
+    processes = config.get("st_processes", 0)
+    if processes > 1 and len(texts) > batch_size * processes:
+        pool = _get_st_pool(config["st_model"], processes)
+        embeddings = model.encode_multi_process(texts, pool, batch_size=batch_size)
+    else:
+        embeddings = model.encode(texts, batch_size=batch_size, show_progress_bar=False)
     return [e.tolist() for e in embeddings]
 
 
-def get_embeddings(texts: List[str], config: Optional[Dict] = None) -> List[List[float]]:
-    """Get embeddings for a list of texts using the configured provider."""
-    if config is None:
-        config = _get_config()
-    provider = config["embedding_provider"]
+# One embedder per configuration, so the adapted batch size and the rate
+# limit carry over from one get_embeddings call to the next
+_embedders: Dict[Tuple, AsyncEmbedder] = {}
+_embedders_lock = threading.Lock()
+
+
+def _emit_embed_batch(metric: Dict):
+    fmt.emit("embed_batch", **metric)
+
+
+def get_embedder(config: Dict) -> AsyncEmbedder:
+    """Return the shared AsyncEmbedder for the configured provider."""
+    provider = config.get("embedding_provider", DEFAULT_EMBEDDING_PROVIDER)
+    batch_size = max(1, config.get("embed_batch_size", DEFAULT_EMBED_BATCH_SIZE))
+    concurrency = max(1, config.get("embed_concurrency", DEFAULT_EMBED_CONCURRENCY))
     if provider == "ollama":
-        return _embed_ollama(texts, config)
+        key = (provider, config["ollama_url"], config["ollama_model"])
+        max_batch_size = config.get("embed_max_batch_size", 0) or batch_size
     elif provider in ("sentence-transformers", "st"):
-        return _embed_sentence_transformers(texts, config)
+        key = (provider, config["st_model"], config.get("st_processes", 0))
+        # The model batches internally; each call passes the whole input to encode
+        batch_size = max_batch_size = _embed_call_size(config)
     else:
         raise ValueError(f"Unknown embedding provider: {provider}")
+    target_latency = config.get("embed_target_latency", DEFAULT_TARGET_LATENCY)
+    rate_limit = config.get("embed_rate_limit", 0.0)
+    key += (batch_size, max_batch_size, concurrency, target_latency, rate_limit)
+
+    with _embedders_lock:
+        if key not in _embedders:
+            if provider == "ollama":
+                backend = OllamaProvider(config["ollama_url"], config["ollama_model"])
+            else:
+                backend = SentenceTransformersProvider(
+                    config["st_model"], lambda texts: _embed_sentence_transformers(texts, config))
+            _embedders[key] = AsyncEmbedder(
+                backend, batch_size=batch_size, max_batch_size=max_batch_size,
+                concurrency=concurrency, target_latency=target_latency,
+                rate_limit=rate_limit, on_batch=_emit_embed_batch)
+        return _embedders[key]
+
+
+def _embed_call_size(config: Dict) -> int:
+    """How many texts to pass to get_embeddings at once to keep the provider busy."""
+    batch_size = max(1, config.get("embed_batch_size", DEFAULT_EMBED_BATCH_SIZE))
+    if config.get("embedding_provider", DEFAULT_EMBEDDING_PROVIDER) == "ollama":
+        return batch_size * max(1, config.get("embed_concurrency", DEFAULT_EMBED_CONCURRENCY))
+    # Big calls let sentence-transformers sort by length and feed every worker process
+    return batch_size * 8 * max(1, config.get("st_processes", 0))
+
+
+def get_embeddings(texts: List[str], config: Optional[Dict] = None) -> List[List[float]]:
+    """Get embeddings for a list of texts using the configured provider.
+
+    Raises EmbeddingError, carrying the vectors that did succeed, if some
+    texts cannot be embedded.
+    """
+    if config is None:
+        config = _get_config()
+    if config["embedding_provider"] == "ollama":
+        return _embed_ollama(texts, config)
+    return get_embedder(config).embed_sync(texts)
 
 
 def get_embedding_dimension(config: Optional[Dict] = None) -> int:
-    """Determine the embedding dimension by encoding a test string."""
+    """Determine the embedding dimension of the configured model.
+
+    sentence-transformers models report it directly; for Ollama a test
+    string is embedded.
+    """
     if config is None:
         config = _get_config()
+    if config["embedding_provider"] in ("sentence-transformers", "st"):
+        dim = _get_st_model(config["st_model"]).get_sentence_embedding_dimension()
+        if dim:
+            return dim
     vecs = get_embeddings(["test"], config)
     return len(vecs[0])
 
@@ -112,29 +347,43 @@ class QdrantHTTP:
     Supports both local Qdrant (Docker) and Qdrant Cloud (with API key).
     For Qdrant Cloud, set NOTES_EXPORT_QDRANT_API_KEY and use your cluster URL
     (e.g. https://your-cluster.cloud.qdrant.io:6333).
+
+    Requests go through the shared keep-alive pool in http_pool, so repeated
+    calls reuse the same connection.
+
+    Upserts are split into batches of at most `batch_points` points and
+    `batch_bytes` of JSON, and up to `parallel` batches are in flight at once.
     """
 
-    def __init__(self, url: str = DEFAULT_QDRANT_URL, api_key: str = ""):
+    def __init__(self, url: str = DEFAULT_QDRANT_URL, api_key: str = "",
+                 batch_points: int = DEFAULT_UPSERT_BATCH_POINTS,
+                 batch_bytes: int = DEFAULT_UPSERT_BATCH_MB * 1024 * 1024,
+                 parallel: int = DEFAULT_UPSERT_PARALLEL,
+                 search_params: Optional[Dict] = None):
         self.url = url.rstrip("/")
         self.api_key = api_key
+        self.batch_points = max(1, batch_points)
+        self.batch_bytes = max(1, batch_bytes)
+        self.parallel = max(1, parallel)
+        self.search_params = search_params  # Sent as "params" with every search
 
     def _request(self, method: str, path: str, body: Any = None) -> Dict:
-        data = json.dumps(body).encode() if body else None
+        if isinstance(body, bytes):
+            data = body  # Already-encoded JSON
+        else:
+            data = json.dumps(body).encode() if body else None
         headers = {}
         if data:
             headers["Content-Type"] = "application/json"
         if self.api_key:
             headers["api-key"] = self.api_key
-        req = urllib.request.Request(
-            f"{self.url}{path}", data=data, method=method, headers=headers,
-        )
         try:
-            with urllib.request.urlopen(req, timeout=30) as resp:
-                return json.loads(resp.read())
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode() if e.fp else ""
-            raise RuntimeError(f"Qdrant {method} {path} → {e.code}: {error_body}") from e
-        except urllib.error.URLError as e:
+            return json.loads(get_pool().request(method, f"{self.url}{path}",
+                                                 body=data, headers=headers, timeout=30))
+        except HTTPStatusError as e:
+            error_body = e.body.decode(errors="replace")
+            raise RuntimeError(f"Qdrant {method} {path} → {e.status}: {error_body}") from e
+        except HTTPConnectError as e:
             raise RuntimeError(
                 f"Cannot connect to Qdrant at {self.url}: {e.reason}\n"
                 "Is Qdrant running? Start with: docker-compose up -d (in your qdrant directory)"
@@ -147,21 +396,118 @@ class QdrantHTTP:
         except RuntimeError:
             return False
 
-    def create_collection(self, name: str, vector_size: int):
-        self._request("PUT", f"/collections/{name}", {
-            "vectors": {"size": vector_size, "distance": "Cosine"}
-        })
+    def create_collection(self, name: str, vector_size: int, on_disk: bool = False,
+                          hnsw_config: Optional[Dict] = None,
+                          quantization_config: Optional[Dict] = None,
+                          metadata: Optional[Dict] = None):
+        vectors = {"size": vector_size, "distance": "Cosine"}
+        if on_disk:
+            vectors["on_disk"] = True
+        body = {"vectors": vectors}
+        if hnsw_config:
+            body["hnsw_config"] = hnsw_config
+        if quantization_config:
+            body["quantization_config"] = quantization_config
+        if metadata:
+            try:
+                self._request("PUT", f"/collections/{name}", {**body, "metadata": metadata})
+                return
+            except RuntimeError:
+                pass  # Qdrant before 1.16 has no collection metadata; the local state file suffices
+        self._request("PUT", f"/collections/{name}", body)
+
+    def collection_metadata(self, name: str) -> Dict:
+        """Metadata stored at creation, plus the vector `dimension` from the config."""
+        config = self._request("GET", f"/collections/{name}").get("result", {}).get("config", {})
+        vectors = config.get("params", {}).get("vectors", {})
+        metadata = dict(config.get("metadata") or {})
+        if isinstance(vectors, dict) and "size" in vectors:
+            metadata["dimension"] = vectors["size"]
+        return metadata
+
+    def update_collection(self, name: str, on_disk: bool = False,
+                          hnsw_config: Optional[Dict] = None,
+                          quantization_config: Optional[Dict] = None):
+        """Change storage options in place; Qdrant rebuilds indexes in the background."""
+        body = {
+            "vectors": {"": {"on_disk": on_disk}},  # "" is the unnamed default vector
+            "quantization_config": quantization_config or "Disabled",
+        }
+        if hnsw_config:
+            body["hnsw_config"] = hnsw_config
+        self._request("PATCH", f"/collections/{name}", body)
 
     def delete_collection(self, name: str):
         self._request("DELETE", f"/collections/{name}")
 
-    def upsert_points(self, collection: str, points: List[Dict]):
+    def _upsert_bodies(self, points: List[Dict]) -> Iterator[bytes]:
+        """Encode points into request bodies within the point and byte limits."""
+        parts, size = [], 0
+        for point in points:
+            encoded = json.dumps(point).encode()
+            if parts and (len(parts) >= self.batch_points
+                          or size + len(encoded) > self.batch_bytes):
+                yield b'{"points":[' + b",".join(parts) + b"]}"
+                parts, size = [], 0
+            parts.append(encoded)
+            size += len(encoded) + 1
+        if parts:
+            yield b'{"points":[' + b",".join(parts) + b"]}"
+
+    def upsert_points(self, collection: str, points: List[Dict], wait: bool = True):
+        """Upsert points, several batches at a time.
+
+        Batches are sent with wait=false, so Qdrant acknowledges each one once
+        it is in the write-ahead log. With wait=True the last batch is sent
+        after the others are acknowledged and waits until it is applied; as
+        Qdrant applies updates in order, every point is then searchable.
+        """
         if not points:
             return
-        # Batch in chunks of 100
-        for i in range(0, len(points), 100):
-            batch = points[i:i + 100]
-            self._request("PUT", f"/collections/{collection}/points", {"points": batch})
+        path = f"/collections/{collection}/points"
+        bodies = list(self._upsert_bodies(points))
+        last = bodies.pop() if wait else None
+        if len(bodies) == 1 or self.parallel == 1:
+            for body in bodies:
+                self._request("PUT", f"{path}?wait=false", body)
+        elif bodies:
+            with ThreadPoolExecutor(max_workers=min(self.parallel, len(bodies))) as pool:
+                for future in [pool.submit(self._request, "PUT", f"{path}?wait=false", body)
+                               for body in bodies]:
+                    future.result()
+        if last is not None:
+            self._request("PUT", f"{path}?wait=true", last)
+
+    def payload_indexes(self, collection: str) -> Set[str]:
+        """Names of the payload fields that have an index."""
+        result = self._request("GET", f"/collections/{collection}")
+        return set(result.get("result", {}).get("payload_schema", {}))
+
+    def create_payload_index(self, collection: str, field: str, schema: str):
+        self._request("PUT", f"/collections/{collection}/index?wait=true", {
+            "field_name": field,
+            "field_schema": schema,
+        })
+
+    def get_indexing_threshold(self, collection: str) -> Optional[int]:
+        result = self._request("GET", f"/collections/{collection}")
+        return (result.get("result", {}).get("config", {})
+                .get("optimizer_config", {}).get("indexing_threshold"))
+
+    def set_indexing_threshold(self, collection: str, threshold: Optional[int]):
+        """Set the optimizer's indexing_threshold; 0 disables HNSW indexing."""
+        self._request("PATCH", f"/collections/{collection}", {
+            "optimizers_config": {"indexing_threshold": threshold},
+        })
+
+    def set_payload(self, collection: str, payload: Dict, ids: List[int]):
+        """Overwrite payload keys on existing points without touching vectors."""
+        if not ids:
+            return
+        self._request("POST", f"/collections/{collection}/points/payload", {
+            "payload": payload,
+            "points": ids,
+        })
 
     def delete_points(self, collection: str, ids: List[str]):
         if not ids:
@@ -171,22 +517,52 @@ class QdrantHTTP:
         })
 
     def search(self, collection: str, vector: List[float], limit: int = 10,
-               score_threshold: float = 0.0) -> List[Dict]:
+               score_threshold: float = 0.0,
+               query_filter: Optional[Dict] = None, offset: int = 0) -> List[Dict]:
         body = {"vector": vector, "limit": limit, "with_payload": True}
+        if offset:
+            body["offset"] = offset
+        if self.search_params:
+            body["params"] = self.search_params
         if score_threshold > 0:
             body["score_threshold"] = score_threshold
+        if query_filter:
+            body["filter"] = query_filter
         result = self._request("POST", f"/collections/{collection}/points/search", body)
         return result.get("result", [])
 
+    def search_groups(self, collection: str, vector: List[float], limit: int = 10,
+                      group_by: str = "note_id", score_threshold: float = 0.0,
+                      query_filter: Optional[Dict] = None) -> List[Dict]:
+        """Return the best hit for each of the top `limit` distinct `group_by` values."""
+        body = {"vector": vector, "limit": limit, "group_by": group_by,
+                "group_size": 1, "with_payload": True}
+        if self.search_params:
+            body["params"] = self.search_params
+        if score_threshold > 0:
+            body["score_threshold"] = score_threshold
+        if query_filter:
+            body["filter"] = query_filter
+        result = self._request("POST", f"/collections/{collection}/points/search/groups", body)
+        return [group["hits"][0] for group in result.get("result", {}).get("groups", [])
+                if group.get("hits")]
+
     def count(self, collection: str) -> int:
         result = self._request("POST", f"/collections/{collection}/points/count", {
             "exact": True
         })
         return result.get("result", {}).get("count", 0)
 
-    def scroll(self, collection: str, limit: int = 100, offset: Optional[str] = None) -> Tuple:
-        body = {"limit": limit, "with_payload": True}
-        if offset:
+    def scroll(self, collection: str, limit: int = 100, offset: Optional[str] = None,
+               with_payload: Union[bool, List[str]] = True,
+               with_vector: bool = False) -> Tuple:
+        """Return one page of points and the offset of the next page (None at the end).
+
+        `with_payload` may be a list of payload keys to fetch only those; pass
+        False for IDs only. Vectors are left out unless `with_vector` is set.
+        """
+        body = {"limit": limit, "with_payload": with_payload, "with_vector": with_vector}
+        if offset is not None:
             body["offset"] = offset
         result = self._request("POST", f"/collections/{collection}/points/scroll", body)
         points = result.get("result", {}).get("points", [])
@@ -194,10 +570,181 @@ class QdrantHTTP:
         return points, next_offset
 
 
+def get_vector_client(config: Optional[Dict] = None, tracker=None):
+    """Return the client for the configured vector backend.
+
+    QdrantHTTP and LocalVectorIndex expose the same methods, so callers need
+    not care which one they hold.
+    """
+    if config is None:
+        config = _get_config()
+    if config.get("vector_backend") == "local":
+        from local_vector_index import LocalVectorIndex
+        return LocalVectorIndex(_vector_dir(config, tracker) / "index",
+                                dtype=config.get("local_vector_dtype", "float32"),
+                                ann_threshold=config.get("local_ann_threshold", 50000),
+                                nprobe=config.get("local_ann_nprobe", 16))
+    return QdrantHTTP(config["qdrant_url"], api_key=config.get("qdrant_api_key", ""),
+                      batch_points=config.get("upsert_batch_points", DEFAULT_UPSERT_BATCH_POINTS),
+                      batch_bytes=int(config.get("upsert_batch_mb", DEFAULT_UPSERT_BATCH_MB)
+                                      * 1024 * 1024),
+                      parallel=config.get("upsert_parallel", DEFAULT_UPSERT_PARALLEL),
+                      search_params=_search_params(config))
+
+
+def _search_params(config: Dict) -> Optional[Dict]:
+    """Search params that rescore quantized candidates against the full vectors."""
+    if config.get("quantization", "none") == "none":
+        return None
+    return {"quantization": {
+        "rescore": True,
+        "oversampling": config.get("quantization_oversampling", DEFAULT_OVERSAMPLING),
+    }}
+
+
+def _date_ts(date_string: str) -> Optional[int]:
+    """Epoch seconds for an Apple Notes date string, or None if it cannot be parsed."""
+    parsed = parse_apple_date(date_string)
+    return int(parsed.timestamp()) if parsed else None
+
+
+def build_search_filter(notebooks: Optional[List[str]] = None,
+                        modified_after: Optional[datetime] = None,
+                        modified_before: Optional[datetime] = None) -> Optional[Dict]:
+    """Build a Qdrant filter for notebook and modification-date restrictions.
+
+    Returns None when there is nothing to filter on.
+    """
+    must = []
+    if notebooks is not None:
+        must.append({"key": "notebook", "match": {"any": list(notebooks)}})
+    modified = {}
+    if modified_after is not None:
+        modified["gte"] = int(modified_after.timestamp())
+    if modified_before is not None:
+        modified["lte"] = int(modified_before.timestamp())
+    if modified:
+        must.append({"key": "modified_ts", "range": modified})
+    return {"must": must} if must else None
+
+
+# ── Sync Pipeline ─────────────────────────────────────────────────────────
+
+PIPELINE_QUEUE_DEPTH = 4   # batches buffered between sync stages
+
+
+def _threaded(iterable: Iterable, maxsize: int) -> Iterator:
+    """Yield the items of `iterable`, produced by a background thread.
+
+    Items pass through a bounded queue, so the producer blocks once `maxsize`
+    items are waiting; that bound is what keeps pipeline memory flat.
+    Exceptions in the producer are re-raised in the consumer, and closing
+    the returned generator stops the producer.
+    """
+    items = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(("item", item)):
+                    return
+            put(("done", None))
+        except BaseException as e:
+            put(("error", e))
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, value = items.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _threaded_merge(iterables: Iterable[Iterable], workers: int, maxsize: int) -> Iterator:
+    """Yield the items of several iterables, drained concurrently by `workers` threads.
+
+    Each thread takes the next iterable once it has exhausted its current
+    one, and every thread feeds the same bounded queue, so items from
+    different iterables interleave while each iterable's own order is kept.
+    Errors and closing behave as in _threaded.
+    """
+    items = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+    sources = iter(iterables)
+    sources_lock = threading.Lock()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            while not stop.is_set():
+                with sources_lock:
+                    iterable = next(sources, None)
+                if iterable is None:
+                    break
+                try:
+                    for item in iterable:
+                        if not put(("item", item)):
+                            return
+                finally:
+                    if hasattr(iterable, "close"):
+                        iterable.close()
+            put(("done", None))
+        except BaseException as e:
+            put(("error", e))
+
+    threads = [threading.Thread(target=produce, daemon=True) for _ in range(max(1, workers))]
+    for thread in threads:
+        thread.start()
+    try:
+        running = len(threads)
+        while running:
+            kind, value = items.get()
+            if kind == "done":
+                running -= 1
+            elif kind == "error":
+                raise value
+            else:
+                yield value
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
 # ── Notes Manager ─────────────────────────────────────────────────────────
 
 DEFAULT_CHUNK_SIZE = 800       # chars per chunk (~200-300 tokens for mxbai-embed-large)
 DEFAULT_CHUNK_OVERLAP = 200    # overlap between chunks to preserve context at boundaries
+CHARS_PER_TOKEN = 4            # approximation when no tokenizer is available
+SNIPPET_CHARS = 200            # chunk text kept in the payload for result display
 
 
 def _get_chunk_config() -> Tuple[int, int]:
@@ -207,48 +754,117 @@ def _get_chunk_config() -> Tuple[int, int]:
     return chunk_size, chunk_overlap
 
 
-def chunk_text(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
-               overlap: int = DEFAULT_CHUNK_OVERLAP) -> List[str]:
-    """Split text into overlapping chunks for embedding.
+def _load_tokenizer(name: str, config: Dict):
+    """Load a Hugging Face style tokenizer ("model" or "hf:<name>")."""
+    if name == "model":
+        if config["embedding_provider"] not in ("sentence-transformers", "st"):
+            raise ImportError(f"no local tokenizer for the {config['embedding_provider']} provider")
+        return _get_st_model(config["st_model"]).tokenizer
+    if name.startswith("hf:"):
+        try:
+            from transformers import AutoTokenizer
+        except ImportError:
+            raise ImportError("transformers not installed. Install with: pip install transformers")
+        return AutoTokenizer.from_pretrained(name[3:])
+    raise ValueError(f"Unknown chunk tokenizer '{name}' (expected chars, model or hf:<name>)")
 
-    Short texts (under chunk_size) return a single chunk.
-    Long texts are split with overlap so context at boundaries isn't lost.
+
+def get_chunker(config: Dict) -> Tuple[int, int, Optional[Callable[[str], List[int]]]]:
+    """Return (chunk size, overlap, tokenizer) for the configured chunking mode.
+
+    The tokenizer maps text to the start offset of each token, and the
+    sizes are then in tokens. In "chars" mode, or when the tokenizer cannot
+    be loaded, it is None and the sizes are in characters (token sizes
+    times CHARS_PER_TOKEN for the fallback).
+    """
+    name = config.get("chunk_tokenizer", "chars")
+    if name == "chars":
+        return _get_chunk_config() + (None,)
+    size = config.get("chunk_tokens", DEFAULT_CHUNK_TOKENS)
+    overlap = config.get("chunk_overlap_tokens", DEFAULT_CHUNK_OVERLAP_TOKENS)
+    try:
+        tokenizer = _load_tokenizer(name, config)
+    except ImportError as e:
+        print(f"  Chunk tokenizer unavailable ({e}); "
+              f"approximating {CHARS_PER_TOKEN} characters per token")
+        return size * CHARS_PER_TOKEN, overlap * CHARS_PER_TOKEN, None
+
+    def token_starts(text: str) -> List[int]:
+        encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        return [start for start, end in encoded["offset_mapping"] if end > start]
+    return size, overlap, token_starts
+
+
+def _strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    """Narrow text[start:end] to exclude leading and trailing whitespace."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def chunk_spans(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                overlap: int = DEFAULT_CHUNK_OVERLAP,
+                tokenizer: Optional[Callable[[str], List[int]]] = None
+                ) -> Iterator[Tuple[int, int]]:
+    """Yield (start, end) offsets of overlapping chunks of text, lazily.
+
+    Sizes are in characters, or in tokens when a tokenizer (text -> token
+    start offsets) is given. Each chunk prefers to end at a paragraph or
+    sentence boundary in its last 20%, and is trimmed of surrounding
+    whitespace; text is never copied.
     """
-    text = text.strip()
-    if not text:
-        return ["(empty note)"]
-    if len(text) <= chunk_size:
-        return [text]
-
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-
-        # Try to break at a paragraph or sentence boundary
-        if end < len(text):
-            # Look for paragraph break in last 20% of chunk
-            search_from = int(chunk_size * 0.8)
-            para_break = chunk.rfind('\n\n', search_from)
-            if para_break > 0:
-                chunk = chunk[:para_break]
-                end = start + para_break
+    lo, hi = _strip_span(text, 0, len(text))
+    starts = None
+    if tokenizer is not None:
+        starts = [t for t in tokenizer(text) if lo <= t < hi]
+
+    def window_end(start: int) -> int:
+        if starts is None:
+            return min(start + chunk_size, hi)
+        i = bisect_left(starts, start) + chunk_size
+        return starts[i] if i < len(starts) else hi
+
+    def overlapped(end: int) -> int:
+        if starts is None:
+            return end - overlap
+        return starts[max(bisect_left(starts, end) - overlap, 0)]
+
+    start = lo
+    while start < hi:
+        end = window_end(start)
+        if end < hi:
+            # Try to break at a paragraph, then a sentence, boundary
+            search_from = start + int((end - start) * 0.8)
+            para_break = text.rfind('\n\n', search_from, end)
+            if para_break > start:
+                end = para_break
             else:
-                # Try sentence boundary
                 for sep in ['. ', '.\n', '! ', '? ']:
-                    sent_break = chunk.rfind(sep, search_from)
-                    if sent_break > 0:
-                        chunk = chunk[:sent_break + 1]
-                        end = start + sent_break + 1
+                    sent_break = text.rfind(sep, search_from, end)
+                    if sent_break > start:
+                        end = sent_break + 1
                         break
 
-        chunks.append(chunk.strip())
-        start = end - overlap
-        if start <= (end - chunk_size):  # prevent infinite loop
-            start = end
+        chunk_start, chunk_end = _strip_span(text, start, end)
+        if chunk_start < chunk_end:
+            yield chunk_start, chunk_end
+        if end >= hi:
+            break
+        next_start = overlapped(end)
+        start = next_start if next_start > start else end  # Always make progress
 
-    return [c for c in chunks if c]
+
+def chunk_text(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+               overlap: int = DEFAULT_CHUNK_OVERLAP) -> List[str]:
+    """Split text into overlapping chunks for embedding.
+
+    Short texts (under chunk_size) return a single chunk.
+    Long texts are split with overlap so context at boundaries isn't lost.
+    """
+    chunks = [text[start:end] for start, end in chunk_spans(text, chunk_size, overlap)]
+    return chunks or ["(empty note)"]
 
 
 def _note_to_text(note_info: Dict, content: str) -> str:
@@ -258,6 +874,11 @@ def _note_to_text(note_info: Dict, content: str) -> str:
     return f"{title}\n\n{content}"
 
 
+def _note_key(notebook: str, note_id: str) -> str:
+    """Payload key that identifies one note across notebooks (and accounts)."""
+    return f"{notebook}:{note_id}"
+
+
 def _make_point_id(note_id: str, notebook: str, chunk_index: int = 0) -> str:
     """Create a deterministic string ID for a Qdrant point.
 
@@ -272,28 +893,183 @@ class QdrantNotesManager:
 
     def __init__(self, config: Optional[Dict] = None):
         self.config = config or _get_config()
-        self.client = QdrantHTTP(self.config["qdrant_url"],
-                                 api_key=self.config.get("qdrant_api_key", ""))
-        self.collection = self.config["collection"]
         self.tracker = get_tracker()
+        self.client = get_vector_client(self.config, self.tracker)
+        self.collection = self.config["collection"]
         self._dim = None
-
-    def _ensure_collection(self):
+        self._cache = None
+        self._query_cache = None
+        self.last_query_cached = False  # Whether the last search's query vector was cached
+        self._manifest = None
+        self._collection_checked = False
+        self._model_unverified = False  # Collection predates model records; see _check_collection_model
+
+    def _ensure_collection(self, rebuild: bool = False):
+        """Create the collection if missing, else check it was built with the configured model.
+
+        `rebuild` says every vector is about to be re-embedded (sync --force),
+        so a collection whose model was never recorded needs no warning.
+        """
+        if self._collection_checked:
+            return
         if not self.client.collection_exists(self.collection):
             dim = self._get_dim()
             print(f"Creating Qdrant collection '{self.collection}' (dim={dim})")
-            self.client.create_collection(self.collection, dim)
+            self.client.create_collection(self.collection, dim,
+                                          metadata=_model_identity(self.config),
+                                          **collection_options(self.config))
+            self._get_manifest().clear()  # Nothing from a previous collection survives
+        else:
+            self._check_collection_model(rebuild)
+        self._collection_checked = True
+
+    def _check_collection_model(self, rebuild: bool = False):
+        """Refuse to mix vectors from different models in one collection.
+
+        The model is read from the collection metadata, or from the local
+        state file for collections created before it (or on servers without
+        collection metadata). The collection's vector size also refreshes
+        the state file, so a later rebuild does not need to probe the model.
+
+        When neither records the model, the configured model is probed and
+        its dimension compared with the collection's. A matching dimension
+        does not prove the same model built the vectors, so nothing is
+        recorded until `sync --force` has re-embedded them.
+        """
+        identity = _model_identity(self.config)
+        stored = self.client.collection_metadata(self.collection)
+        state = self._load_model_state()
+        recorded = stored if stored.get("embedding_model") else state
+        if not recorded.get("embedding_model"):
+            self._check_unrecorded_model(stored.get("dimension"), rebuild)
+            return
+        built_with = {k: recorded.get(k) for k in identity}
+        if built_with != identity:
+            raise EmbeddingModelMismatch(
+                f"Collection '{self.collection}' was built with "
+                f"{built_with['embedding_provider']} model '{built_with['embedding_model']}', "
+                f"but the configured model is {identity['embedding_provider']} "
+                f"'{identity['embedding_model']}'.\n"
+                "Rebuild it with: python qdrant_integration.py reset && "
+                "python qdrant_integration.py sync\n"
+                "or switch the embedding model back.")
+        dim = stored.get("dimension")
+        if dim and state.get("dimension") and state["dimension"] != dim \
+                and {k: state.get(k) for k in identity} == identity:
+            raise EmbeddingModelMismatch(
+                f"Collection '{self.collection}' holds {dim}-dimensional vectors, but "
+                f"'{identity['embedding_model']}' produces {state['dimension']}.\n"
+                "Rebuild it with: python qdrant_integration.py reset && "
+                "python qdrant_integration.py sync")
+        if dim and state != {**identity, "dimension": dim}:
+            self._save_model_state(dim)
+
+    def _check_unrecorded_model(self, dim: Optional[int], rebuild: bool):
+        """Check a collection with no recorded model as far as its dimension allows."""
+        identity = _model_identity(self.config)
+        self._dim = get_embedding_dimension(self.config)
+        if dim and dim != self._dim:
+            raise EmbeddingModelMismatch(
+                f"Collection '{self.collection}' holds {dim}-dimensional vectors, but "
+                f"'{identity['embedding_model']}' produces {self._dim}.\n"
+                "Rebuild it with: python qdrant_integration.py reset && "
+                "python qdrant_integration.py sync")
+        self._model_unverified = True
+        if not rebuild:
+            print(f"Collection '{self.collection}' does not record which embedding model "
+                  f"built it, so it cannot be checked against '{identity['embedding_model']}'.\n"
+                  "Re-embed it with: python qdrant_integration.py sync --force\n"
+                  "or rebuild it with: python qdrant_integration.py reset && "
+                  "python qdrant_integration.py sync")
+
+    def _model_state_path(self) -> Path:
+        return self._vector_dir() / "embedding_model.json"
+
+    def _load_model_state(self) -> Dict:
+        """Provider, model and dimension last recorded for this collection."""
+        try:
+            with open(self._model_state_path()) as f:
+                return json.load(f).get(self.collection, {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save_model_state(self, dim: int):
+        path = self._model_state_path()
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        state[self.collection] = {**_model_identity(self.config), "dimension": dim}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
 
     def _get_dim(self) -> int:
+        """Embedding dimension, from the state file when the model is unchanged.
+
+        Only an unknown model is probed (which for Ollama means embedding a
+        test string, slow while the model loads).
+        """
         if self._dim is None:
-            self._dim = get_embedding_dimension(self.config)
+            state = self._load_model_state()
+            identity = _model_identity(self.config)
+            if state.get("dimension") and {k: state.get(k) for k in identity} == identity:
+                self._dim = state["dimension"]
+            else:
+                self._dim = get_embedding_dimension(self.config)
+                self._save_model_state(self._dim)
         return self._dim
 
-    def _read_note_content(self, note_info: Dict, notebook: str) -> Optional[str]:
-        """Read the best available content for a note (md > text > html)."""
+    def _vector_dir(self) -> Path:
+        return _vector_dir(self.config, self.tracker)
+
+    def _get_cache(self) -> Optional[EmbeddingCache]:
+        if self._cache is None and self.config.get("embedding_cache", True):
+            max_mb = self.config.get("embedding_cache_mb", DEFAULT_CACHE_MB)
+            self._cache = EmbeddingCache(self._vector_dir() / "embeddings.sqlite",
+                                         max_bytes=max_mb * 1024 * 1024)
+        return self._cache
+
+    def _get_query_cache(self) -> Optional[QueryEmbeddingCache]:
+        if self._query_cache is None and self.config.get("query_cache", True):
+            self._query_cache = QueryEmbeddingCache(
+                self._vector_dir() / "queries.sqlite",
+                max_entries=self.config.get("query_cache_entries", DEFAULT_QUERY_CACHE_ENTRIES),
+                ttl_seconds=self.config.get("query_cache_ttl_hours",
+                                            DEFAULT_QUERY_CACHE_TTL_HOURS) * 3600)
+        return self._query_cache
+
+    def _embed_query(self, query: str) -> Tuple[List[float], bool]:
+        """Embed a search query, reusing a cached vector; returns (vector, cache_hit)."""
+        cache = self._get_query_cache()
+        provider = self.config["embedding_provider"]
+        model = _embedding_model_name(self.config)
+        if cache:
+            vector = cache.get(provider, model, query)
+            if vector is not None:
+                return vector, True
+        vector = get_embeddings([query], self.config)[0]
+        if cache:
+            cache.put(provider, model, query, vector)
+        return vector, False
+
+    def _get_manifest(self) -> SyncManifest:
+        if self._manifest is None:
+            self._manifest = SyncManifest(self._vector_dir() / "manifest.sqlite", self.collection)
+        return self._manifest
+
+    def _read_note_content(self, note_info: Dict, notebook: str) -> Tuple[Optional[str], str]:
+        """Read the best available content for a note (md > text > html).
+
+        Returns (content, source): source is the export folder read ("md",
+        "text" or "html"), or "" when there is no readable file.
+        """
         filename = note_info.get("filename", "")
         if not filename:
-            return None
+            return None, ""
         root = Path(self.tracker.root_directory)
         uses_subdirs = self.tracker._uses_subdirs()
 
@@ -304,13 +1080,13 @@ class QdrantNotesManager:
                 path = root / folder / f"{filename}{ext}"
             if path.exists():
                 try:
-                    return path.read_text(encoding="utf-8")
+                    return path.read_text(encoding="utf-8"), folder
                 except Exception:
                     try:
-                        return path.read_text(encoding="latin-1")
+                        return path.read_text(encoding="latin-1"), folder
                     except Exception:
                         continue
-        return None
+        return None, ""
 
     def _needs_indexing(self, note_info: Dict, force: bool = False) -> bool:
         """Check if a note needs re-indexing based on lastExported vs lastIndexedToQdrant."""
@@ -327,170 +1103,510 @@ class QdrantNotesManager:
         if note_id in notebook_data:
             notebook_data[note_id]["lastIndexedToQdrant"] = notebook_data[note_id].get("lastExported", "")
 
-    def sync(self, dry_run: bool = False, force: bool = False) -> Dict[str, int]:
-        """Incremental sync: only embed changed notes, delete removed ones.
+    def _embed_isolating_errors(self, texts: List[str], metas: List[Dict],
+                                stats: Dict[str, int]) -> List[Optional[List[float]]]:
+        """Embed texts, splitting failed batches in half to isolate bad chunks.
 
-        Args:
-            dry_run: Preview what would happen without making changes.
-            force: Re-embed all notes regardless of change status.
+        Chunks that fail on their own are counted as errors and get None.
+        The embedder already isolates them for EmbeddingError; other errors
+        are bisected here. EmbeddingUnavailable is raised, ending the sync:
+        with the provider down every chunk would fail.
         """
-        self._ensure_collection()
-        stats = {"upserted": 0, "deleted": 0, "skipped": 0, "unchanged": 0, "errors": 0}
-
-        # Collect all current note IDs and identify which need updating
-        current_ids = set()       # All chunk IDs for current notes
-        texts_to_embed = []
-        point_metas = []
-        notes_needing_update = []  # Track (json_file, note_id) for marking indexed
-
+        try:
+            return get_embeddings(texts, self.config)
+        except EmbeddingError as e:
+            for i, error in sorted(e.errors.items()):
+                print(f"  Skipping {metas[i].get('filename', '?')}: {error}")
+                stats["errors"] += 1
+            return e.vectors
+        except EmbeddingUnavailable:
+            raise
+        except Exception as e:
+            if len(texts) == 1:
+                print(f"  Skipping {metas[0].get('filename', '?')}: {e}")
+                stats["errors"] += 1
+                return [None]
+        mid = len(texts) // 2
+        return (self._embed_isolating_errors(texts[:mid], metas[:mid], stats)
+                + self._embed_isolating_errors(texts[mid:], metas[mid:], stats))
+
+    def _embed_with_cache(self, texts: List[str], metas: List[Dict],
+                          stats: Dict[str, int]) -> List[Optional[List[float]]]:
+        """Embed texts, taking vectors from the embedding cache where possible.
+
+        Each distinct uncached text is sent to the provider once; the new
+        vectors are added to the cache.
+        """
+        cache = self._get_cache()
+        provider = self.config["embedding_provider"]
+        model = _embedding_model_name(self.config)
+        vectors = cache.get_many(provider, model, texts) if cache else [None] * len(texts)
+
+        first_index = {}
+        for i, (text, vector) in enumerate(zip(texts, vectors)):
+            if vector is None and text not in first_index:
+                first_index[text] = i
+        stats["cached"] += sum(1 for v in vectors if v is not None)
+
+        miss_texts = list(first_index)
+        miss_metas = [metas[i] for i in first_index.values()]
+        step = _embed_call_size(self.config)
+        fresh = []
+        for i in range(0, len(miss_texts), step):
+            batch_vectors = self._embed_isolating_errors(
+                miss_texts[i:i + step], miss_metas[i:i + step], stats)
+            if cache:
+                cache.put_many(provider, model, miss_texts[i:i + step], batch_vectors)
+            fresh.extend(batch_vectors)
+
+        by_text = dict(zip(miss_texts, fresh))
+        return [v if v is not None else by_text.get(t) for t, v in zip(texts, vectors)]
+
+    def _bootstrap_manifest(self, manifest: SyncManifest, stats: Dict[str, int]):
+        """Seed an empty manifest from tracking JSON and delete orphaned points.
+
+        Only needed once, for collections populated before the manifest
+        existed; it is the one time sync scrolls the whole collection.
+        """
+        points, _ = self.client.scroll(self.collection, limit=1, with_payload=False)
+        if not points:
+            return
+        print("Building sync manifest from the existing collection (one-time)...")
         for json_file in self.tracker.get_all_data_files():
-            notebook_data = self.tracker.load_notebook_data(json_file)
             notebook = json_file.stem
+            for note_id, note_info in self.tracker.load_notebook_data(json_file).items():
+                if "deletedDate" in note_info or not note_info.get("lastIndexedToQdrant"):
+                    continue
+                # Text hashes are unknown, so these chunks re-upsert on the next edit
+                manifest.set_chunks(notebook, note_id, [
+                    (ci, int(_make_point_id(note_id, notebook, ci)), "")
+                    for ci in range(note_info.get("qdrantChunkCount", 1))
+                ])
+
+        known_ids = manifest.point_ids()
+        orphans = []
+        offset = None
+        while True:
+            points, next_offset = self.client.scroll(self.collection, limit=SCROLL_PAGE_SIZE,
+                                                     offset=offset, with_payload=False)
+            orphans.extend(int(p["id"]) for p in points if int(p["id"]) not in known_ids)
+            if next_offset is None:
+                break
+            offset = next_offset
+        if orphans:
+            print(f"Deleting {len(orphans)} orphaned points from Qdrant...")
+            self.client.delete_points(self.collection, orphans)
+            stats["deleted"] += len(orphans)
+        manifest.commit()
+
+    @staticmethod
+    def _note_payload(note_id: str, notebook: str, note_info: Dict) -> Dict:
+        """Note-level payload shared by every chunk of a note."""
+        payload = {
+            "note_id": note_id,
+            "notebook": notebook,
+            # note_id alone is not unique: IDs come from each account's export
+            "note_key": _note_key(notebook, note_id),
+            "filename": note_info.get("filename", ""),
+            "created": note_info.get("created", ""),
+            "modified": note_info.get("modified", ""),
+        }
+        modified_ts = _date_ts(note_info.get("modified", ""))
+        if modified_ts is not None:
+            payload["modified_ts"] = modified_ts
+        return payload
+
+    def _ensure_payload_indexes(self, manifest: SyncManifest):
+        """Create missing payload indexes used by filtered search.
+
+        If the collection predates `modified_ts` or `note_key`, indexed notes
+        get them (and the rest of their note-level payload) via a one-time
+        payload update.
+        """
+        existing = self.client.payload_indexes(self.collection)
+        missing = [f for f in PAYLOAD_INDEXES if f not in existing]
+        for field in missing:
+            self.client.create_payload_index(self.collection, field, PAYLOAD_INDEXES[field])
+        if not any(f in missing for f in BACKFILLED_FIELDS) or manifest.is_empty():
+            return
 
-            for note_id, note_info in notebook_data.items():
+        print("Adding filterable fields to indexed notes (one-time)...")
+        for json_file in self.tracker.get_all_data_files():
+            notebook = json_file.stem
+            for note_id, note_info in self.tracker.load_notebook_data(json_file).items():
                 if "deletedDate" in note_info:
                     continue
+                point_ids = [pid for pid, _ in manifest.note_chunks(notebook, note_id).values()]
+                if point_ids:
+                    self.client.set_payload(self.collection,
+                                            self._note_payload(note_id, notebook, note_info),
+                                            point_ids)
+
+    def _plan_notes(self, manifest: SyncManifest, force: bool, stats: Dict[str, int],
+                    active_notes: Set[Tuple[str, str]]) -> Iterator[Dict]:
+        """Read and chunk notes, yielding one work item per note that needs indexing.
+
+        Chunks whose text hash matches the manifest are not re-embedded; the
+        item lists their point IDs for a payload refresh instead. A note
+        stamped as indexed but missing from the manifest (after a reset, or a
+        lost manifest) has no points to rely on, so it is indexed again.
+
+        With `sync_workers` > 1, that many notebooks are read and chunked at
+        once, all feeding the embedding stage; notes of different notebooks
+        then arrive interleaved.
+        """
+        chunker = get_chunker(self.config)
+        notebooks = self.tracker.get_all_data_files()
+        workers = min(max(1, self.config.get("sync_workers", 1)), len(notebooks))
+        stats_lock = threading.Lock()
+        indexed = manifest.notes()
+        plans = (self._plan_notebook(json_file, chunker, manifest, force, stats,
+                                     active_notes, indexed, stats_lock)
+                 for json_file in notebooks)
+        if workers <= 1:
+            for plan in plans:
+                yield from plan
+        else:
+            yield from _threaded_merge(
+                plans, workers, maxsize=PIPELINE_QUEUE_DEPTH * _embed_call_size(self.config))
+
+    def _plan_notebook(self, json_file: Path, chunker: Tuple, manifest: SyncManifest,
+                       force: bool, stats: Dict[str, int], active_notes: Set[Tuple[str, str]],
+                       indexed: Set[Tuple[str, str]],
+                       stats_lock: threading.Lock) -> Iterator[Dict]:
+        """Work items for the notes of one notebook (see _plan_notes)."""
+        c_size, c_overlap, tokenizer = chunker
+        notebook_data = self.tracker.load_notebook_data(json_file)
+        notebook = json_file.stem
+
+        def count(key: str):
+            with stats_lock:
+                stats[key] += 1
+
+        for note_id, note_info in notebook_data.items():
+            if "deletedDate" in note_info:
+                continue
+            active_notes.add((notebook, note_id))
+
+            # Check if this note needs re-indexing
+            if not self._needs_indexing(note_info, force) and (notebook, note_id) in indexed:
+                count("unchanged")
+                continue
+
+            content, source = self._read_note_content(note_info, notebook)
+            if not content:
+                count("skipped")
+                continue
+            normalised = (normalise_text(content)
+                          if self.config.get("normalise_text", True) else None)
+            body = normalised.text if normalised else content
+            lead = len(body) - len(body.lstrip())
+            text = _note_to_text(note_info, body.strip())
+            spans = list(chunk_spans(text, c_size, c_overlap, tokenizer)) or [(0, 0)]
+            chunks = [text[start:end] or "(empty note)" for start, end in spans]
+            # Offsets in text minus body_start are offsets in the (unstripped) body
+            body_start = len(text) - len(body.strip()) - lead
+            chunk_payloads = self._chunk_payloads(text, body_start, spans, normalised, source)
+            known = manifest.note_chunks(notebook, note_id)
+            payload = {**self._note_payload(note_id, notebook, note_info),
+                       "total_chunks": len(chunks)}
+
+            changed, unchanged_ids = [], []
+            for ci, chunk in enumerate(chunks):
+                point_id = int(_make_point_id(note_id, notebook, ci))
+                chunk_hash = text_hash(chunk)
+                if not force and known.get(ci) == (point_id, chunk_hash):
+                    unchanged_ids.append(point_id)
+                else:
+                    changed.append((ci, point_id, chunk_hash, chunk))
+
+            yield {
+                "json_file": json_file,
+                "notebook": notebook,
+                "note_id": note_id,
+                "payload": payload,
+                "chunk_payloads": chunk_payloads,
+                "chunks": changed,
+                "unchanged_ids": unchanged_ids,
+                "gone": {ci: pid for ci, (pid, _) in known.items() if ci >= len(chunks)},
+                "upserted": [],    # (chunk_index, point_id, hash) once written
+                "failed": False,
+            }
+
+    @staticmethod
+    def _chunk_payloads(text: str, body_start: int, spans: List[Tuple[int, int]],
+                        normalised: Optional[NormalisedText], source: str) -> List[Dict]:
+        """Per-chunk payload: a snippet, and where the chunk lies in the note file.
+
+        `text` is the title and the note body; `pos - body_start` is a position
+        in the body, which the normaliser maps back to the file's text (a
+        chunk that starts in the title starts at 0). `source` names the
+        export folder of that file ("md", "text" or "html").
+        """
+        def file_offset(pos: int) -> int:
+            pos = max(pos - body_start, 0)
+            return normalised.source_offset(pos) if normalised else pos
+
+        payloads = []
+        for start, end in spans:
+            payloads.append({
+                "snippet": " ".join(text[start:end].split())[:SNIPPET_CHARS],
+                "source": source,
+                "chunk_start": file_offset(start),
+                "chunk_end": (file_offset(max(end - 1, start)) + 1 if end > start
+                              else file_offset(end)),
+            })
+        return payloads
+
+    def _embed_batches(self, notes: Iterable[Dict],
+                       stats: Dict[str, int]) -> Iterator[Tuple[List[Tuple], List[Dict]]]:
+        """Embed changed chunks in provider-sized batches.
+
+        Yields (points, finished_notes): the points are (note, point, manifest
+        entry) triples ready to upsert, and finished_notes are notes whose
+        last chunk is in this batch or an earlier one.
+        """
+        step = _embed_call_size(self.config)
+        pending, finished = [], []
+        for note in notes:
+            chunks = note.pop("chunks")
+            for i, chunk in enumerate(chunks):
+                pending.append((note, chunk))
+                if i == len(chunks) - 1:
+                    finished.append(note)
+                if len(pending) >= step:
+                    yield self._embed_points(pending, stats), finished
+                    pending, finished = [], []
+            if not chunks:
+                finished.append(note)
+                # Notes with no changed chunks add no embedding work; cap how many wait
+                if len(finished) >= 4 * step:
+                    yield self._embed_points(pending, stats), finished
+                    pending, finished = [], []
+        if pending or finished:
+            yield self._embed_points(pending, stats), finished
+
+    def _embed_points(self, pending: List[Tuple[Dict, Tuple]],
+                      stats: Dict[str, int]) -> List[Tuple]:
+        if not pending:
+            return []
+        vectors = self._embed_with_cache([chunk[3] for _, chunk in pending],
+                                         [note["payload"] for note, _ in pending], stats)
+        points = []
+        for (note, (ci, point_id, chunk_hash, _)), vector in zip(pending, vectors):
+            if vector is None:
+                note["failed"] = True
+                continue
+            point = {"id": point_id, "vector": vector,
+                     "payload": {**note["payload"], "chunk_index": ci,
+                                 **note["chunk_payloads"][ci]}}
+            points.append((note, point, (ci, point_id, chunk_hash)))
+        return points
+
+    def _record_batch(self, points: List[Tuple], finished: List[Dict],
+                      manifest: SyncManifest, json_updates: Dict[str, Dict],
+                      stats: Dict[str, int]):
+        """Record an upserted batch and checkpoint the notes it completed.
+
+        Upserted chunks go into the manifest straight away and finished notes
+        are marked indexed in tracking JSON before the next batch is recorded,
+        so an interrupted sync resumes from the last batch instead of the start.
+        """
+        if points:
+            stats["upserted"] += len(points)
+            written = defaultdict(list)
+            for note, _, entry in points:
+                written[(note["notebook"], note["note_id"])].append(entry)
+            for (notebook, note_id), entries in written.items():
+                manifest.set_chunks(notebook, note_id, entries)
+
+        stale = []
+        touched = set()
+        for note in finished:
+            notebook, note_id = note["notebook"], note["note_id"]
+            # Chunks whose text is unchanged only need their note-level metadata refreshed
+            if note["unchanged_ids"]:
+                self.client.set_payload(self.collection, note["payload"], note["unchanged_ids"])
+            if note["gone"]:
+                stale.extend(note["gone"].values())
+                manifest.remove_chunks(notebook, note_id, note["gone"])
+            # Only mark as indexed AFTER successful upsert, and only if every chunk made it
+            if note["failed"]:
+                continue
+            jf = str(note["json_file"])
+            if jf not in json_updates:
+                json_updates[jf] = self.tracker.load_notebook_data(jf)
+            self._mark_indexed(note["json_file"], note_id, json_updates[jf])
+            json_updates[jf][note_id]["qdrantChunkCount"] = note["payload"]["total_chunks"]
+            stats["indexed"] += 1
+            touched.add(jf)
+
+        if stale:
+            self.client.delete_points(self.collection, stale)
+            stats["deleted"] += len(stale)
+        manifest.commit()
+        for jf in touched:
+            self.tracker.save_notebook_data(jf, json_updates[jf])
 
-                # Register all possible chunk IDs for this note (for deletion tracking)
-                # We use a generous upper bound; actual chunks may be fewer
-                last_chunk_count = note_info.get("qdrantChunkCount", 1)
-                for ci in range(max(last_chunk_count, 50)):
-                    current_ids.add(_make_point_id(note_id, notebook, ci))
+    def sync(self, dry_run: bool = False, force: bool = False) -> Dict[str, int]:
+        """Incremental sync: only embed changed chunks, delete removed ones.
 
-                # Check if this note needs re-indexing
-                if not self._needs_indexing(note_info, force):
-                    stats["unchanged"] += 1
-                    continue
+        The manifest records the point ID and text hash of every chunk in the
+        collection, so an edited note only re-embeds chunks whose text changed
+        (the rest get a payload update), and deletions are computed locally.
 
-                content = self._read_note_content(note_info, notebook)
-                if not content:
-                    stats["skipped"] += 1
-                    continue
+        Sync runs as a pipeline — read and chunk, embed, upsert and record —
+        with each stage in its own thread and bounded queues between them, so
+        memory stays flat however large the library is. With `sync_workers`
+        > 1 the read stage runs one thread per notebook, up to that many. Every batch is
+        checkpointed (manifest and tracking JSON), so an interrupted sync
+        resumes where it stopped.
 
-                text = _note_to_text(note_info, content)
-                c_size, c_overlap = _get_chunk_config()
-                chunks = chunk_text(text, chunk_size=c_size, overlap=c_overlap)
-
-                for ci, chunk in enumerate(chunks):
-                    point_id = _make_point_id(note_id, notebook, ci)
-                    texts_to_embed.append(chunk)
-                    point_metas.append({
-                        "point_id": point_id,
-                        "note_id": note_id,
-                        "notebook": notebook,
-                        "filename": note_info.get("filename", ""),
-                        "created": note_info.get("created", ""),
-                        "modified": note_info.get("modified", ""),
-                        "chunk_index": ci,
-                        "total_chunks": len(chunks),
-                        "json_file": json_file,
-                    })
-
-                notes_needing_update.append((json_file, note_id, len(chunks)))
+        Up to `upsert_parallel` batches are upserted at once with wait=false
+        and checkpointed, in order, as Qdrant acknowledges them; the last
+        batch is sent with wait=true as a barrier. Once `bulk_load_points`
+        points have been sent, HNSW indexing is switched off until the end.
+
+        Args:
+            dry_run: Preview what would happen without making changes.
+            force: Re-upsert every chunk of every note regardless of change status.
+        """
+        self._ensure_collection(rebuild=force and not dry_run)
+        manifest = self._get_manifest()
+        stats = {"upserted": 0, "deleted": 0, "skipped": 0, "unchanged": 0, "errors": 0,
+                 "cached": 0, "indexed": 0}
+        if not dry_run:
+            if manifest.is_empty():
+                self._bootstrap_manifest(manifest, stats)
+            self._ensure_payload_indexes(manifest)
+
+        active_notes = set()       # (notebook, note_id) of every current note
+        notes = self._plan_notes(manifest, force, stats, active_notes)
+        embedder = get_embedder(self.config)
+        first_metric = len(embedder.metrics)
 
         if dry_run:
-            note_count = len(notes_needing_update)
-            chunk_count = len(texts_to_embed)
-            print(f"[DRY RUN] Would upsert {note_count} notes ({chunk_count} chunks) "
+            note_count = chunk_count = 0
+            for note in notes:
+                note_count += 1
+                chunk_count += len(note["chunks"])
+            removed_notes = manifest.notes() - active_notes
+            print(f"[DRY RUN] Would upsert {note_count} notes ({chunk_count} changed chunks) "
+                  f"and remove {len(removed_notes)} deleted notes "
                   f"({stats['unchanged']} unchanged, {stats['skipped']} skipped)")
             stats["upserted"] = note_count
             return stats
 
-        # Embed and upsert only changed notes
-        points_to_upsert = []
-        if texts_to_embed:
-            print(f"Embedding {len(texts_to_embed)} changed notes "
-                  f"({stats['unchanged']} unchanged, skipping those)...")
-            batch_size = 32
-            all_vectors = []
-            for i in range(0, len(texts_to_embed), batch_size):
-                batch = texts_to_embed[i:i + batch_size]
-                try:
-                    vectors = get_embeddings(batch, self.config)
-                    all_vectors.extend(vectors)
-                except Exception:
-                    # Batch failed — fall back to one-at-a-time
-                    for j, single_text in enumerate(batch):
-                        try:
-                            vec = get_embeddings([single_text], self.config)
-                            all_vectors.append(vec[0])
-                        except Exception as e2:
-                            fn = point_metas[i + j].get("filename", "?")
-                            print(f"  Skipping {fn}: {e2}")
-                            stats["errors"] += 1
-                            all_vectors.append(None)
-
-            # Build points
-            for meta, vector in zip(point_metas, all_vectors):
-                if vector is None:
-                    continue
-                points_to_upsert.append({
-                    "id": int(meta["point_id"]),
-                    "vector": vector,
-                    "payload": {
-                        "note_id": meta["note_id"],
-                        "notebook": meta["notebook"],
-                        "filename": meta["filename"],
-                        "created": meta["created"],
-                        "modified": meta["modified"],
-                        "chunk_index": meta["chunk_index"],
-                        "total_chunks": meta["total_chunks"],
-                    },
-                })
-
-            # Upsert
-            print(f"Upserting {len(points_to_upsert)} points to Qdrant...")
-            self.client.upsert_points(self.collection, points_to_upsert)
-            stats["upserted"] = len(points_to_upsert)
-
-            # Only mark as indexed AFTER successful upsert
-            upserted_note_ids = {p["payload"]["note_id"] for p in points_to_upsert}
-            json_updates = {}
-            for json_file, note_id, chunk_count in notes_needing_update:
-                if note_id in upserted_note_ids:
-                    jf = str(json_file)
-                    if jf not in json_updates:
-                        json_updates[jf] = self.tracker.load_notebook_data(jf)
-                    self._mark_indexed(json_file, note_id, json_updates[jf])
-                    json_updates[jf][note_id]["qdrantChunkCount"] = chunk_count
-            for json_path_str, notebook_data in json_updates.items():
-                self.tracker.save_notebook_data(json_path_str, notebook_data)
-
-        # Delete points that are no longer in the export
-        existing_ids = set()
-        offset = None
-        while True:
-            points, next_offset = self.client.scroll(self.collection, limit=100, offset=offset)
-            for p in points:
-                existing_ids.add(str(p["id"]))
-            if next_offset is None:
-                break
-            offset = next_offset
-
-        to_delete = existing_ids - {str(int(pid)) for pid in current_ids}
+        json_updates = {}
+        parallel = max(1, self.config.get("upsert_parallel", DEFAULT_UPSERT_PARALLEL))
+        bulk_points = self.config.get("bulk_load_points", DEFAULT_BULK_LOAD_POINTS)
+        in_flight = deque()        # (batch, upsert future, points, finished), oldest first
+        held = None                # Newest batch; sent last as the wait=true barrier
+        submitted = 0
+        restore_threshold = None
+
+        def record(batch, future, points, finished):
+            if future is not None:
+                future.result()
+            self._record_batch(points, finished, manifest, json_updates, stats)
+            fmt.emit("progress", command="sync", batch=batch, batch_points=len(points), **stats)
+            print(f"  Batch {batch}: {stats['upserted']} chunks upserted, "
+                  f"{stats['indexed']} notes indexed")
+
+        def upsert(points, wait):
+            self.client.upsert_points(self.collection, [p for _, p, _ in points], wait=wait)
+
+        depth = PIPELINE_QUEUE_DEPTH
+        notes = _threaded(notes, maxsize=depth * _embed_call_size(self.config))
+        try:
+            with ThreadPoolExecutor(max_workers=parallel) as upserter, \
+                    closing(_threaded(self._embed_batches(notes, stats), maxsize=depth)) as batches:
+                for batch, (points, finished) in enumerate(batches, 1):
+                    if held is not None:
+                        held_batch, held_points, held_finished = held
+                        future = upserter.submit(upsert, held_points, False) if held_points else None
+                        in_flight.append((held_batch, future, held_points, held_finished))
+                    held = (batch, points, finished)
+                    while len(in_flight) >= parallel:
+                        record(*in_flight.popleft())
+
+                    submitted += len(points)
+                    if bulk_points and submitted >= bulk_points and restore_threshold is None:
+                        # Bulk load: build the HNSW index once at the end, not as points arrive
+                        # A configured threshold of 0 (always index) is restored as is
+                        current = self.client.get_indexing_threshold(self.collection)
+                        restore_threshold = (current if current is not None
+                                             else DEFAULT_INDEXING_THRESHOLD)
+                        self.client.set_indexing_threshold(self.collection, 0)
+                        print("  Bulk load: indexing deferred until sync finishes")
+
+                while in_flight:
+                    record(*in_flight.popleft())
+                if held is not None:
+                    # Every earlier batch is acknowledged; this one waits until all are applied
+                    batch, points, finished = held
+                    if points:
+                        upsert(points, True)
+                    record(batch, None, points, finished)
+        finally:
+            if restore_threshold is not None:
+                self.client.set_indexing_threshold(self.collection, restore_threshold)
+
+        # Delete all points of removed notes
+        to_delete = []
+        for notebook, note_id in manifest.notes() - active_notes:
+            to_delete.extend(manifest.remove_note(notebook, note_id))
         if to_delete:
-            print(f"Deleting {len(to_delete)} removed notes from Qdrant...")
-            self.client.delete_points(self.collection, [int(pid) for pid in to_delete])
-            stats["deleted"] = len(to_delete)
-
-        fmt.emit("summary", command="sync", **stats)
+            print(f"Deleting {len(to_delete)} stale points from Qdrant...")
+            self.client.delete_points(self.collection, to_delete)
+            stats["deleted"] += len(to_delete)
+        manifest.commit()
+        if force and self._model_unverified and not stats["errors"]:
+            # Every vector now comes from the configured model
+            self._save_model_state(self._get_dim())
+            self._model_unverified = False
+
+        if self._cache:
+            self._cache.evict()
+
+        latency = embedder.latency_summary(first_metric)
+        fmt.emit("summary", command="sync", embedding=latency, **stats)
         print(f"Qdrant sync: {stats['upserted']} upserted, {stats['unchanged']} unchanged, "
               f"{stats['deleted']} deleted, {stats['skipped']} skipped, "
-              f"{stats['errors']} errors")
+              f"{stats['errors']} errors, {stats['cached']} chunks from cache")
+        if latency["batches"]:
+            print(f"Embedding: {latency['batches']} requests ({latency['failed']} failed), "
+                  f"p50 {latency['p50_ms']:.0f} ms, p95 {latency['p95_ms']:.0f} ms, "
+                  f"batch size {latency['batch_size']}")
         return stats
 
     def search(self, query: str, limit: int = 10,
-               score_threshold: float = 0.0) -> List[Dict]:
+               score_threshold: float = 0.0,
+               notebooks: Optional[List[str]] = None,
+               modified_after: Optional[datetime] = None,
+               modified_before: Optional[datetime] = None) -> List[Dict]:
         """Semantic search for notes matching a query.
 
-        Returns deduplicated results — if multiple chunks of the same note match,
-        only the highest-scoring chunk is returned.
+        Returns the top `limit` distinct notes — Qdrant groups hits by
+        note_key (notebook and note_id) and keeps each note's highest-scoring
+        chunk. Notebook and modification date restrictions are applied by
+        Qdrant, not after the fact.
         """
         self._ensure_collection()
-        vectors = get_embeddings([query], self.config)
-        # Fetch more results than requested to account for deduplication
-        raw_results = self.client.search(self.collection, vectors[0],
-                                         limit=limit * 3, score_threshold=score_threshold)
+        vector, cache_hit = self._embed_query(query)
+        self.last_query_cached = cache_hit
+        query_filter = build_search_filter(notebooks, modified_after, modified_before)
+        # Until the next sync backfills note_key, older collections can only group by note_id
+        group_by = ("note_key" if "note_key" in self.client.payload_indexes(self.collection)
+                    else "note_id")
+        try:
+            raw_results = self.client.search_groups(self.collection, vector, limit=limit,
+                                                    group_by=group_by,
+                                                    score_threshold=score_threshold,
+                                                    query_filter=query_filter)
+        except RuntimeError:
+            # Grouping unsupported (older Qdrant): page through chunks instead
+            raw_results = self._search_unique(vector, limit, score_threshold, query_filter)
 
         # Deduplicate by note_id, keeping the best score
         seen = {}
@@ -508,15 +1624,214 @@ class QdrantNotesManager:
                     "modified": payload.get("modified", ""),
                     "chunk_index": payload.get("chunk_index", 0),
                     "total_chunks": payload.get("total_chunks", 1),
+                    "snippet": payload.get("snippet", ""),
+                    "source": payload.get("source"),
+                    "chunk_start": payload.get("chunk_start"),
+                    "chunk_end": payload.get("chunk_end"),
                 }
 
         formatted = sorted(seen.values(), key=lambda x: x["score"], reverse=True)
         results = formatted[:limit]
         for r in results:
             fmt.emit("result", **r)
-        fmt.emit("summary", command="search", total_results=len(results))
+        fmt.emit("summary", command="search", total_results=len(results),
+                 query_cache_hit=cache_hit)
         return results
 
+    def _search_unique(self, vector: List[float], limit: int, score_threshold: float,
+                       query_filter: Optional[Dict]) -> List[Dict]:
+        """Page through chunk hits until `limit` distinct notes are found or hits run out."""
+        page_size = max(limit * 3, 30)
+        hits, notes, offset = [], set(), 0
+        while len(notes) < limit:
+            page = self.client.search(self.collection, vector, limit=page_size,
+                                      score_threshold=score_threshold,
+                                      query_filter=query_filter, offset=offset)
+            hits.extend(page)
+            notes.update(_note_key(r.get("payload", {}).get("notebook", ""),
+                                   r.get("payload", {}).get("note_id", "")) for r in page)
+            if len(page) < page_size:
+                break
+            offset += page_size
+        return hits
+
+    def reconfigure(self) -> Dict[str, Any]:
+        """Apply the configured storage options to the existing collection.
+
+        Vectors and payloads are kept, so nothing is re-embedded; Qdrant
+        re-quantizes and moves vectors in the background.
+        """
+        options = collection_options(self.config)
+        if self.config.get("vector_backend") == "local":
+            raise RuntimeError("The local vector backend has no collection options to change")
+        if not self.client.collection_exists(self.collection):
+            raise RuntimeError(f"Collection '{self.collection}' does not exist. "
+                               "Run 'sync' to create it.")
+        self.client.update_collection(self.collection, **options)
+        return options
+
+    def create_snapshot(self, path: Path) -> Dict[str, int]:
+        """Write every point (with vectors), the manifest and tracking stamps to `path`.
+
+        Returns the counts of points, manifest notes and stamped notebooks.
+        """
+        if not self.client.collection_exists(self.collection):
+            raise RuntimeError(f"Collection '{self.collection}' does not exist")
+        self._check_collection_model()
+        dim = self.client.collection_metadata(self.collection).get("dimension") or self._get_dim()
+        header = {"collection": self.collection, **_model_identity(self.config),
+                  "dimension": dim}
+
+        with SnapshotWriter(path, header) as writer:
+            offset = None
+            while True:
+                points, offset = self.client.scroll(self.collection, limit=SNAPSHOT_PAGE_SIZE,
+                                                    offset=offset, with_payload=True,
+                                                    with_vector=True)
+                for point in points:
+                    writer.point(point)
+                if offset is None:
+                    break
+            for notebook, note_id, chunks in self._get_manifest().note_rows():
+                writer.manifest(notebook, note_id, chunks)
+            for json_file in self.tracker.get_all_data_files():
+                stamps = {note_id: {k: info[k] for k in STAMP_KEYS if k in info}
+                          for note_id, info in self.tracker.load_notebook_data(json_file).items()
+                          if info.get("lastIndexedToQdrant")}
+                if stamps:
+                    writer.stamps(json_file.stem, stamps)
+        return writer.counts
+
+    def build_related_graph(self, k: int = DEFAULT_NEIGHBOURS) -> Dict[str, Any]:
+        """Compute every note's top-k related notes from the stored vectors and save them.
+
+        Vectors are scrolled from the collection, not re-embedded; the graph
+        is written to related_graph_path(). Needs numpy.
+        """
+        from related_notes import build_graph, collect_note_vectors, save_graph
+
+        def pages():
+            offset = None
+            while True:
+                points, offset = self.client.scroll(
+                    self.collection, limit=SNAPSHOT_PAGE_SIZE, offset=offset,
+                    with_payload=["note_id", "notebook", "filename"], with_vector=True)
+                yield points
+                if offset is None:
+                    return
+
+        vectors = collect_note_vectors(pages())
+        graph = build_graph(vectors, k)
+        path = related_graph_path(self.config, self.tracker)
+        save_graph(path, graph, collection=self.collection, k=k,
+                   **_model_identity(self.config))
+        return {"notes": len(vectors), "k": min(k, max(len(vectors) - 1, 0)), "path": str(path)}
+
+    def restore_snapshot(self, path: Path) -> Dict[str, int]:
+        """Replace the collection with a snapshot's points, manifest and tracking stamps.
+
+        No text is embedded. A note is stamped as indexed only if it was
+        exported at the same time on both machines; any other note is
+        picked up by the next sync, which re-embeds only chunks whose text
+        differs from the manifest.
+
+        The whole file is validated first, so a truncated or corrupt
+        snapshot is refused before the live collection is touched. Until
+        the restore finishes, tracking JSON says nothing is indexed, so an
+        interrupted restore is repaired by the next sync.
+        """
+        header = validate_snapshot(path)
+        identity = _model_identity(self.config)
+        built_with = {k: header.get(k) for k in identity}
+        if built_with != identity:
+            raise EmbeddingModelMismatch(
+                f"Snapshot {path} was built with {built_with['embedding_provider']} model "
+                f"'{built_with['embedding_model']}', but the configured model is "
+                f"{identity['embedding_provider']} '{identity['embedding_model']}'.\n"
+                "Configure the snapshot's model before restoring it.")
+        dim = header["dimension"]
+
+        if self.client.collection_exists(self.collection):
+            print(f"Replacing collection '{self.collection}'...")
+            self.client.delete_collection(self.collection)
+        self.client.create_collection(self.collection, dim, metadata=identity,
+                                      **collection_options(self.config))
+        self._save_model_state(dim)
+        self._dim = dim
+        self._collection_checked = True
+        manifest = self._get_manifest()
+        manifest.clear()
+        self._set_stamps({})
+
+        _, records = read_snapshot(path)
+        counts = {"points": 0, "notes": 0, "stamped": 0, "unstamped": 0}
+        stamps = {}
+        batch = []
+        # Bulk load: build the HNSW index once at the end, not as points arrive
+        self.client.set_indexing_threshold(self.collection, 0)
+        try:
+            for record in records:
+                kind = record["kind"]
+                if kind == "point":
+                    batch.append({"id": record["id"], "vector": record["vector"],
+                                  "payload": record["payload"]})
+                    if len(batch) >= SNAPSHOT_PAGE_SIZE:
+                        self.client.upsert_points(self.collection, batch)
+                        counts["points"] += len(batch)
+                        batch = []
+                elif kind == "manifest":
+                    manifest.set_chunks(record["notebook"], record["note_id"],
+                                        [tuple(c) for c in record["chunks"]])
+                    counts["notes"] += 1
+                elif kind == "stamps":
+                    stamps[record["notebook"]] = record["notes"]
+            if batch:
+                self.client.upsert_points(self.collection, batch)
+                counts["points"] += len(batch)
+        finally:
+            self.client.set_indexing_threshold(self.collection, DEFAULT_INDEXING_THRESHOLD)
+        manifest.commit()
+        counts.update(self._set_stamps(stamps))
+        return counts
+
+    def _set_stamps(self, stamps: Dict[str, Dict[str, Dict]]) -> Dict[str, int]:
+        """Make tracking JSON say exactly which notes `stamps` ({notebook: {note_id: ...}}) indexed.
+
+        A stamp only applies while the note's lastExported still matches it.
+        """
+        counts = {"stamped": 0, "unstamped": 0}
+        for json_file in self.tracker.get_all_data_files():
+            data = self.tracker.load_notebook_data(json_file)
+            notebook_stamps = stamps.get(json_file.stem, {})
+            changed = False
+            for note_id, info in data.items():
+                stamp = notebook_stamps.get(note_id)
+                if stamp and stamp.get("lastIndexedToQdrant") == info.get("lastExported"):
+                    changed |= any(info.get(k) != v for k, v in stamp.items())
+                    info.update(stamp)
+                    counts["stamped"] += 1
+                    continue
+                if any(k in info for k in STAMP_KEYS):
+                    for k in STAMP_KEYS:
+                        info.pop(k, None)
+                    changed = True
+                if "deletedDate" not in info:
+                    counts["unstamped"] += 1
+            if changed:
+                self.tracker.save_notebook_data(json_file, data)
+        return counts
+
+    def reset(self):
+        """Delete the collection, its manifest and every note's indexed stamp.
+
+        The next sync then creates the collection afresh and embeds every note.
+        """
+        self.client.delete_collection(self.collection)
+        self._get_manifest().clear()
+        self._set_stamps({})
+        self._collection_checked = False
+        self._model_unverified = False
+
     def status(self) -> Dict:
         """Get collection status."""
         try:
@@ -530,12 +1845,31 @@ class QdrantNotesManager:
 
 def check_prerequisites(config: Optional[Dict] = None) -> Dict[str, Any]:
     """Check if Docker, Qdrant, and embedding provider are available."""
-    import subprocess
     if config is None:
         config = _get_config()
 
     status = {"docker": False, "qdrant": False, "embeddings": False, "details": []}
 
+    if config.get("vector_backend") == "local":
+        # Embedded index: no Docker or server, only numpy
+        status["docker"] = True
+        if importlib.util.find_spec("numpy") is not None:
+            status["qdrant"] = True
+            status["details"].append(
+                f"Vector backend: local index in {_vector_dir(config) / 'index'}")
+            status["details"].append("numpy: installed")
+        else:
+            status["details"].append("Vector backend: local, but numpy is not installed")
+            status["details"].append("  Install with: pip install numpy")
+    else:
+        _check_qdrant_server(config, status)
+
+    _check_embedding_provider(config, status)
+    return status
+
+
+def _check_qdrant_server(config: Dict, status: Dict[str, Any]):
+    import subprocess
     # Check Docker
     try:
         result = subprocess.run(["docker", "info"], capture_output=True, timeout=10)
@@ -562,7 +1896,8 @@ def check_prerequisites(config: Optional[Dict] = None) -> Dict[str, Any]:
         else:
             status["details"].append("  Start with: docker-compose up -d (in your qdrant directory)")
 
-    # Check embedding provider
+
+def _check_embedding_provider(config: Dict, status: Dict[str, Any]):
     provider = config["embedding_provider"]
     if provider == "ollama":
         try:
@@ -590,8 +1925,6 @@ def check_prerequisites(config: Optional[Dict] = None) -> Dict[str, Any]:
             status["details"].append("sentence-transformers: not installed")
             status["details"].append("  Install with: pip install sentence-transformers")
 
-    return status
-
 
 def main():
     import argparse
@@ -602,11 +1935,14 @@ def main():
 
     sync_p = sub.add_parser("sync", help="Sync changed notes to Qdrant")
     sync_p.add_argument("--force", action="store_true",
-                        help="Re-embed all notes, not just changed ones")
+                        help="Re-upsert all notes, not just changed ones")
     sync_p.add_argument("--chunk-size", type=int, default=None,
                         help=f"Characters per chunk (default: {DEFAULT_CHUNK_SIZE})")
     sync_p.add_argument("--chunk-overlap", type=int, default=None,
                         help=f"Overlap between chunks (default: {DEFAULT_CHUNK_OVERLAP})")
+    sync_p.add_argument("--workers", type=int, default=None,
+                        help="Notebooks to read and chunk in parallel "
+                             "(default: NOTES_EXPORT_QDRANT_SYNC_WORKERS or 1)")
     sub.add_parser("status", help="Show Qdrant collection status")
     sub.add_parser("check", help="Check prerequisites (Docker, Qdrant, embeddings)")
 
@@ -615,9 +1951,24 @@ def main():
     search_p.add_argument("-n", "--limit", type=int, default=10)
     search_p.add_argument("--threshold", type=float, default=0.0)
 
-    sub.add_parser("reset", help="Delete and recreate the collection")
+    reset_p = sub.add_parser("reset", help="Delete and recreate the collection")
+    reset_p.add_argument("--reconfigure", action="store_true",
+                         help="Keep the points and apply the current quantization, "
+                              "on-disk and HNSW settings instead of deleting")
     sub.add_parser("dry-run", help="Show what sync would do")
 
+    related_p = sub.add_parser("related", help="Precompute each note's related notes "
+                                               "(for query_notes.py --related)")
+    related_p.add_argument("-k", type=int, default=DEFAULT_NEIGHBOURS,
+                           help=f"Related notes kept per note (default: {DEFAULT_NEIGHBOURS})")
+
+    snapshot_p = sub.add_parser("snapshot", help="Save or restore the collection with its "
+                                                 "vectors, manifest and tracking stamps")
+    snapshot_p.add_argument("action", choices=["create", "restore"])
+    snapshot_p.add_argument("path", nargs="?", default=None,
+                            help="Snapshot file (create default: "
+                                 "<vector dir>/snapshots/<collection>-<timestamp>.jsonl.gz)")
+
     args = parser.parse_args()
     fmt.setup_from_args(args)
 
@@ -640,7 +1991,7 @@ def main():
             print("All prerequisites met. Ready to sync.")
         else:
             print("Some prerequisites missing. See above for details.")
-            if not result["qdrant"] and result["docker"]:
+            if not result["qdrant"] and result["docker"] and config.get("vector_backend") != "local":
                 print("\nQuick start Qdrant with Docker:")
                 print("  docker run -d -p 6333:6333 -v qdrant_storage:/qdrant/storage qdrant/qdrant")
         fmt.close()
@@ -648,40 +1999,100 @@ def main():
 
     mgr = QdrantNotesManager()
 
-    if args.command == "sync":
-        if args.chunk_size is not None:
-            os.environ["NOTES_EXPORT_CHUNK_SIZE"] = str(args.chunk_size)
-        if args.chunk_overlap is not None:
-            os.environ["NOTES_EXPORT_CHUNK_OVERLAP"] = str(args.chunk_overlap)
-        mgr.sync(force=args.force)
-    elif args.command == "dry-run":
-        mgr.sync(dry_run=True)
-    elif args.command == "status":
-        s = mgr.status()
-        fmt.emit("status", command="status", **s)
-        print(f"Collection: {s['collection']}")
-        print(f"Exists: {s['exists']}")
-        print(f"Points: {s['count']}")
-    elif args.command == "search":
-        results = mgr.search(args.query, limit=args.limit,
-                             score_threshold=args.threshold)
-        if not results:
-            print("No results found.")
-            fmt.close()
-            return
-        for i, r in enumerate(results, 1):
-            print(f"{i}. [{r['score']:.3f}] {r['filename']} ({r['notebook']})")
-            if r['modified']:
-                print(f"   Modified: {r['modified']}")
-    elif args.command == "reset":
-        print(f"Deleting collection '{mgr.collection}'...")
-        try:
-            mgr.client.delete_collection(mgr.collection)
-            fmt.emit("status", command="reset", collection=mgr.collection, deleted=True)
-            print("Deleted. Run 'sync' to rebuild.")
-        except RuntimeError as e:
-            fmt.emit("error", command="reset", message=str(e))
-            print(f"Error: {e}")
+    try:
+        if args.command == "sync":
+            if args.chunk_size is not None:
+                os.environ["NOTES_EXPORT_CHUNK_SIZE"] = str(args.chunk_size)
+            if args.chunk_overlap is not None:
+                os.environ["NOTES_EXPORT_CHUNK_OVERLAP"] = str(args.chunk_overlap)
+            if args.workers is not None:
+                mgr.config["sync_workers"] = args.workers
+            mgr.sync(force=args.force)
+        elif args.command == "dry-run":
+            mgr.sync(dry_run=True)
+        elif args.command == "status":
+            s = mgr.status()
+            fmt.emit("status", command="status", **s)
+            print(f"Collection: {s['collection']}")
+            print(f"Exists: {s['exists']}")
+            print(f"Points: {s['count']}")
+        elif args.command == "search":
+            results = mgr.search(args.query, limit=args.limit,
+                                 score_threshold=args.threshold)
+            if not results:
+                print("No results found.")
+                fmt.close()
+                return
+            for i, r in enumerate(results, 1):
+                print(f"{i}. [{r['score']:.3f}] {r['filename']} ({r['notebook']})")
+                if r['modified']:
+                    print(f"   Modified: {r['modified']}")
+                if r['snippet']:
+                    print(f"   {r['snippet']}")
+        elif args.command == "related":
+            try:
+                result = mgr.build_related_graph(args.k)
+                fmt.emit("status", command="related", **result)
+                print(f"Related notes for {result['notes']} notes "
+                      f"({result['k']} each) saved to {result['path']}")
+            except (RuntimeError, ImportError) as e:
+                fmt.emit("error", command="related", message=str(e))
+                print(f"Error: {e}")
+        elif args.command == "snapshot" and args.action == "create":
+            path = Path(args.path) if args.path else (
+                mgr._vector_dir() / "snapshots"
+                / f"{mgr.collection}-{datetime.now():%Y%m%d-%H%M%S}.jsonl.gz")
+            try:
+                counts = mgr.create_snapshot(path)
+                fmt.emit("status", command="snapshot", action="create", path=str(path), **counts)
+                print(f"Snapshot written to {path}: {counts['points']} points, "
+                      f"{counts['notes']} notes in the manifest")
+            except EmbeddingModelMismatch:
+                raise
+            except RuntimeError as e:
+                fmt.emit("error", command="snapshot", message=str(e))
+                print(f"Error: {e}")
+        elif args.command == "snapshot":
+            if not args.path:
+                parser.error("snapshot restore needs the snapshot file")
+            try:
+                counts = mgr.restore_snapshot(Path(args.path))
+                fmt.emit("status", command="snapshot", action="restore", path=args.path, **counts)
+                print(f"Restored {counts['points']} points and {counts['notes']} notes "
+                      f"into '{mgr.collection}' without embedding")
+                print(f"{counts['stamped']} notes marked indexed; {counts['unstamped']} "
+                      "changed or missing notes will be picked up by the next sync")
+            except EmbeddingModelMismatch:
+                raise
+            except (RuntimeError, ValueError, OSError) as e:
+                fmt.emit("error", command="snapshot", message=str(e))
+                print(f"Error: {e}")
+        elif args.command == "reset" and args.reconfigure:
+            try:
+                options = mgr.reconfigure()
+                fmt.emit("status", command="reset", collection=mgr.collection,
+                         reconfigured=True, **options)
+                print(f"Reconfigured collection '{mgr.collection}': "
+                      f"quantization={mgr.config['quantization']}, on_disk={options['on_disk']}, "
+                      f"hnsw={options['hnsw_config'] or 'default'}")
+                print("Qdrant applies the change in the background; search keeps working.")
+            except (RuntimeError, ValueError) as e:
+                fmt.emit("error", command="reset", message=str(e))
+                print(f"Error: {e}")
+        elif args.command == "reset":
+            print(f"Deleting collection '{mgr.collection}'...")
+            try:
+                mgr.reset()
+                fmt.emit("status", command="reset", collection=mgr.collection, deleted=True)
+                print("Deleted. Run 'sync' to rebuild.")
+            except RuntimeError as e:
+                fmt.emit("error", command="reset", message=str(e))
+                print(f"Error: {e}")
+    except EmbeddingModelMismatch as e:
+        fmt.emit("error", command=args.command, message=str(e))
+        print(f"Error: {e}", file=sys.stderr)
+        fmt.close()
+        sys.exit(1)
 
     fmt.close()
 
@@ -8,6 +8,7 @@ Usage:
     python query_notes.py -i "case insensitive"
     python query_notes.py -c 2 "term"          # show 2 lines of context
     python query_notes.py -l "term"             # list matching files only
+    python query_notes.py --sort modified --first "term"  # newest match only
 """
 
 import argparse
@@ -15,8 +16,10 @@ import json
 import os
 import re
 import sys
+from collections import deque
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Optional
 
 from notes_export_utils import get_tracker
 import output_format as outfmt
@@ -50,6 +53,17 @@ def parse_date_arg(date_str: str):
     raise ValueError(f"Cannot parse date: '{date_str}'. Use YYYY-MM-DD format.")
 
 
+def _non_negative_int(value: str) -> int:
+    """argparse type for counts where 0 means unlimited."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: '{value}'")
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, got {number}")
+    return number
+
+
 def parse_timespan(span: str) -> timedelta:
     """Parse a human-readable timespan like '5h', '3d', '2w', '2m', '1y'.
 
@@ -84,55 +98,84 @@ def parse_timespan(span: str) -> timedelta:
     raise ValueError(f"Unknown time unit: '{unit}'")
 
 
-def search_file(file_path: Path, pattern: re.Pattern,
+def _read_lines(file_path: Path, encoding: str):
+    """Yield the lines of a file one at a time, split exactly like str.splitlines()."""
+    # newline='' keeps \r, \n and \r\n as physical line ends; splitlines()
+    # then handles the rarer separators (\f, \v, \u2028, ...) within a line.
+    with open(file_path, 'r', encoding=encoding, newline='') as f:
+        for physical_line in f:
+            yield from physical_line.splitlines()
+
+
+def _scan_lines(lines, file_path: Path, pattern: re.Pattern,
                 context_lines: int = 0, files_only: bool = False,
                 max_matches: int = 0) -> list:
-    """Search a single file for the pattern. Returns list of match dicts."""
+    """Match lines from an iterator, holding only the context window in memory.
+
+    Lines before a match come from a ring buffer of `context_lines` entries;
+    matches still waiting for trailing context stay pending until it arrives.
+    """
     matches = []
+    before = deque(maxlen=context_lines)
+    pending = []  # [context list, trailing lines still needed]
+    limit_reached = False
+
+    for i, line in enumerate(lines):
+        if pending:
+            for entry in pending:
+                entry[0].append(f"    {i + 1:4d} | {line}")
+                entry[1] -= 1
+            pending = [entry for entry in pending if entry[1] > 0]
+
+        if not limit_reached and pattern.search(line):
+            if files_only:
+                matches.append({'file': file_path, 'line_num': i + 1})
+                return matches  # One match is enough for files-only mode
+
+            first = i - len(before)
+            context = [f"    {first + k + 1:4d} | {prev}" for k, prev in enumerate(before)]
+            context.append(f"  > {i + 1:4d} | {line}")
+            matches.append({
+                'file': file_path,
+                'line_num': i + 1,
+                'line': line,
+                'context': context,
+            })
+            if context_lines:
+                pending.append([context, context_lines])
+
+            if max_matches and len(matches) >= max_matches:
+                limit_reached = True
+
+        if limit_reached and not pending:
+            break  # Nothing left to collect; skip the rest of the file
+        before.append(line)
+
+    for match in matches:
+        match['context'] = '\n'.join(match['context'])
+    return matches
+
+
+def search_file(file_path: Path, pattern: re.Pattern,
+                context_lines: int = 0, files_only: bool = False,
+                max_matches: int = 0) -> list:
+    """Search a single file for the pattern. Returns list of match dicts.
+
+    The file is streamed line by line, so memory use depends on the context
+    window and number of matches rather than on the file size.
+    """
     try:
-        # Try multiple encodings
-        content = None
+        # Try multiple encodings; a decode error part-way through restarts the scan
         for encoding in ['utf-8', 'MacRoman', 'latin-1']:
             try:
-                with open(file_path, 'r', encoding=encoding) as f:
-                    content = f.read()
-                break
+                return _scan_lines(_read_lines(file_path, encoding), file_path,
+                                   pattern, context_lines, files_only, max_matches)
             except UnicodeDecodeError:
                 continue
-
-        if content is None:
-            return matches
-
-        lines = content.splitlines()
-
-        for i, line in enumerate(lines):
-            if pattern.search(line):
-                if files_only:
-                    matches.append({'file': file_path, 'line_num': i + 1})
-                    return matches  # One match is enough for files-only mode
-
-                # Gather context
-                start = max(0, i - context_lines)
-                end = min(len(lines), i + context_lines + 1)
-                context = []
-                for j in range(start, end):
-                    prefix = '>' if j == i else ' '
-                    context.append(f"  {prefix} {j + 1:4d} | {lines[j]}")
-
-                matches.append({
-                    'file': file_path,
-                    'line_num': i + 1,
-                    'line': line,
-                    'context': '\n'.join(context),
-                })
-
-                if max_matches and len(matches) >= max_matches:
-                    break
-
     except Exception as e:
         print(f"Warning: Could not read {file_path}: {e}", file=sys.stderr)
 
-    return matches
+    return []
 
 
 def get_note_title(file_path: Path, tracker) -> str:
@@ -194,38 +237,43 @@ def note_has_images(file_path: Path, tracker) -> bool:
     return False
 
 
-def get_note_dates(file_path: Path, tracker, _cache={}) -> dict:
+def load_note_dates(tracker) -> dict:
+    """Index created/modified dates from tracking JSON, for get_note_dates.
+
+    Keys are (notebook, filename); ('', filename) holds the first notebook's
+    dates for a filename, for files that are not in notebook folders. Build
+    it once per query and pass it to every lookup.
+    """
+    index = {}
+    for json_file in tracker.get_all_data_files():
+        data = tracker.load_notebook_data(json_file)
+        folder_name = json_file.stem
+        for note_id, info in data.items():
+            fn = info.get('filename', '')
+            if fn:
+                dates = {
+                    'created': parse_apple_date(info.get('created', '')),
+                    'modified': parse_apple_date(info.get('modified', '')),
+                }
+                index[(folder_name, fn)] = dates
+                index.setdefault(('', fn), dates)
+    return index
+
+
+def get_note_dates(file_path: Path, tracker, index: Optional[dict] = None) -> dict:
     """Look up created/modified dates for a note from tracking JSON.
 
+    `index` is a load_note_dates() result; without one, tracking JSON is read.
     Returns dict with 'created' and 'modified' as datetime objects (or None).
     """
-    # Build lookup cache on first call
-    if not _cache:
-        for json_file in tracker.get_all_data_files():
-            data = tracker.load_notebook_data(json_file)
-            folder_name = json_file.stem
-            for note_id, info in data.items():
-                fn = info.get('filename', '')
-                if fn:
-                    _cache[(folder_name, fn)] = {
-                        'created': parse_apple_date(info.get('created', '')),
-                        'modified': parse_apple_date(info.get('modified', '')),
-                    }
-
+    if index is None:
+        index = load_note_dates(tracker)
     stem = file_path.stem
     folder = file_path.parent.name if tracker._uses_subdirs() else ''
 
-    # Try exact match first
-    key = (folder, stem)
-    if key in _cache:
-        return _cache[key]
-
-    # Try any folder
-    for (f, fn), dates in _cache.items():
-        if fn == stem:
-            return dates
-
-    return {'created': None, 'modified': None}
+    # Exact match first, then the same filename in any notebook
+    return (index.get((folder, stem)) or index.get(('', stem))
+            or {'created': None, 'modified': None})
 
 
 def passes_date_filter(note_dates: dict,
@@ -252,8 +300,14 @@ def run_query(search_term: str, formats: list, use_regex: bool = False,
               files_only: bool = False, max_matches: int = 0,
               filter_folders: str = None, has_images: bool = None,
               created_after=None, created_before=None,
-              modified_after=None, modified_before=None):
-    """Search exported notes for a pattern."""
+              modified_after=None, modified_before=None,
+              limit: int = 0, sort_by: str = "path"):
+    """Search exported notes for a pattern.
+
+    `limit` caps the total results across all files (matches, or files in
+    files-only mode) and stops scanning once reached. `sort_by="modified"`
+    visits the most recently modified notes first, using tracking JSON dates.
+    """
     tracker = get_tracker()
     root = Path(tracker.root_directory)
 
@@ -304,76 +358,139 @@ def run_query(search_term: str, formats: list, use_regex: bool = False,
     if filter_folders:
         folder_filter = {f.strip() for f in filter_folders.split(',')}
 
+    # Collect files to search
+    files = []
+    for search_dir, ext in search_dirs:
+        if search_dir.exists():
+            files.extend(sorted(search_dir.rglob(f'*{ext}')))
+
+    date_filtered = any(x is not None for x in [created_after, created_before,
+                                                modified_after, modified_before])
+    dates_index = load_note_dates(tracker) if date_filtered or sort_by == "modified" else None
+
+    if sort_by == "modified":
+        # Newest first; notes without a known date go last (stable sort keeps path order)
+        files.sort(key=lambda f: get_note_dates(f, tracker, dates_index)['modified']
+                   or datetime.min, reverse=True)
+
     # Search
     total_matches = 0
     matching_files = 0
+    limit_reached = False
 
-    for search_dir, ext in search_dirs:
-        if not search_dir.exists():
+    for file_path in files:
+        # Skip conflict files
+        if file_path.name.endswith('.conflict.md'):
             continue
 
-        # Collect files to search
-        files = sorted(search_dir.rglob(f'*{ext}'))
+        # Apply folder filter
+        if folder_filter and tracker._uses_subdirs():
+            parent_name = file_path.parent.name
+            if parent_name not in folder_filter:
+                # Check if any filter matches part of the folder name
+                if not any(f in parent_name for f in folder_filter):
+                    continue
 
-        for file_path in files:
-            # Skip conflict files
-            if file_path.name.endswith('.conflict.md'):
+        # Image filter
+        if has_images is not None:
+            file_has_imgs = note_has_images(file_path, tracker)
+            if has_images and not file_has_imgs:
+                continue
+            if not has_images and file_has_imgs:
                 continue
 
-            # Apply folder filter
-            if folder_filter and tracker._uses_subdirs():
-                parent_name = file_path.parent.name
-                if parent_name not in folder_filter:
-                    # Check if any filter matches part of the folder name
-                    if not any(f in parent_name for f in folder_filter):
-                        continue
-
-            # Image filter
-            if has_images is not None:
-                file_has_imgs = note_has_images(file_path, tracker)
-                if has_images and not file_has_imgs:
-                    continue
-                if not has_images and file_has_imgs:
-                    continue
+        # Date filter
+        if date_filtered:
+            note_dates = get_note_dates(file_path, tracker, dates_index)
+            if not passes_date_filter(note_dates,
+                                      created_after, created_before,
+                                      modified_after, modified_before):
+                continue
 
-            # Date filter
-            if any(x is not None for x in [created_after, created_before,
-                                           modified_after, modified_before]):
-                note_dates = get_note_dates(file_path, tracker)
-                if not passes_date_filter(note_dates,
-                                          created_after, created_before,
-                                          modified_after, modified_before):
-                    continue
+        # Never ask a file for more matches than the overall limit still allows
+        file_max_matches = max_matches
+        if limit and not files_only:
+            remaining = limit - total_matches
+            file_max_matches = min(max_matches, remaining) if max_matches else remaining
 
-            matches = search_file(file_path, pattern, context_lines,
-                                  files_only, max_matches)
+        matches = search_file(file_path, pattern, context_lines,
+                              files_only, file_max_matches)
 
-            if matches:
-                matching_files += 1
-                rel_path = file_path.relative_to(root)
+        if matches:
+            matching_files += 1
+            rel_path = file_path.relative_to(root)
 
-                if files_only:
-                    print(str(rel_path))
-                    outfmt.emit("match", file=str(rel_path))
-                else:
-                    for match in matches:
-                        total_matches += 1
-                        outfmt.emit("match", file=str(rel_path), line_num=match['line_num'],
-                                 line=match['line'].strip())
-                        print(f"\033[1m{rel_path}\033[0m:{match['line_num']}")
-                        if context_lines > 0:
-                            print(match['context'])
-                        else:
-                            print(f"  {match['line'].strip()}")
-                        print()
+            if files_only:
+                print(str(rel_path))
+                outfmt.emit("match", file=str(rel_path))
+            else:
+                for match in matches:
+                    total_matches += 1
+                    outfmt.emit("match", file=str(rel_path), line_num=match['line_num'],
+                             line=match['line'].strip())
+                    print(f"\033[1m{rel_path}\033[0m:{match['line_num']}")
+                    if context_lines > 0:
+                        print(match['context'])
+                    else:
+                        print(f"  {match['line'].strip()}")
+                    print()
+
+            if limit and (matching_files if files_only else total_matches) >= limit:
+                limit_reached = True
+                break
 
     # Summary
     outfmt.emit("summary", total_matches=total_matches, matching_files=matching_files,
-             search_type="text")
+             search_type="text", limit_reached=limit_reached)
     if files_only:
         print(f"\n{matching_files} file(s) matched", file=sys.stderr)
     else:
         print(f"\n{total_matches} match(es) in {matching_files} file(s)", file=sys.stderr)
+    if limit_reached:
+        print(f"Stopped after {limit} result(s) (--limit)", file=sys.stderr)
+    outfmt.close()
+
+
+def show_related(note: str, limit: int = 10, files_only: bool = False):
+    """Print the notes most related to `note`, read from the precomputed graph."""
+    try:
+        from qdrant_integration import _get_config, related_graph_path
+        from related_notes import RelatedNotes
+    except ImportError as e:
+        print(f"Error: Could not load Qdrant integration: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    path = related_graph_path(_get_config())
+    if not path.exists():
+        print(f"Error: No related-notes graph at {path}\n"
+              "Build it with: python qdrant_integration.py related", file=sys.stderr)
+        sys.exit(1)
+    graph = RelatedNotes(path)
+    matches = graph.find(note)
+    if not matches:
+        print(f"Error: No indexed note matches '{note}'", file=sys.stderr)
+        sys.exit(1)
+    if len(matches) > 1:
+        names = ", ".join(f"{graph.notes[i][0]}/{graph.notes[i][2]}" for i in matches)
+        print(f"Error: '{note}' matches several notes ({names}); "
+              "use notebook/filename or the note ID", file=sys.stderr)
+        sys.exit(1)
+
+    notebook, note_id, filename = graph.notes[matches[0]]
+    results = graph.related(matches[0], limit)
+    for i, r in enumerate(results, 1):
+        rel = f"{r['notebook']}/{r['filename']}"
+        outfmt.emit("result", file=rel, score=r['score'], note_id=r['note_id'],
+                    notebook=r['notebook'], filename=r['filename'], related_to=note_id)
+        if files_only:
+            print(rel)
+        else:
+            print(f"{i}. \033[1m{rel}\033[0m  [{r['score'] * 100:.1f}% similar]")
+
+    outfmt.emit("summary", total_results=len(results), search_type="related",
+                graph_built=graph.meta.get("built"))
+    print(f"\n{len(results)} note(s) related to {notebook}/{filename} "
+          f"(graph built {graph.meta.get('built', '?')})", file=sys.stderr)
     outfmt.close()
 
 
@@ -397,10 +514,14 @@ def main():
   %(prog)s --modified-after 2026-01-15 "."  Modified after date
   %(prog)s --created-before 2025-06-01 "."  Created before date
   %(prog)s --modified-within 5h -l "."      Files modified in last 5 hours
+  %(prog)s --sort modified --first "budget" Latest note mentioning budget
+  %(prog)s --limit 20 "TODO"                 Stop after 20 matches
   %(prog)s --ai-search "ideas about cooking" Semantic search via Qdrant
   %(prog)s --ai-search -n 5 "project plan"   Top 5 AI results
+  %(prog)s --related "Meeting-Notes-1234"    Notes related to a note
 """)
-    parser.add_argument("pattern", help="Search term or regex pattern")
+    parser.add_argument("pattern", nargs="?", default=None,
+                        help="Search term or regex pattern")
     parser.add_argument("-E", "--regex", action="store_true",
                         help="Treat pattern as a regular expression")
     parser.add_argument("-i", "--ignore-case", action="store_true",
@@ -411,6 +532,12 @@ def main():
                         help="Only list matching file paths")
     parser.add_argument("-m", "--max-matches", type=int, default=0,
                         help="Maximum matches per file (0 = unlimited)")
+    parser.add_argument("--limit", type=_non_negative_int, default=0,
+                        help="Stop after this many results in total (0 = unlimited)")
+    parser.add_argument("--first", action="store_true",
+                        help="Stop at the first result (same as --limit 1)")
+    parser.add_argument("--sort", choices=["path", "modified"], default="path",
+                        help="Order to search files in: path, or modified (newest first)")
     parser.add_argument("--format", default="",
                         help="Comma-separated formats to search: md, html, text, raw (default: auto-detect)")
     parser.add_argument("-F", "--filter-folders", default=None,
@@ -440,22 +567,33 @@ def main():
         "Semantic search using Qdrant vector database. Requires Qdrant running "
         "and notes indexed (run: python qdrant_integration.py sync).")
     ai_group.add_argument("--ai-search", action="store_true",
-                        help="Use semantic/AI search via Qdrant instead of text matching")
+                        help="Use semantic/AI search via Qdrant instead of text matching "
+                             "(-F and --modified-* filters are applied in the query)")
     ai_group.add_argument("-n", "--num-results", type=int, default=10,
                         help="Number of AI search results (default: 10)")
     ai_group.add_argument("--threshold", type=float, default=0.0,
                         help="Minimum similarity score for AI results (0.0-1.0)")
+    ai_group.add_argument("--related", metavar="NOTE", default=None,
+                        help="List the notes most related to NOTE (a note ID, filename or "
+                             "notebook/filename) from the graph built by "
+                             "'python qdrant_integration.py related'")
 
     outfmt.add_json_arg(parser)
     parser.add_argument("-r", "--root-dir", default=None,
                         help="Override the export root directory")
 
     args = parser.parse_args()
+    if args.pattern is None and args.related is None:
+        parser.error("the following arguments are required: pattern")
     outfmt.setup_from_args(args)
 
     if args.root_dir:
         os.environ['NOTES_EXPORT_ROOT_DIR'] = args.root_dir
 
+    if args.related is not None:
+        show_related(args.related, limit=args.num_results, files_only=args.files_only)
+        return
+
     formats = [f.strip() for f in args.format.split(',') if f.strip()] if args.format else []
 
     # Resolve image filter
@@ -497,16 +635,30 @@ def main():
             print(f"Error: Could not load Qdrant integration: {e}", file=sys.stderr)
             sys.exit(1)
 
+        tracker = get_tracker()
+        root = Path(tracker.root_directory)
+
+        # -F matches notebook names the same way as text search (exact or substring);
+        # the resolved names are pushed into the Qdrant query
+        notebooks = None
+        if args.filter_folders:
+            wanted = {f.strip() for f in args.filter_folders.split(',') if f.strip()}
+            notebooks = [json_file.stem for json_file in tracker.get_all_data_files()
+                         if json_file.stem in wanted
+                         or any(f in json_file.stem for f in wanted)]
+
         mgr = QdrantNotesManager()
-        results = mgr.search(args.pattern, limit=args.num_results,
-                             score_threshold=args.threshold)
+        try:
+            results = mgr.search(args.pattern, limit=args.num_results,
+                                 score_threshold=args.threshold, notebooks=notebooks,
+                                 modified_after=modified_after, modified_before=modified_before)
+        except RuntimeError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
         if not results:
             print("No results found.", file=sys.stderr)
             sys.exit(0)
 
-        tracker = get_tracker()
-        root = Path(tracker.root_directory)
-
         for i, r in enumerate(results, 1):
             notebook = r['notebook']
             filename = r['filename']
@@ -527,16 +679,22 @@ def main():
 
             outfmt.emit("result", file=rel, score=r['score'], note_id=r['note_id'],
                      notebook=notebook, filename=filename,
-                     created=r['created'], modified=r['modified'])
+                     created=r['created'], modified=r['modified'],
+                     snippet=r.get('snippet', ''), source=r.get('source'),
+                     chunk_start=r.get('chunk_start'),
+                     chunk_end=r.get('chunk_end'))
             if args.files_only:
                 print(rel)
             else:
                 print(f"{i}. \033[1m{rel}\033[0m  [{score_pct:.1f}% match]")
                 if r['modified']:
                     print(f"   Modified: {r['modified']}")
+                if r.get('snippet'):
+                    print(f"   {r['snippet']}")
                 print()
 
-        outfmt.emit("summary", total_results=len(results), search_type="ai")
+        outfmt.emit("summary", total_results=len(results), search_type="ai",
+                    query_cache_hit=mgr.last_query_cached)
         print(f"\n{len(results)} result(s) from AI search", file=sys.stderr)
         outfmt.close()
         return
@@ -555,6 +713,8 @@ def main():
         created_before=created_before,
         modified_after=modified_after,
         modified_before=modified_before,
+        limit=1 if args.first else args.limit,
+        sort_by=args.sort,
     )
 
 
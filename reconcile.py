@@ -11,6 +11,7 @@ Usage:
     python reconcile.py              # Full reconciliation report
     python reconcile.py --notebooks  # Break down by notebook
     python reconcile.py --fix        # Show suggestions for fixing mismatches
+    python reconcile.py --near-duplicates  # List groups of near-identical notes
 """
 
 import argparse
@@ -72,12 +73,35 @@ def count_apple_notes() -> dict:
         return {}
 
 
-def count_tracking_json(tracker) -> dict:
-    """Count notes in tracking JSON files. Returns {notebook: {total, active, deleted}}."""
-    counts = {}
+EXPORT_FORMATS = {
+    "raw": ".html",
+    "html": ".html",
+    "text": ".txt",
+    "md": ".md",
+    "pdf": ".pdf",
+    "docx": ".docx",
+}
+
+
+def get_tracked_notes(tracker) -> dict:
+    """Get all tracked notes keyed by notebook. Returns {notebook: {note_id: info}}."""
+    result = {}
     for json_file in tracker.get_all_data_files():
         notebook = json_file.stem
         data = tracker.load_notebook_data(json_file)
+        result[notebook] = data
+    return result
+
+
+def count_tracking_json(tracker, tracked_notes: dict = None) -> dict:
+    """Count notes in tracking JSON files. Returns {notebook: {total, active, deleted}}.
+
+    Pass the result of get_tracked_notes() to count without reading the files again.
+    """
+    if tracked_notes is None:
+        tracked_notes = get_tracked_notes(tracker)
+    counts = {}
+    for notebook, data in tracked_notes.items():
         active = sum(1 for info in data.values() if 'deletedDate' not in info)
         deleted = sum(1 for info in data.values() if 'deletedDate' in info)
         has_full_id = sum(1 for info in data.values()
@@ -91,49 +115,68 @@ def count_tracking_json(tracker) -> dict:
     return counts
 
 
-def count_disk_files(tracker) -> dict:
-    """Count exported files on disk by format and notebook. Returns {notebook: {format: count}}."""
+def _scan_stems(directory: str, ext: str) -> set:
+    """Stems of the files in a directory with the given extension (one scandir call)."""
+    stems = set()
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(ext) and entry.is_file():
+                stems.add(entry.name[:-len(ext)])
+    return stems
+
+
+def get_disk_filenames(tracker) -> dict:
+    """Get filenames on disk by format and notebook. Returns {notebook: {format: set(stems)}}.
+
+    Each format directory (and each notebook subdirectory) is listed exactly
+    once with os.scandir, which returns file types along with names, so no
+    file is stat'ed. With flat exports every format appears under "(flat)".
+    """
     root = Path(tracker.root_directory)
-    formats = {
-        "raw": ".html",
-        "html": ".html",
-        "text": ".txt",
-        "md": ".md",
-        "pdf": ".pdf",
-        "docx": ".docx",
-    }
     uses_subdirs = tracker._uses_subdirs()
+    result = defaultdict(dict)
 
-    counts = defaultdict(lambda: defaultdict(int))
-    totals = defaultdict(int)
-
-    for fmt_name, ext in formats.items():
+    for fmt_name, ext in EXPORT_FORMATS.items():
         fmt_dir = root / fmt_name
-        if not fmt_dir.exists():
+        try:
+            if uses_subdirs:
+                with os.scandir(fmt_dir) as entries:
+                    subdirs = [e for e in entries if e.is_dir()]
+                for subdir in subdirs:
+                    stems = _scan_stems(subdir.path, ext)
+                    if stems:
+                        result[subdir.name][fmt_name] = stems
+            else:
+                result["(flat)"][fmt_name] = _scan_stems(fmt_dir, ext)
+        except (FileNotFoundError, NotADirectoryError):
             continue
+    return dict(result)
 
-        if uses_subdirs:
-            for subdir in sorted(fmt_dir.iterdir()):
-                if subdir.is_dir():
-                    file_count = len(list(subdir.glob(f"*{ext}")))
-                    if file_count > 0:
-                        counts[subdir.name][fmt_name] = file_count
-                        totals[fmt_name] += file_count
-        else:
-            file_count = len(list(fmt_dir.glob(f"*{ext}")))
-            counts["(flat)"][fmt_name] = file_count
-            totals[fmt_name] += file_count
 
+def count_disk_files(tracker, disk_files: dict = None) -> dict:
+    """Count exported files on disk by format and notebook. Returns {notebook: {format: count}}.
+
+    Pass the result of get_disk_filenames() to count without listing the
+    directories again. The "_totals" entry sums each format over notebooks.
+    """
+    if disk_files is None:
+        disk_files = get_disk_filenames(tracker)
+    counts = {}
+    totals = defaultdict(int)
+    for notebook in sorted(disk_files):
+        counts[notebook] = {fmt_name: len(stems) for fmt_name, stems in disk_files[notebook].items()}
+        for fmt_name, count in counts[notebook].items():
+            totals[fmt_name] += count
     counts["_totals"] = dict(totals)
-    return dict(counts)
+    return counts
 
 
 def count_qdrant() -> dict:
     """Count points in Qdrant. Returns {collection, points, unique_notes}."""
     try:
-        from qdrant_integration import QdrantHTTP, _get_config
+        from qdrant_integration import SCROLL_PAGE_SIZE, _get_config, get_vector_client
         config = _get_config()
-        client = QdrantHTTP(config["qdrant_url"], api_key=config.get("qdrant_api_key", ""))
+        client = get_vector_client(config)
         collection = config["collection"]
 
         if not client.collection_exists(collection):
@@ -145,7 +188,8 @@ def count_qdrant() -> dict:
         unique_notes = set()
         offset = None
         while True:
-            points, next_offset = client.scroll(collection, limit=100, offset=offset)
+            points, next_offset = client.scroll(collection, limit=SCROLL_PAGE_SIZE, offset=offset,
+                                                with_payload=["notebook", "note_id"])
             for p in points:
                 payload = p.get("payload", {})
                 note_id = payload.get("note_id", "")
@@ -172,47 +216,12 @@ def count_qdrant() -> dict:
         return {"available": False, "error": str(e)}
 
 
-def get_tracked_notes(tracker) -> dict:
-    """Get all tracked notes keyed by notebook. Returns {notebook: {note_id: info}}."""
-    result = {}
-    for json_file in tracker.get_all_data_files():
-        notebook = json_file.stem
-        data = tracker.load_notebook_data(json_file)
-        result[notebook] = data
-    return result
-
-
-def get_disk_filenames(tracker) -> dict:
-    """Get filenames on disk by format and notebook. Returns {notebook: {format: set(stems)}}."""
-    root = Path(tracker.root_directory)
-    formats = {
-        "raw": ".html", "html": ".html", "text": ".txt",
-        "md": ".md", "pdf": ".pdf", "docx": ".docx",
-    }
-    uses_subdirs = tracker._uses_subdirs()
-    result = defaultdict(lambda: defaultdict(set))
-
-    for fmt_name, ext in formats.items():
-        fmt_dir = root / fmt_name
-        if not fmt_dir.exists():
-            continue
-        if uses_subdirs:
-            for subdir in fmt_dir.iterdir():
-                if subdir.is_dir():
-                    for f in subdir.glob(f"*{ext}"):
-                        result[subdir.name][fmt_name].add(f.stem)
-        else:
-            for f in fmt_dir.glob(f"*{ext}"):
-                result["(flat)"][fmt_name].add(f.stem)
-    return dict(result)
-
-
 def get_qdrant_note_ids() -> dict:
     """Get note IDs indexed in Qdrant. Returns {notebook: set(note_id)}."""
     try:
-        from qdrant_integration import QdrantHTTP, _get_config
+        from qdrant_integration import SCROLL_PAGE_SIZE, _get_config, get_vector_client
         config = _get_config()
-        client = QdrantHTTP(config["qdrant_url"], api_key=config.get("qdrant_api_key", ""))
+        client = get_vector_client(config)
         collection = config["collection"]
         if not client.collection_exists(collection):
             return {}
@@ -220,7 +229,8 @@ def get_qdrant_note_ids() -> dict:
         result = defaultdict(set)
         offset = None
         while True:
-            points, next_offset = client.scroll(collection, limit=100, offset=offset)
+            points, next_offset = client.scroll(collection, limit=SCROLL_PAGE_SIZE, offset=offset,
+                                                with_payload=["notebook", "note_id"])
             for p in points:
                 payload = p.get("payload", {})
                 result[payload.get("notebook", "")].add(payload.get("note_id", ""))
@@ -317,6 +327,99 @@ def find_specific_discrepancies(tracker, disk_files, tracked_notes, qdrant_ids)
     return details
 
 
+def _note_text_path(root: Path, uses_subdirs: bool, notebook: str, filename: str):
+    """The markdown (or else plain text) export of a note, if either exists."""
+    for folder, ext in [("md", ".md"), ("text", ".txt")]:
+        path = (root / folder / notebook if uses_subdirs else root / folder) / f"{filename}{ext}"
+        try:
+            return path, path.stat()
+        except OSError:
+            continue
+    return None, None
+
+
+def collect_signatures(tracker, cache) -> tuple:
+    """MinHash signatures of every active note's markdown or text.
+
+    Notes whose file fingerprint (path, size, mtime) matches the cache are
+    not read. Returns ({(notebook, note_id): signature}, {(notebook, note_id): filename}).
+    """
+    from near_duplicates import minhash, shingles
+    from text_normalise import normalise_text
+
+    root = Path(tracker.root_directory)
+    uses_subdirs = tracker._uses_subdirs()
+    signatures, filenames = {}, {}
+    for json_file in tracker.get_all_data_files():
+        notebook = json_file.stem
+        for note_id, info in tracker.load_notebook_data(json_file).items():
+            filename = info.get("filename")
+            if "deletedDate" in info or not filename:
+                continue
+            path, st = _note_text_path(root, uses_subdirs, notebook, filename)
+            if path is None:
+                continue
+            key = (notebook, note_id)
+            fingerprint = f"{path}:{st.st_size}:{st.st_mtime_ns}"
+            sig = cache.get(key, fingerprint)
+            if sig is None:
+                try:
+                    text = path.read_text(encoding="utf-8", errors="replace")
+                except OSError:
+                    continue
+                hashes = shingles(normalise_text(text).text)
+                if not hashes:
+                    continue
+                sig = minhash(hashes)
+                cache.put(key, fingerprint, sig)
+            signatures[key] = sig
+            filenames[key] = filename
+    cache.flush()
+    return signatures, filenames
+
+
+def run_near_duplicates(threshold: float):
+    """Report groups of notes whose text is nearly identical."""
+    from near_duplicates import SignatureCache, find_near_duplicates, group_pairs
+    from qdrant_integration import _get_config, _vector_dir
+
+    tracker = get_tracker()
+    cache = SignatureCache(_vector_dir(_get_config(), tracker) / "minhash.sqlite")
+    try:
+        signatures, filenames = collect_signatures(tracker, cache)
+        cache.prune(set(signatures))
+    finally:
+        cache.close()
+    pairs = find_near_duplicates(signatures, threshold)
+    groups = group_pairs(pairs)
+
+    print("=" * 60)
+    print("NEAR-DUPLICATE NOTES")
+    print("=" * 60)
+    print(f"Notes compared: {len(signatures)} "
+          f"({cache.misses} hashed, {cache.hits} from cache)")
+    print(f"Similarity threshold: {threshold:.0%}")
+
+    best = {}
+    for a, b, score in pairs:
+        for key in (a, b):
+            best[key] = max(best.get(key, 0.0), score)
+    for a, b, score in pairs:
+        fmt.emit("near_duplicate", note_a=f"{a[0]}/{filenames[a]}",
+                 note_b=f"{b[0]}/{filenames[b]}", similarity=round(score, 3))
+    print()
+    if not groups:
+        print("  No near-duplicate notes found.")
+    for i, group in enumerate(groups, 1):
+        print(f"  Group {i} ({len(group)} notes):")
+        for key in group:
+            print(f"    - {key[0]}/{filenames[key]}  [{best[key]:.0%}]")
+    fmt.emit("summary", command="reconcile", near_duplicate_groups=len(groups),
+             near_duplicate_pairs=len(pairs), notes=len(signatures))
+    print("\n" + "=" * 60)
+    fmt.close()
+
+
 def _sanitize_notebook_name(account: str, folder: str) -> str:
     """Convert account/folder names to the format used in subdirectory names."""
     for char in ['/', ':', '\\', '|', '<', '>', '"', "'", '?', '*', '_', ' ', '.', ',']:
@@ -357,9 +460,10 @@ def run_reconciliation(show_notebooks: bool = False, show_fix: bool = False,
             apple_total = None
             print("  (could not query Apple Notes)")
 
-    # 2. Tracking JSON
+    # 2. Tracking JSON (read once; the counts and --details share it)
     print("\n--- Tracking JSON ---")
-    json_counts = count_tracking_json(tracker)
+    tracked_notes = get_tracked_notes(tracker)
+    json_counts = count_tracking_json(tracker, tracked_notes)
     json_active_total = sum(c["active"] for c in json_counts.values())
     json_deleted_total = sum(c["deleted"] for c in json_counts.values())
     json_full_id_total = sum(c["with_full_id"] for c in json_counts.values())
@@ -373,9 +477,10 @@ def run_reconciliation(show_notebooks: bool = False, show_fix: bool = False,
             print(f"  {notebook}: {counts['active']} active, {counts['deleted']} deleted, "
                   f"{counts['with_full_id']} with fullNoteId")
 
-    # 3. Disk files
+    # 3. Disk files (one directory pass; the counts and --details share it)
     print("\n--- Exported Files on Disk ---")
-    disk_counts = count_disk_files(tracker)
+    disk_filenames = get_disk_filenames(tracker)
+    disk_counts = count_disk_files(tracker, disk_filenames)
     totals = disk_counts.get("_totals", {})
     disk_counts_for_details = {k: v for k, v in disk_counts.items() if k != "_totals"}
     fmt.emit("count", source="disk", **{k: v for k, v in totals.items()})
@@ -471,9 +576,7 @@ def run_reconciliation(show_notebooks: bool = False, show_fix: bool = False,
     # 7. Specific discrepancies (opt-in, can be slow with Qdrant)
     if show_details:
         print("\n--- Specific Exceptions ---")
-        tracked_notes = get_tracked_notes(tracker)
         qdrant_note_ids = get_qdrant_note_ids() if qdrant.get("available") else {}
-        disk_filenames = get_disk_filenames(tracker)
         details = find_specific_discrepancies(tracker, disk_filenames, tracked_notes, qdrant_note_ids)
         if details:
             for line in details:
@@ -504,10 +607,22 @@ def main():
                         help="Skip querying Apple Notes (faster, uses tracking JSON only)")
     parser.add_argument("--skip-qdrant", action="store_true",
                         help="Skip querying Qdrant")
+    parser.add_argument("--near-duplicates", action="store_true",
+                        help="List groups of notes with nearly identical text instead")
+    parser.add_argument("--similarity", type=float, default=None, metavar="S",
+                        help="Minimum similarity (0-1) for --near-duplicates (default: 0.8)")
     fmt.add_json_arg(parser)
     args = parser.parse_args()
     fmt.setup_from_args(args)
 
+    if args.near_duplicates:
+        from near_duplicates import DEFAULT_SIMILARITY
+        threshold = DEFAULT_SIMILARITY if args.similarity is None else args.similarity
+        if not 0 < threshold <= 1:
+            parser.error("--similarity must be between 0 and 1")
+        run_near_duplicates(threshold)
+        return
+
     run_reconciliation(show_notebooks=args.notebooks, show_fix=args.fix,
                        show_details=args.details, skip_apple=args.skip_apple,
                        skip_qdrant=args.skip_qdrant)
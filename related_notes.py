@@ -0,0 +1,182 @@
+"""Precomputed "related notes": each note's nearest neighbours by embedding.
+
+The graph is built in one batch from the vectors already stored in the
+collection, so no note is embedded or searched again. Each note's vector is
+the mean of its chunks' unit vectors; the top-k neighbours of every note are
+found with blocked matrix multiplication (one block of rows against all
+notes at a time). The block height is derived from the note count so that
+a block's scores and partition indexes stay within BLOCK_BYTES.
+
+The result is a small JSON file: the note list plus, per note, the indexes
+and scores of its neighbours. Looking up a note's related notes only reads
+that file, and needs nothing beyond the standard library.
+
+Building the graph requires numpy (pip install numpy).
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - checked when a graph is built
+    np = None
+
+
+DEFAULT_NEIGHBOURS = 10
+BLOCK_BYTES = 64 * 1024 * 1024  # per block: float32 scores + int64 argpartition indexes
+GRAPH_FORMAT = "notes-exporter-related"
+
+NoteKey = Tuple[str, str]  # (notebook, note_id)
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("numpy is required to build the related-notes graph. "
+                          "Install with: pip install numpy")
+
+
+class NoteVectors:
+    """Accumulates chunk vectors into one unit vector per note."""
+
+    def __init__(self):
+        _require_numpy()
+        self._sums: Dict[NoteKey, "np.ndarray"] = {}
+        self.filenames: Dict[NoteKey, str] = {}
+
+    def add(self, notebook: str, note_id: str, vector: List[float], filename: str = ""):
+        v = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        if not norm:
+            return
+        key = (notebook, note_id)
+        if key in self._sums:
+            self._sums[key] += v / norm
+        else:
+            self._sums[key] = v / norm
+            self.filenames[key] = filename
+
+    def __len__(self) -> int:
+        return len(self._sums)
+
+    def matrix(self) -> Tuple[List[NoteKey], "np.ndarray"]:
+        """Note keys in a stable order and the matching matrix of unit rows."""
+        keys = sorted(self._sums)
+        if not keys:
+            return keys, np.zeros((0, 0), dtype=np.float32)
+        m = np.stack([self._sums[k] for k in keys])
+        m /= np.maximum(np.linalg.norm(m, axis=1, keepdims=True), 1e-12)
+        return keys, m
+
+
+def block_rows_for(n: int, budget: int = BLOCK_BYTES) -> int:
+    """Rows per block so that a rows x n block (12 bytes per cell) fits in `budget`."""
+    return max(1, budget // (max(n, 1) * 12))
+
+
+def nearest_neighbours(m: "np.ndarray", k: int = DEFAULT_NEIGHBOURS,
+                       block_rows: Optional[int] = None) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Top-k cosine neighbours of every row of a unit-row matrix, excluding itself.
+
+    Returns (indexes, scores), both shaped (rows, k), best first. Rows are
+    scored `block_rows` at a time (default: block_rows_for the row count).
+    """
+    _require_numpy()
+    n = m.shape[0]
+    k = min(k, n - 1)
+    if k <= 0:
+        return np.zeros((n, 0), dtype=np.int32), np.zeros((n, 0), dtype=np.float32)
+    block_rows = block_rows or block_rows_for(n)
+    indexes = np.empty((n, k), dtype=np.int32)
+    scores = np.empty((n, k), dtype=np.float32)
+    for start in range(0, n, block_rows):
+        block = m[start:start + block_rows] @ m.T
+        rows = np.arange(block.shape[0])
+        block[rows, start + rows] = -np.inf
+        np.negative(block, out=block)  # Smallest first for argpartition, without a copy
+        top = np.argpartition(block, k - 1, axis=1)[:, :k]
+        top_scores = -np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        indexes[start:start + len(rows)] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + len(rows)] = np.take_along_axis(top_scores, order, axis=1)
+    return indexes, scores
+
+
+def build_graph(vectors: NoteVectors, k: int = DEFAULT_NEIGHBOURS,
+                block_rows: Optional[int] = None) -> Dict:
+    """The related-notes graph of the accumulated notes, ready for save_graph."""
+    keys, m = vectors.matrix()
+    indexes, scores = nearest_neighbours(m, k, block_rows)
+    return {
+        "notes": [[notebook, note_id, vectors.filenames[(notebook, note_id)]]
+                  for notebook, note_id in keys],
+        "neighbours": indexes.tolist(),
+        "scores": np.round(scores, 4).tolist(),
+    }
+
+
+def save_graph(path: Path, graph: Dict, **meta):
+    """Write a graph (plus metadata such as the collection and model) atomically."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    record = {"format": GRAPH_FORMAT, "built": datetime.now().isoformat(timespec="seconds"),
+              **meta, **graph}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(record, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+class RelatedNotes:
+    """Read side of a saved graph."""
+
+    def __init__(self, path: Path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("format") != GRAPH_FORMAT:
+            raise ValueError(f"{path} is not a related-notes graph")
+        self.meta = {k: v for k, v in data.items()
+                     if k not in ("notes", "neighbours", "scores")}
+        self.notes: List[List[str]] = data["notes"]
+        self._neighbours = data["neighbours"]
+        self._scores = data["scores"]
+
+    def find(self, note: str) -> List[int]:
+        """Indexes of the notes a reference names.
+
+        `note` is a note ID, a filename (a path is reduced to its stem) or
+        `notebook/filename`.
+        """
+        by_id = [i for i, (_, note_id, _) in enumerate(self.notes) if note_id == note]
+        if by_id:
+            return by_id
+        notebook, _, name = note.rpartition("/")
+        name = Path(name).stem if Path(name).suffix in (".md", ".txt", ".html") else name
+        matches = [i for i, (nb, _, filename) in enumerate(self.notes) if filename == name]
+        if notebook and len(matches) > 1:
+            matches = [i for i in matches if self.notes[i][0] == Path(notebook).name]
+        return matches
+
+    def related(self, index: int, limit: Optional[int] = None) -> List[Dict]:
+        """Neighbours of the note at `index`, best first."""
+        result = []
+        for j, score in zip(self._neighbours[index], self._scores[index]):
+            notebook, note_id, filename = self.notes[j]
+            result.append({"notebook": notebook, "note_id": note_id,
+                           "filename": filename, "score": score})
+        return result[:limit] if limit else result
+
+
+def collect_note_vectors(pages: Iterable[List[Dict]]) -> NoteVectors:
+    """Accumulate scrolled points (payload with notebook, note_id, filename) per note."""
+    vectors = NoteVectors()
+    for points in pages:
+        for point in points:
+            payload = point.get("payload") or {}
+            if "note_id" in payload and point.get("vector"):
+                vectors.add(payload.get("notebook", ""), payload["note_id"], point["vector"],
+                            payload.get("filename", ""))
+    return vectors
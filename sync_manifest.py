@@ -0,0 +1,131 @@
+"""Local record of exactly which Qdrant points exist for each note.
+
+For every indexed chunk the manifest stores its point ID and the SHA-256 of
+the chunk text, per collection. Sync uses it to upsert only chunks whose
+text changed, delete exactly the chunk IDs that disappeared, and remove all
+points of deleted notes — without scrolling the collection.
+
+The sync pipeline reads the manifest from its reader thread while recording
+finished notes on the main thread, so every method holds a lock.
+"""
+
+import functools
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+def _locked(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class SyncManifest:
+    """SQLite-backed map of (notebook, note_id, chunk_index) -> (point_id, text_hash)."""
+
+    def __init__(self, path: Path, collection: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.collection = collection
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                collection TEXT NOT NULL,
+                notebook TEXT NOT NULL,
+                note_id TEXT NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                point_id INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
+                PRIMARY KEY (collection, notebook, note_id, chunk_index)
+            ) WITHOUT ROWID
+        """)
+        self._db.commit()
+
+    @_locked
+    def is_empty(self) -> bool:
+        row = self._db.execute("SELECT 1 FROM chunks WHERE collection = ? LIMIT 1",
+                               (self.collection,)).fetchone()
+        return row is None
+
+    @_locked
+    def note_chunks(self, notebook: str, note_id: str) -> Dict[int, Tuple[int, str]]:
+        """Return {chunk_index: (point_id, text_hash)} for one note."""
+        rows = self._db.execute(
+            "SELECT chunk_index, point_id, text_hash FROM chunks "
+            "WHERE collection = ? AND notebook = ? AND note_id = ?",
+            (self.collection, notebook, note_id))
+        return {ci: (pid, h) for ci, pid, h in rows}
+
+    @_locked
+    def notes(self) -> Set[Tuple[str, str]]:
+        """All (notebook, note_id) pairs that have points in the collection."""
+        rows = self._db.execute(
+            "SELECT DISTINCT notebook, note_id FROM chunks WHERE collection = ?",
+            (self.collection,))
+        return set(rows)
+
+    @_locked
+    def point_ids(self) -> Set[int]:
+        rows = self._db.execute("SELECT point_id FROM chunks WHERE collection = ?",
+                                (self.collection,))
+        return {pid for (pid,) in rows}
+
+    @_locked
+    def note_rows(self) -> List[Tuple[str, str, List[Tuple[int, int, str]]]]:
+        """Every note's (notebook, note_id, [(chunk_index, point_id, text_hash), ...])."""
+        rows = self._db.execute(
+            "SELECT notebook, note_id, chunk_index, point_id, text_hash FROM chunks "
+            "WHERE collection = ? ORDER BY notebook, note_id, chunk_index",
+            (self.collection,))
+        notes = []
+        for notebook, note_id, ci, pid, h in rows:
+            if not notes or notes[-1][:2] != (notebook, note_id):
+                notes.append((notebook, note_id, []))
+            notes[-1][2].append((ci, pid, h))
+        return notes
+
+    @_locked
+    def set_chunks(self, notebook: str, note_id: str,
+                   chunks: Iterable[Tuple[int, int, str]]):
+        """Record (chunk_index, point_id, text_hash) rows for a note."""
+        self._db.executemany(
+            "INSERT OR REPLACE INTO chunks "
+            "(collection, notebook, note_id, chunk_index, point_id, text_hash) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(self.collection, notebook, note_id, ci, pid, h) for ci, pid, h in chunks])
+
+    @_locked
+    def remove_chunks(self, notebook: str, note_id: str, chunk_indexes: Iterable[int]):
+        self._db.executemany(
+            "DELETE FROM chunks WHERE collection = ? AND notebook = ? "
+            "AND note_id = ? AND chunk_index = ?",
+            [(self.collection, notebook, note_id, ci) for ci in chunk_indexes])
+
+    @_locked
+    def remove_note(self, notebook: str, note_id: str) -> List[int]:
+        """Forget a note and return the point IDs it had."""
+        pids = [pid for pid, _ in self.note_chunks(notebook, note_id).values()]
+        self._db.execute(
+            "DELETE FROM chunks WHERE collection = ? AND notebook = ? AND note_id = ?",
+            (self.collection, notebook, note_id))
+        return pids
+
+    @_locked
+    def clear(self):
+        """Forget every point in this collection (e.g. after it is deleted)."""
+        self._db.execute("DELETE FROM chunks WHERE collection = ?", (self.collection,))
+        self.commit()
+
+    @_locked
+    def commit(self):
+        self._db.commit()
+
+    @_locked
+    def close(self):
+        self._db.close()
@@ -25,6 +25,8 @@ import json
 import os
 import shutil
 import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
 import pytest
@@ -167,3 +169,55 @@ def sample_notes(test_export_dir):
 def script_dir():
     """Path to the project's script directory."""
     return SCRIPT_DIR
+
+
+@pytest.fixture
+def stub_http_server():
+    """Start a local JSON HTTP server driven by a handler function.
+
+    Usage: ``url, requests = stub_http_server(handler)`` where
+    ``handler(method, path, body) -> (status, json_body)``. Every request is
+    recorded in ``requests`` as ``(method, path, body)``. A handler may
+    return a third item, True, to drop the connection after replying
+    without telling the client (simulating an idle keep-alive timeout).
+    """
+    servers = []
+
+    def start(handler):
+        recorded = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # Keep-alive replies otherwise stall on delayed ACKs
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length", 0))
+                raw = self.rfile.read(length) if length else b""
+                body = json.loads(raw) if raw else None
+                recorded.append((self.command, self.path, body))
+                status, reply, *drop = handler(self.command, self.path, body)
+                data = json.dumps(reply).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                if drop and drop[0]:
+                    self.close_connection = True
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05},
+                         daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}", recorded
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
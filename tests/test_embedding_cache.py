@@ -0,0 +1,93 @@
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from embedding_cache import EmbeddingCache, QueryEmbeddingCache, normalise_query, text_hash
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestEmbeddingCache:
+    def test_round_trip(self, tmp_path):
+        cache = EmbeddingCache(tmp_path / "cache.sqlite")
+        cache.put_many("ollama", "m", ["alpha", "beta"], [[0.5, 1.0], [2.0, -0.25]])
+        assert cache.get_many("ollama", "m", ["beta", "alpha"]) == [[2.0, -0.25], [0.5, 1.0]]
+
+    def test_stores_float32(self, tmp_path):
+        cache = EmbeddingCache(tmp_path / "cache.sqlite")
+        cache.put_many("ollama", "m", ["x"], [[0.1] * 1024])
+        assert cache.size_bytes() == 1024 * 4
+        vec = cache.get_many("ollama", "m", ["x"])[0]
+        assert vec[0] == pytest.approx(0.1, abs=1e-7)
+
+    def test_miss_returns_none(self, tmp_path):
+        cache = EmbeddingCache(tmp_path / "cache.sqlite")
+        cache.put_many("ollama", "m", ["known"], [[1.0]])
+        assert cache.get_many("ollama", "m", ["known", "unknown"]) == [[1.0], None]
+        assert cache.hits == 1
+        assert cache.misses == 1
+
+    def test_keyed_by_provider_and_model(self, tmp_path):
+        cache = EmbeddingCache(tmp_path / "cache.sqlite")
+        cache.put_many("ollama", "model-a", ["text"], [[1.0]])
+        assert cache.get_many("ollama", "model-b", ["text"]) == [None]
+        assert cache.get_many("st", "model-a", ["text"]) == [None]
+
+    def test_none_vectors_not_stored(self, tmp_path):
+        cache = EmbeddingCache(tmp_path / "cache.sqlite")
+        cache.put_many("ollama", "m", ["ok", "failed"], [[1.0], None])
+        assert cache.get_many("ollama", "m", ["failed"]) == [None]
+
+    def test_persists_across_instances(self, tmp_path):
+        EmbeddingCache(tmp_path / "cache.sqlite").put_many("ollama", "m", ["t"], [[3.0]])
+        assert EmbeddingCache(tmp_path / "cache.sqlite").get_many("ollama", "m", ["t"]) == [[3.0]]
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = EmbeddingCache(tmp_path / "cache.sqlite", max_bytes=3 * 4)
+        for text in ["a", "b", "c"]:
+            cache.put_many("ollama", "m", [text], [[1.0]])
+            time.sleep(0.01)
+        cache.get_many("ollama", "m", ["a"])  # Touch "a" so "b" is the oldest
+        cache.put_many("ollama", "m", ["d"], [[1.0]])
+        assert cache.evict() == 1
+        assert cache.get_many("ollama", "m", ["a", "b", "c", "d"]) == [[1.0], None, [1.0], [1.0]]
+
+    def test_text_hash_is_sha256(self):
+        assert text_hash("abc") == "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestQueryEmbeddingCache:
+    def test_normalised_round_trip(self, tmp_path):
+        cache = QueryEmbeddingCache(tmp_path / "queries.sqlite")
+        cache.put("ollama", "m", "  Trip  to\nParis ", [0.5, 1.0])
+        assert normalise_query("  Trip  to\nParis ") == "trip to paris"
+        assert cache.get("ollama", "m", "trip to paris") == [0.5, 1.0]
+        assert cache.get("ollama", "other-model", "trip to paris") is None
+
+    def test_expired_entries_miss_and_are_purged(self, tmp_path):
+        cache = QueryEmbeddingCache(tmp_path / "queries.sqlite", ttl_seconds=60)
+        cache.put("ollama", "m", "old", [1.0])
+        with patch("embedding_cache.time.time", return_value=time.time() + 120):
+            assert cache.get("ollama", "m", "old") is None
+            cache.put("ollama", "m", "new", [2.0])
+        assert cache._db.execute("SELECT query FROM queries").fetchall() == [("new",)]
+
+    def test_entry_cap_drops_least_recently_used(self, tmp_path):
+        cache = QueryEmbeddingCache(tmp_path / "queries.sqlite", max_entries=2)
+        now = time.time()
+        for offset, query in enumerate(["a", "b"]):
+            with patch("embedding_cache.time.time", return_value=now + offset):
+                cache.put("ollama", "m", query, [1.0])
+        with patch("embedding_cache.time.time", return_value=now + 2):
+            cache.get("ollama", "m", "a")
+        with patch("embedding_cache.time.time", return_value=now + 3):
+            cache.put("ollama", "m", "c", [1.0])
+        assert cache.get("ollama", "m", "a") == [1.0]
+        assert cache.get("ollama", "m", "b") is None
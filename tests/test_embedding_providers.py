@@ -0,0 +1,218 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import output_format
+from embedding_providers import (
+    AdaptiveBatchSize, AsyncEmbedder, EmbeddingError, EmbeddingProvider,
+    EmbeddingUnavailable, OllamaProvider, SentenceTransformersProvider, TokenBucket,
+)
+
+
+def _fake_embed(texts):
+    return [[float(len(t)), 1.0] for t in texts]
+
+
+def _ok_handler(method, path, body):
+    return 200, {"embeddings": _fake_embed(body["input"])}
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestAdaptiveBatchSize:
+    def test_errors_halve_and_fast_batches_grow_back(self):
+        batching = AdaptiveBatchSize(16, maximum=32, target_latency=1.0)
+        batching.record(16, 0.1, ok=False)
+        assert batching.size == 8
+        batching.record(8, 0.1, ok=True)
+        batching.record(12, 0.1, ok=True)
+        assert batching.size == 16
+        for _ in range(10):
+            batching.record(batching.size, 0.1, ok=True)
+        assert batching.size == 32
+
+    def test_slow_batches_shrink(self):
+        batching = AdaptiveBatchSize(16, target_latency=1.0)
+        batching.record(16, 5.0, ok=True)
+        assert batching.size == 12
+        # A short tail batch finishing quickly says nothing about full batches
+        batching.record(3, 0.1, ok=True)
+        assert batching.size == 12
+
+    def test_never_below_one(self):
+        batching = AdaptiveBatchSize(2)
+        for _ in range(3):
+            batching.record(1, 0.1, ok=False)
+        assert batching.size == 1
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestTokenBucket:
+    def test_paces_after_burst(self):
+        bucket = TokenBucket(rate=50, burst=2)
+
+        async def take(n):
+            for _ in range(n):
+                await bucket.acquire()
+
+        started = time.monotonic()
+        asyncio.run(take(2))
+        assert time.monotonic() - started < 0.02
+        started = time.monotonic()
+        asyncio.run(take(5))
+        assert time.monotonic() - started >= 0.09
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestAsyncEmbedder:
+    def test_ollama_against_stub_server(self, stub_http_server):
+        url, requests = stub_http_server(_ok_handler)
+        embedder = AsyncEmbedder(OllamaProvider(url, "m"), batch_size=4, concurrency=3)
+        texts = [f"text {i:>{i}}" for i in range(1, 11)]
+        assert embedder.embed_sync(texts) == _fake_embed(texts)
+        assert sorted(len(body["input"]) for _, _, body in requests) == [2, 4, 4]
+        assert all(body["model"] == "m" for _, _, body in requests)
+        assert sorted(m["size"] for m in embedder.metrics) == [2, 4, 4]
+        assert all(m["ok"] and m["latency_ms"] >= 0 for m in embedder.metrics)
+
+    def test_failures_shrink_later_batches(self, stub_http_server):
+        def handler(method, path, body):
+            if len(body["input"]) > 2:
+                return 413, {"error": "too large"}
+            return _ok_handler(method, path, body)
+        url, requests = stub_http_server(handler)
+        embedder = AsyncEmbedder(OllamaProvider(url, "m"), batch_size=8, concurrency=1)
+        texts = [f"t{i}" for i in range(16)]
+        assert embedder.embed_sync(texts[:8]) == _fake_embed(texts[:8])
+        first = len(requests)
+        assert embedder.embed_sync(texts[8:]) == _fake_embed(texts[8:])
+        # The second call starts from the adapted size instead of 8
+        sizes = [len(body["input"]) for _, _, body in requests[first:]]
+        assert 8 not in sizes
+        assert len(sizes) < first
+        assert [m["ok"] for m in embedder.metrics].count(False) >= 3
+
+    def test_bad_text_isolated_with_partial_vectors(self, stub_http_server):
+        def handler(method, path, body):
+            if "bad" in body["input"]:
+                return 400, {"error": "cannot embed"}
+            return _ok_handler(method, path, body)
+        url, _ = stub_http_server(handler)
+        embedder = AsyncEmbedder(OllamaProvider(url, "m"), batch_size=4)
+        with pytest.raises(EmbeddingError, match="cannot embed") as excinfo:
+            embedder.embed_sync(["a", "bb", "bad", "dddd", "e"])
+        assert excinfo.value.vectors == [[1.0, 1.0], [2.0, 1.0], None, [4.0, 1.0], [1.0, 1.0]]
+        assert list(excinfo.value.errors) == [2]
+
+    def test_context_length_error_is_split(self, stub_http_server):
+        def handler(method, path, body):
+            if "long" in body["input"]:
+                return 500, {"error": "the input length exceeds the context length"}
+            return _ok_handler(method, path, body)
+        url, _ = stub_http_server(handler)
+        embedder = AsyncEmbedder(OllamaProvider(url, "m"), batch_size=4)
+        with pytest.raises(EmbeddingError) as excinfo:
+            embedder.embed_sync(["a", "long", "c"])
+        assert list(excinfo.value.errors) == [1]
+
+    def test_server_error_fails_without_splitting(self, stub_http_server):
+        url, requests = stub_http_server(lambda method, path, body: (500, {"error": "model crashed"}))
+        embedder = AsyncEmbedder(OllamaProvider(url, "m"), batch_size=8, concurrency=2)
+        with pytest.raises(EmbeddingUnavailable, match="model crashed"):
+            embedder.embed_sync([f"t{i}" for i in range(64)])
+        assert len(requests) <= 2
+
+    def test_unreachable_server_fails_at_once(self, monkeypatch):
+        import http_pool
+        monkeypatch.setattr(http_pool, "_default_pool", http_pool.ConnectionPool(retries=0))
+        embedder = AsyncEmbedder(OllamaProvider("http://127.0.0.1:9", "m"), batch_size=8,
+                                 concurrency=2)
+        with pytest.raises(EmbeddingUnavailable, match="Cannot reach Ollama"):
+            embedder.embed_sync([f"t{i}" for i in range(64)])
+        assert len(embedder.metrics) <= 2
+
+    def test_rate_limit_spaces_remote_requests(self, stub_http_server):
+        url, requests = stub_http_server(_ok_handler)
+        embedder = AsyncEmbedder(OllamaProvider(url, "m"), batch_size=1, concurrency=1,
+                                 rate_limit=40)
+        started = time.monotonic()
+        embedder.embed_sync(["a", "b", "c", "d", "e"])
+        assert len(requests) == 5
+        assert time.monotonic() - started >= 4 / 40 * 0.9
+
+    def test_local_provider_runs_one_batch_at_a_time(self):
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def encode(texts):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+            return _fake_embed(texts)
+
+        embedder = AsyncEmbedder(SentenceTransformersProvider("m", encode), batch_size=2,
+                                 concurrency=4, rate_limit=10)
+        assert embedder.concurrency == 1
+        assert embedder.limiter is None  # Local models are not rate limited
+        assert embedder.embed_sync(["a", "b", "c", "d", "e"]) == _fake_embed("abcde")
+        assert peak[0] == 1
+
+    def test_provider_must_implement_embed_batch(self):
+        class Incomplete(EmbeddingProvider):
+            name = "incomplete"
+
+        with pytest.raises(TypeError):
+            Incomplete()
+
+    def test_metrics_callback_and_summary(self):
+        class Echo(EmbeddingProvider):
+            name = "echo"
+
+            async def embed_batch(self, texts):
+                return _fake_embed(texts)
+
+        seen = []
+        embedder = AsyncEmbedder(Echo(), batch_size=3, on_batch=seen.append)
+        embedder.embed_sync(["a"] * 7)
+        assert sorted(m["size"] for m in seen) == [1, 3, 3]
+        assert seen[0]["provider"] == "echo"
+        summary = embedder.latency_summary()
+        assert summary["batches"] == 3 and summary["failed"] == 0
+        assert summary["p50_ms"] <= summary["p95_ms"] <= summary["max_ms"]
+        assert embedder.latency_summary(since=3) == {"batches": 0, "failed": 0}
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestSyncEmbeddingMetrics:
+    def test_get_embeddings_emits_batch_records(self, stub_http_server, tmp_path, monkeypatch):
+        import qdrant_integration
+        monkeypatch.setattr(qdrant_integration, "_embedders", {})
+        url, _ = stub_http_server(_ok_handler)
+        config = {"embedding_provider": "ollama", "ollama_url": url, "ollama_model": "m",
+                  "embed_batch_size": 2, "embed_concurrency": 1}
+        log = tmp_path / "log.jsonl"
+        output_format.enable_json_mode(str(log))
+        try:
+            qdrant_integration.get_embeddings(["a", "b", "c"], config)
+            qdrant_integration.get_embeddings(["d"], config)
+        finally:
+            output_format.close()
+            monkeypatch.setattr(output_format, "_json_mode", False)
+        records = [json.loads(line) for line in log.read_text().splitlines()]
+        assert [(r["type"], r["size"]) for r in records] == [
+            ("embed_batch", 2), ("embed_batch", 1), ("embed_batch", 1)]
+        # The same embedder (and its adapted batch size) serves both calls
+        assert len(qdrant_integration._embedders) == 1
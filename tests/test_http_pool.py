@@ -0,0 +1,96 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from http_pool import ConnectionPool, HTTPConnectError, HTTPStatusError
+
+
+def _ok(method, path, body):
+    return 200, {"path": path, "body": body}
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestConnectionPool:
+    def test_reuses_connection(self, stub_http_server):
+        url, requests = stub_http_server(_ok)
+        pool = ConnectionPool()
+        for i in range(5):
+            data = pool.request("POST", f"{url}/item/{i}", body=b'{"n": 1}',
+                                headers={"Content-Type": "application/json"})
+            assert b'"/item/' in data
+        assert len(requests) == 5
+        assert pool.connections_opened == 1
+
+    def test_query_string_forwarded(self, stub_http_server):
+        url, requests = stub_http_server(_ok)
+        ConnectionPool().request("GET", f"{url}/points?wait=false")
+        assert requests[0][1] == "/points?wait=false"
+
+    def test_error_status_raises(self, stub_http_server):
+        url, requests = stub_http_server(lambda m, p, b: (404, {"status": "missing"}))
+        pool = ConnectionPool(backoff=0)
+        with pytest.raises(HTTPStatusError) as exc:
+            pool.request("GET", f"{url}/collections/x")
+        assert exc.value.status == 404
+        assert b"missing" in exc.value.body
+        assert len(requests) == 1  # 404 is not retried
+
+    def test_retries_unavailable(self, stub_http_server):
+        replies = iter([(503, {}), (503, {}), (200, {"ok": True})])
+        url, requests = stub_http_server(lambda m, p, b: next(replies))
+        pool = ConnectionPool(retries=2, backoff=0)
+        assert pool.request("GET", f"{url}/") == b'{"ok": true}'
+        assert len(requests) == 3
+
+    def test_gives_up_after_retries(self, stub_http_server):
+        url, requests = stub_http_server(lambda m, p, b: (503, {}))
+        pool = ConnectionPool(retries=1, backoff=0)
+        with pytest.raises(HTTPStatusError):
+            pool.request("GET", f"{url}/")
+        assert len(requests) == 2
+
+    def test_connection_refused(self, stub_http_server):
+        url, _ = stub_http_server(_ok)
+        pool = ConnectionPool(retries=1, backoff=0)
+        with pytest.raises(HTTPConnectError):
+            pool.request("GET", "http://127.0.0.1:1/")
+
+    def test_recovers_from_dropped_idle_connection(self, stub_http_server):
+        url, requests = stub_http_server(lambda m, p, b: (200, {"ok": True}, True))
+        pool = ConnectionPool(retries=0)
+        pool.request("GET", f"{url}/one")
+        time.sleep(0.05)  # Let the server close its end
+        assert pool.request("GET", f"{url}/two") == b'{"ok": true}'
+        assert len(requests) == 2
+
+    def test_limits_connections_per_host(self, stub_http_server):
+        active = [0]
+        peak = [0]
+        lock = threading.Lock()
+
+        def slow(method, path, body):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return 200, {}
+
+        url, requests = stub_http_server(slow)
+        pool = ConnectionPool(max_per_host=2)
+        threads = [threading.Thread(target=pool.request, args=("GET", f"{url}/"))
+                   for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(requests) == 8
+        assert peak[0] <= 2
+        assert pool.connections_opened <= 2
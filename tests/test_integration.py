@@ -179,6 +179,37 @@ class TestQueryNotesIntegration:
         for count in Counter(r["file"] for r in matches).values():
             assert count <= 1
 
+    def test_limit_caps_total_matches(self, tmp_path):
+        export_dir = setup_test_export(tmp_path)
+        json_file = tmp_path / "results.jsonl"
+        result = run_script("query_notes.py",
+                           ["--limit", "2", "--json-log", str(json_file), "alpha"],
+                           env_overrides={"NOTES_EXPORT_ROOT_DIR": str(export_dir)})
+        assert result.returncode == 0
+        lines = [json.loads(l) for l in json_file.read_text().strip().split("\n") if l.strip()]
+        assert len([r for r in lines if r["type"] == "match"]) == 2
+        summary = next(r for r in lines if r["type"] == "summary")
+        assert summary["limit_reached"] is True
+
+    def test_negative_limit_rejected(self, tmp_path):
+        export_dir = setup_test_export(tmp_path)
+        result = run_script("query_notes.py", ["--limit", "-1", "alpha"],
+                           env_overrides={"NOTES_EXPORT_ROOT_DIR": str(export_dir)})
+        assert result.returncode == 2
+        assert "must be 0 or more" in result.stderr
+
+    def test_first_with_sort_modified_returns_newest(self, tmp_path):
+        export_dir = setup_test_export(tmp_path)
+        json_path = export_dir / "data" / "iCloud-Notes.json"
+        tracking = json.loads(json_path.read_text())
+        tracking["3"]["modified"] = "Friday, 20 February 2026 at 09:00:00"
+        json_path.write_text(json.dumps(tracking))
+        result = run_script("query_notes.py",
+                           ["--sort", "modified", "--first", "-l", "alpha"],
+                           env_overrides={"NOTES_EXPORT_ROOT_DIR": str(export_dir)})
+        assert result.returncode == 0
+        assert result.stdout.strip() == "md/iCloud-Notes/test-note-3.md"
+
 
 # ── Reconcile Integration Tests ───────────────────────────────────────────
 
@@ -0,0 +1,313 @@
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+np = pytest.importorskip("numpy")
+
+from local_vector_index import LocalVectorIndex
+from qdrant_integration import QdrantNotesManager, check_prerequisites, get_vector_client
+
+
+def _point(pid, vector, **payload):
+    return {"id": pid, "vector": vector, "payload": payload}
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestLocalVectorIndex:
+    def _index(self, tmp_path, **kwargs):
+        index = LocalVectorIndex(tmp_path / "index", **kwargs)
+        index.create_collection("notes", 3)
+        return index
+
+    def test_collection_lifecycle(self, tmp_path):
+        index = LocalVectorIndex(tmp_path / "index")
+        assert not index.collection_exists("notes")
+        index.create_collection("notes", 3, metadata={"embedding_model": "m"}, on_disk=True)
+        assert index.collection_exists("notes")
+        assert index.count("notes") == 0
+        assert LocalVectorIndex(tmp_path / "index").collection_metadata("notes") == {
+            "embedding_model": "m", "dimension": 3}
+        index.delete_collection("notes")
+        assert not index.collection_exists("notes")
+
+    def test_search_ranks_by_cosine_similarity(self, tmp_path):
+        index = self._index(tmp_path)
+        index.upsert_points("notes", [
+            _point(1, [1, 0, 0], note_id="a"),
+            _point(2, [0, 1, 0], note_id="b"),
+            _point(3, [1, 1, 0], note_id="c"),
+        ])
+        results = index.search("notes", [2, 0.1, 0], limit=2)
+        assert [r["id"] for r in results] == [1, 3]
+        assert results[0]["payload"] == {"note_id": "a"}
+        assert results[0]["score"] == pytest.approx(0.9988, abs=1e-3)
+        assert index.search("notes", [0, 1, 0], score_threshold=0.9) == [
+            {"id": 2, "score": pytest.approx(1.0), "payload": {"note_id": "b"}}]
+
+    def test_filtered_search(self, tmp_path):
+        index = self._index(tmp_path)
+        index.create_payload_index("notes", "notebook", "keyword")
+        assert index.payload_indexes("notes") == {"notebook"}
+        index.upsert_points("notes", [
+            _point(1, [1, 0, 0], notebook="Work", modified_ts=100),
+            _point(2, [1, 0.1, 0], notebook="Home", modified_ts=200),
+            _point(3, [1, 0.2, 0], notebook="Work", modified_ts=300),
+        ])
+        work = {"must": [{"key": "notebook", "match": {"any": ["Work"]}}]}
+        assert [r["id"] for r in index.search("notes", [1, 0, 0], query_filter=work)] == [1, 3]
+        recent_work = {"must": work["must"] + [{"key": "modified_ts", "range": {"gte": 150}}]}
+        assert [r["id"] for r in index.search("notes", [1, 0, 0], query_filter=recent_work)] == [3]
+        nothing = {"must": [{"key": "notebook", "match": {"any": []}}]}
+        assert index.search("notes", [1, 0, 0], query_filter=nothing) == []
+
+    def test_search_groups_returns_distinct_notes(self, tmp_path):
+        index = self._index(tmp_path)
+        # Twenty chunks of one note outscore everything else
+        index.upsert_points("notes", [_point(i, [1, i / 1000, 0], note_id="long")
+                                      for i in range(20)] + [
+            _point(100, [1, 0.5, 0], note_id="b"),
+            _point(101, [1, 0.9, 0], note_id="c"),
+            _point(102, [1, 0.6, 0]),
+        ])
+        hits = index.search_groups("notes", [1, 0, 0], limit=3)
+        assert [(h["id"], h["payload"]["note_id"]) for h in hits] == [
+            (0, "long"), (100, "b"), (101, "c")]
+        assert len(index.search_groups("notes", [1, 0, 0], limit=10)) == 3
+        assert [h["id"] for h in index.search("notes", [1, 0, 0], limit=2, offset=1)] == [1, 2]
+
+    def test_upsert_replaces_existing_point(self, tmp_path):
+        index = self._index(tmp_path)
+        index.upsert_points("notes", [_point(1, [1, 0, 0], v=1)])
+        index.upsert_points("notes", [_point(1, [0, 0, 1], v=2)])
+        assert index.count("notes") == 1
+        [hit] = index.search("notes", [0, 0, 1], limit=5)
+        assert hit["payload"] == {"v": 2}
+        assert hit["score"] == pytest.approx(1.0)
+
+    def test_delete_keeps_remaining_points_searchable(self, tmp_path):
+        index = self._index(tmp_path)
+        index.upsert_points("notes", [_point(i, [1, i, 0], n=i) for i in range(5)])
+        index.delete_points("notes", [0, 2, 99])
+        assert index.count("notes") == 3
+        found = {r["id"]: r["payload"]["n"] for r in index.search("notes", [1, 0, 0], limit=10)}
+        assert found == {1: 1, 3: 3, 4: 4}
+
+    def test_set_payload_merges(self, tmp_path):
+        index = self._index(tmp_path)
+        index.upsert_points("notes", [_point(1, [1, 0, 0], note_id="a", modified="m1")])
+        index.set_payload("notes", {"modified": "m2"}, [1])
+        points, _ = index.scroll("notes")
+        assert points == [{"id": 1, "payload": {"note_id": "a", "modified": "m2"}}]
+
+    def test_scroll_payload_selection(self, tmp_path):
+        index = self._index(tmp_path)
+        index.upsert_points("notes", [_point(1, [1, 0, 0], note_id="a", notebook="nb", big="x")])
+        assert index.scroll("notes", with_payload=False)[0] == [{"id": 1}]
+        assert index.scroll("notes", with_payload=["note_id", "notebook"])[0] == [
+            {"id": 1, "payload": {"note_id": "a", "notebook": "nb"}}]
+        [point], _ = index.scroll("notes", with_payload=False, with_vector=True)
+        assert point["vector"] == pytest.approx([1, 0, 0])
+
+    def test_scroll_pages_in_id_order(self, tmp_path):
+        index = self._index(tmp_path)
+        index.upsert_points("notes", [_point(i, [1, 0, 0]) for i in (5, 1, 3, 2, 4)])
+        first, offset = index.scroll("notes", limit=2)
+        second, offset2 = index.scroll("notes", limit=2, offset=offset)
+        third, offset3 = index.scroll("notes", limit=2, offset=offset2)
+        assert [p["id"] for p in first + second + third] == [1, 2, 3, 4, 5]
+        assert offset3 is None
+
+    def test_grows_past_initial_capacity_and_persists(self, tmp_path):
+        index = self._index(tmp_path, dtype="float16")
+        rng = np.random.default_rng(1)
+        vectors = rng.normal(size=(1500, 3))
+        index.upsert_points("notes", [_point(i, v.tolist(), n=i) for i, v in enumerate(vectors)])
+
+        reopened = LocalVectorIndex(tmp_path / "index")
+        assert reopened.count("notes") == 1500
+        [hit] = reopened.search("notes", vectors[1234].tolist(), limit=1)
+        assert hit["id"] == 1234
+        assert json.loads((tmp_path / "index" / "notes" / "meta.json").read_text())["dtype"] == "float16"
+
+    def test_row_count_recovered_from_points_after_stale_meta(self, tmp_path):
+        index = self._index(tmp_path)
+        index.upsert_points("notes", [_point(i, [1, i, 0], n=i) for i in range(3)])
+        # A crash after the points commit but before meta.json was rewritten
+        meta_path = tmp_path / "index" / "notes" / "meta.json"
+        meta = json.loads(meta_path.read_text())
+        meta_path.write_text(json.dumps({**meta, "rows": 1}))
+
+        reopened = LocalVectorIndex(tmp_path / "index")
+        assert reopened.count("notes") == 3
+        reopened.upsert_points("notes", [_point(3, [0, 0, 1], n=3)])
+        assert {r["id"] for r in reopened.search("notes", [1, 1, 1], limit=10)} == {0, 1, 2, 3}
+        assert json.loads(meta_path.read_text())["rows"] == 4
+        assert not meta_path.with_name("meta.json.tmp").exists()
+
+    def test_approximate_index_above_threshold(self, tmp_path):
+        index = LocalVectorIndex(tmp_path / "index", ann_threshold=500, nprobe=4)
+        index.create_collection("notes", 8)
+        rng = np.random.default_rng(2)
+        vectors = rng.normal(size=(2000, 8))
+        index.upsert_points("notes", [_point(i, v.tolist()) for i, v in enumerate(vectors)])
+
+        hits = 0
+        for q in range(50):
+            [hit] = index.search("notes", vectors[q].tolist(), limit=1)
+            hits += hit["id"] == q
+        assert hits >= 45
+        assert (tmp_path / "index" / "notes" / "ivf.npz").exists()
+
+        # Points added after the build are assigned to a list and found
+        index.upsert_points("notes", [_point(5000, [9, 9, 9, 9, 9, 9, 9, 9])])
+        index.delete_points("notes", [0])
+        assert index.search("notes", [9] * 8, limit=1)[0]["id"] == 5000
+        assert index.count("notes") == 2000
+
+    def test_dimension_mismatch_raises(self, tmp_path):
+        index = self._index(tmp_path)
+        with pytest.raises(RuntimeError, match="dimension"):
+            index.upsert_points("notes", [_point(1, [1, 0])])
+
+    def test_missing_collection_raises_runtime_error(self, tmp_path):
+        index = LocalVectorIndex(tmp_path / "index")
+        with pytest.raises(RuntimeError):
+            index.count("notes")
+
+    def test_concurrent_writes(self, tmp_path):
+        index = self._index(tmp_path)
+
+        def write(worker):
+            rng = np.random.default_rng(worker)
+            ids = range(worker * 1500, (worker + 1) * 1500)
+            for start in range(0, 1500, 100):
+                index.upsert_points("notes", [_point(i, rng.normal(size=3).tolist(), w=worker)
+                                              for i in ids[start:start + 100]])
+                index.set_payload("notes", {"seen": True}, list(ids[start:start + 10]))
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(write, range(4)))
+        assert index.count("notes") == 6000
+        index.delete_points("notes", list(range(0, 6000, 2)))
+        points, _ = index.scroll("notes", limit=6000)
+        assert sorted(p["id"] for p in points) == list(range(1, 6000, 2))
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestLocalBackend:
+    def test_factory_selects_backend(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_VECTOR_BACKEND", "local")
+        monkeypatch.setenv("NOTES_EXPORT_VECTOR_DIR", str(tmp_path / "vectors"))
+        from qdrant_integration import _get_config
+        client = get_vector_client(_get_config())
+        assert isinstance(client, LocalVectorIndex)
+        assert client.directory == tmp_path / "vectors" / "index"
+
+    def test_prerequisites_report_numpy(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_VECTOR_BACKEND", "local")
+        monkeypatch.setenv("NOTES_EXPORT_VECTOR_DIR", str(tmp_path / "vectors"))
+        with patch('qdrant_integration._check_embedding_provider'):
+            status = check_prerequisites()
+            with patch('importlib.util.find_spec', return_value=None):
+                missing = check_prerequisites()
+        assert status["qdrant"] and "numpy: installed" in status["details"]
+        assert not missing["qdrant"]
+        assert "Vector backend: local, but numpy is not installed" in missing["details"]
+
+    def test_sync_and_search_without_qdrant(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        monkeypatch.setenv("NOTES_EXPORT_VECTOR_BACKEND", "local")
+        (tmp_path / "data").mkdir()
+        md_dir = tmp_path / "md" / "nb"
+        md_dir.mkdir(parents=True)
+        (md_dir / "apples.md").write_text("apples")
+        (md_dir / "pears.md").write_text("pears and more pears")
+        with open(tmp_path / "data" / "nb.json", "w") as f:
+            json.dump({
+                "1": {"filename": "apples", "modified": "m1", "lastExported": "e1"},
+                "2": {"filename": "pears", "modified": "m1", "lastExported": "e1"},
+            }, f)
+
+        embed = lambda texts, config: [[float("apples" in t), float("pears" in t), 0.1]
+                                       for t in texts]
+        with patch('qdrant_integration.get_embeddings', side_effect=embed), \
+             patch('qdrant_integration.get_embedding_dimension', return_value=3):
+            stats = QdrantNotesManager().sync()
+            results = QdrantNotesManager().search("pears", limit=1)
+
+        assert stats["upserted"] == 2
+        assert (tmp_path / "vectors" / "index").is_dir()
+        assert results[0]["filename"] == "pears"
+
+    def test_same_note_id_in_two_notebooks_stays_distinct(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        monkeypatch.setenv("NOTES_EXPORT_VECTOR_BACKEND", "local")
+        (tmp_path / "data").mkdir()
+        for notebook in ("work", "home"):
+            md_dir = tmp_path / "md" / notebook
+            md_dir.mkdir(parents=True)
+            (md_dir / f"{notebook}.md").write_text(f"pears from {notebook}")
+            with open(tmp_path / "data" / f"{notebook}.json", "w") as f:
+                json.dump({"1": {"filename": notebook, "modified": "m1",
+                                 "lastExported": "e1"}}, f)
+
+        embed = lambda texts, config: [[float("pears" in t), 0.1, 0.0] for t in texts]
+        with patch('qdrant_integration.get_embeddings', side_effect=embed), \
+             patch('qdrant_integration.get_embedding_dimension', return_value=3):
+            QdrantNotesManager().sync()
+            results = QdrantNotesManager().search("pears", limit=5)
+
+        assert sorted(r["notebook"] for r in results) == ["home", "work"]
+
+    def test_parallel_multi_batch_sync(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        monkeypatch.setenv("NOTES_EXPORT_VECTOR_BACKEND", "local")
+        monkeypatch.setenv("NOTES_EXPORT_EMBED_BATCH_SIZE", "4")
+        monkeypatch.setenv("NOTES_EXPORT_QDRANT_PARALLEL", "4")
+        monkeypatch.setenv("NOTES_EXPORT_EMBEDDING_CACHE", "false")
+        (tmp_path / "data").mkdir()
+        md_dir = tmp_path / "md" / "nb"
+        md_dir.mkdir(parents=True)
+        notes = {}
+        for i in range(200):
+            notes[str(i)] = {"filename": f"n{i}", "modified": "m1", "lastExported": "e1"}
+            (md_dir / f"n{i}.md").write_text(f"note {i}")
+
+        def write_tracking():
+            with open(tmp_path / "data" / "nb.json", "w") as f:
+                json.dump(notes, f)
+
+        embed = lambda texts, config: [[float(len(t)), 1.0, float(hash(t) % 7)]
+                                       for t in texts]
+        write_tracking()
+        with patch('qdrant_integration.get_embeddings', side_effect=embed), \
+             patch('qdrant_integration.get_embedding_dimension', return_value=3):
+            assert QdrantNotesManager().config["upsert_parallel"] == 4
+            first = QdrantNotesManager().sync()
+
+            # Half the notes change: upserts overlap payload updates and deletions
+            notes = json.load(open(tmp_path / "data" / "nb.json"))
+            for i in range(0, 200, 2):
+                notes[str(i)].update(lastExported="e2", modified="m2")
+                (md_dir / f"n{i}.md").write_text(f"edited note {i}")
+            for i in range(1, 40, 4):
+                notes[str(i)]["deletedDate"] = "today"
+            write_tracking()
+            second = QdrantNotesManager().sync()
+            client = get_vector_client(QdrantNotesManager().config)
+
+        assert first["upserted"] == 200
+        assert second["upserted"] == 100
+        assert second["deleted"] == 10
+        assert client.count("apple_notes") == 190
+        points, _ = client.scroll("apple_notes", limit=500)
+        modified = {p["payload"]["note_id"]: p["payload"]["modified"] for p in points}
+        assert all(modified[str(i)] == "m2" for i in range(0, 200, 2))
@@ -1,6 +1,9 @@
 import json
 import os
+import re
 import sys
+import time
+from datetime import datetime
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
@@ -8,17 +11,50 @@ import pytest
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+import qdrant_integration
 from qdrant_integration import (
     QdrantHTTP,
     QdrantNotesManager,
     _get_config,
     _make_point_id,
+    _model_identity,
+    _embed_ollama,
+    _embed_sentence_transformers,
     _note_to_text,
+    _threaded,
+    _threaded_merge,
+    DEFAULT_CHUNK_OVERLAP,
+    PAYLOAD_INDEXES,
+    build_search_filter,
+    chunk_spans,
     chunk_text,
+    get_chunker,
+    EmbeddingError,
+    EmbeddingModelMismatch,
+    EmbeddingUnavailable,
+    collection_options,
+    get_vector_client,
+    get_embedding_dimension,
     get_embeddings,
 )
 
 
+# Kept unpatched for the tests of the HTTP call itself
+_collection_metadata = QdrantHTTP.collection_metadata
+
+
+@pytest.fixture(autouse=True)
+def _existing_collection_state(monkeypatch):
+    """Sync checks payload indexes and the collection's model over HTTP; most
+    tests have the indexes and a collection built with the configured model.
+    Query vectors are not cached unless a test asks for it."""
+    monkeypatch.setenv("NOTES_EXPORT_QUERY_CACHE", "false")
+    with patch.object(QdrantHTTP, 'payload_indexes', return_value=set(PAYLOAD_INDEXES)), \
+         patch.object(QdrantHTTP, 'collection_metadata',
+                      side_effect=lambda name: _model_identity(_get_config())):
+        yield
+
+
 @pytest.mark.unit
 @pytest.mark.qdrant
 class TestConfig:
@@ -103,6 +139,60 @@ class TestChunkText:
         chunks_large = chunk_text(text, chunk_size=1000, overlap=200)
         assert len(chunks_small) > len(chunks_large)
 
+    def test_spans_are_lazy_offsets_into_text(self):
+        text = "  " + "Sentence number one. " * 80 + "\n"
+        spans = chunk_spans(text, chunk_size=300, overlap=60)
+        assert next(spans) == (2, 2 + len("Sentence number one. " * 14) - 1)
+        all_spans = list(chunk_spans(text, chunk_size=300, overlap=60))
+        assert [text[a:b] for a, b in all_spans] == chunk_text(text, 300, 60)
+        assert all_spans[-1][1] == len(text.rstrip())
+        # No trailing chunk that only repeats the end of the previous one
+        assert all_spans[-2][1] < all_spans[-1][1]
+
+    def test_token_sizes_with_tokenizer(self):
+        words = [f"w{i}" for i in range(100)]
+        text = " ".join(words)
+        tokenizer = lambda t: [m.start() for m in re.finditer(r"\S+", t)]
+        chunks = [text[a:b].split() for a, b in chunk_spans(text, 30, 10, tokenizer)]
+        assert all(len(chunk) <= 30 for chunk in chunks)
+        assert chunks[0] == words[:30] and chunks[1][0] == "w20"
+        assert chunks[-1][-1] == "w99"
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestChunker:
+    def test_chars_mode_uses_character_sizes(self, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_CHUNK_SIZE", "500")
+        assert get_chunker(_get_config()) == (500, DEFAULT_CHUNK_OVERLAP, None)
+
+    def test_model_tokenizer_falls_back_to_approximation(self, monkeypatch, capsys):
+        monkeypatch.setenv("NOTES_EXPORT_CHUNK_TOKENIZER", "model")
+        monkeypatch.setenv("NOTES_EXPORT_EMBEDDING_PROVIDER", "ollama")
+        monkeypatch.setenv("NOTES_EXPORT_CHUNK_TOKENS", "100")
+        monkeypatch.setenv("NOTES_EXPORT_CHUNK_OVERLAP_TOKENS", "20")
+        assert get_chunker(_get_config()) == (400, 80, None)
+        assert "approximating" in capsys.readouterr().out
+
+    def test_model_tokenizer_from_sentence_transformers(self, monkeypatch):
+        class FakeTokenizer:
+            def __call__(self, text, add_special_tokens, return_offsets_mapping):
+                return {"offset_mapping": [(0, 0)] + [(m.start(), m.end())
+                                                      for m in re.finditer(r"\w+", text)]}
+
+        model = MagicMock(tokenizer=FakeTokenizer())
+        monkeypatch.setenv("NOTES_EXPORT_CHUNK_TOKENIZER", "model")
+        monkeypatch.setenv("NOTES_EXPORT_EMBEDDING_PROVIDER", "sentence-transformers")
+        with patch('qdrant_integration._get_st_model', return_value=model):
+            size, overlap, tokenizer = get_chunker(_get_config())
+        assert (size, overlap) == (200, 50)
+        assert tokenizer("hello, big world") == [0, 7, 11]
+
+    def test_unknown_tokenizer(self, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_CHUNK_TOKENIZER", "bpe")
+        with pytest.raises(ValueError, match="chunk tokenizer"):
+            get_chunker(_get_config())
+
 
 @pytest.mark.unit
 @pytest.mark.qdrant
@@ -143,6 +233,140 @@ class TestNoteToText:
         assert "Some content here" in text
 
 
+def _ollama_config(url, batch_size=32, concurrency=1):
+    return {"ollama_url": url, "ollama_model": "test-model",
+            "embed_batch_size": batch_size, "embed_concurrency": concurrency}
+
+
+def _fake_embed(texts):
+    """Deterministic fake vectors: [text length, first char code]."""
+    return [[float(len(t)), float(ord(t[0]))] for t in texts]
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestOllamaBatching:
+    def test_sends_lists_of_inputs(self, stub_http_server):
+        url, requests = stub_http_server(
+            lambda method, path, body: (200, {"embeddings": _fake_embed(body["input"])}))
+        texts = [f"text {i}" for i in range(10)]
+        vectors = _embed_ollama(texts, _ollama_config(url, batch_size=4))
+        assert vectors == _fake_embed(texts)
+        assert [len(body["input"]) for _, _, body in requests] == [4, 4, 2]
+        assert all(path == "/api/embed" for _, path, _ in requests)
+
+    def test_concurrent_batches_keep_order(self, stub_http_server):
+        url, requests = stub_http_server(
+            lambda method, path, body: (200, {"embeddings": _fake_embed(body["input"])}))
+        texts = [chr(ord("a") + i) * (i + 1) for i in range(20)]
+        vectors = _embed_ollama(texts, _ollama_config(url, batch_size=3, concurrency=4))
+        assert vectors == _fake_embed(texts)
+        assert len(requests) == 7
+
+    def test_failing_batch_is_split(self, stub_http_server):
+        def handler(method, path, body):
+            if len(body["input"]) > 2:
+                return 400, {"error": "input too large"}
+            return 200, {"embeddings": _fake_embed(body["input"])}
+        url, requests = stub_http_server(handler)
+        texts = [f"t{i}" for i in range(8)]
+        vectors = _embed_ollama(texts, _ollama_config(url, batch_size=8))
+        assert vectors == _fake_embed(texts)
+        # 8 fails, 4+4 fail, then four batches of 2 succeed
+        assert [len(body["input"]) for _, _, body in requests] == [8, 4, 2, 2, 4, 2, 2]
+
+    def test_single_failing_text_raises(self, stub_http_server):
+        def handler(method, path, body):
+            if "bad" in body["input"]:
+                return 400, {"error": "cannot embed"}
+            return 200, {"embeddings": _fake_embed(body["input"])}
+        url, _ = stub_http_server(handler)
+        with pytest.raises(RuntimeError, match="cannot embed"):
+            _embed_ollama(["ok", "bad", "fine"], _ollama_config(url))
+
+    def test_empty_text_replaced(self, stub_http_server):
+        url, requests = stub_http_server(
+            lambda method, path, body: (200, {"embeddings": _fake_embed(body["input"])}))
+        _embed_ollama(["  ", "x"], _ollama_config(url))
+        assert requests[0][2]["input"] == ["(empty note)", "x"]
+
+
+class FakeSentenceTransformer:
+    """Records how the provider uses the model; vectors are [len(text), 1.0]."""
+    instances = []
+
+    def __init__(self, name):
+        self.name = name
+        self.encode_calls = []
+        self.multi_process_calls = []
+        FakeSentenceTransformer.instances.append(self)
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False):
+        self.encode_calls.append((len(texts), batch_size))
+        return [_FakeArray([float(len(t)), 1.0]) for t in texts]
+
+    def get_sentence_embedding_dimension(self):
+        return 2
+
+    def start_multi_process_pool(self, target_devices):
+        return {"devices": target_devices}
+
+    def stop_multi_process_pool(self, pool):
+        pass
+
+    def encode_multi_process(self, texts, pool, batch_size=32):
+        self.multi_process_calls.append((len(texts), len(pool["devices"])))
+        return [_FakeArray([float(len(t)), 1.0]) for t in texts]
+
+
+class _FakeArray(list):
+    def tolist(self):
+        return list(self)
+
+
+@pytest.fixture
+def fake_st(monkeypatch):
+    module = type(sys)("sentence_transformers")
+    module.SentenceTransformer = FakeSentenceTransformer
+    monkeypatch.setitem(sys.modules, "sentence_transformers", module)
+    monkeypatch.setattr(qdrant_integration, "_st_models", {})
+    monkeypatch.setattr(qdrant_integration, "_st_pools", {})
+    FakeSentenceTransformer.instances = []
+    return FakeSentenceTransformer
+
+
+def _st_config(**overrides):
+    config = {"embedding_provider": "sentence-transformers", "st_model": "mini",
+              "embed_batch_size": 4, "st_processes": 0}
+    config.update(overrides)
+    return config
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestSentenceTransformersProvider:
+    def test_model_loaded_once(self, fake_st):
+        config = _st_config()
+        for _ in range(5):
+            assert _embed_sentence_transformers(["ab", "c"], config) == [[2.0, 1.0], [1.0, 1.0]]
+        assert len(fake_st.instances) == 1
+        assert fake_st.instances[0].encode_calls == [(2, 4)] * 5
+
+    def test_dimension_read_from_model(self, fake_st):
+        assert get_embedding_dimension(_st_config()) == 2
+        assert fake_st.instances[0].encode_calls == []  # No "test" embedding
+
+    def test_multi_process_for_large_inputs(self, fake_st):
+        config = _st_config(st_processes=3)
+        texts = [f"text {i}" for i in range(20)]
+        assert len(_embed_sentence_transformers(texts, config)) == 20
+        model = fake_st.instances[0]
+        assert model.multi_process_calls == [(20, 3)]
+        # Small inputs are not worth shipping to worker processes
+        _embed_sentence_transformers(["one"], config)
+        assert model.encode_calls == [(1, 4)]
+
+
 @pytest.mark.unit
 @pytest.mark.qdrant
 class TestQdrantHTTP:
@@ -158,6 +382,58 @@ class TestQdrantHTTP:
         client = QdrantHTTP("http://localhost:6333/")
         assert client.url == "http://localhost:6333"
 
+    def test_upsert_batches_by_points_and_bytes(self, stub_http_server):
+        url, requests = stub_http_server(lambda m, p, b: (200, {"result": {}}))
+        client = QdrantHTTP(url, batch_points=3, batch_bytes=400, parallel=1)
+        points = [{"id": i, "vector": [0.5] * 4, "payload": {"text": "x" * (350 if i == 4 else 1)}}
+                  for i in range(8)]
+        client.upsert_points("notes", points)
+
+        sizes = [len(body["points"]) for _, _, body in requests]
+        assert sizes == [3, 1, 1, 3]  # Point 4's large payload gets a request of its own
+        assert [p["id"] for _, _, body in requests for p in body["points"]] == list(range(8))
+
+    def test_parallel_upsert_ends_with_wait_barrier(self, stub_http_server):
+        url, requests = stub_http_server(lambda m, p, b: (200, {"result": {}}))
+        client = QdrantHTTP(url, batch_points=2, parallel=4)
+        client.upsert_points("notes", [{"id": i, "vector": [1.0], "payload": {}}
+                                       for i in range(10)])
+
+        paths = [path for _, path, _ in requests]
+        assert paths[:-1] == ["/collections/notes/points?wait=false"] * 4
+        assert paths[-1] == "/collections/notes/points?wait=true"
+        assert requests[-1][2]["points"][-1]["id"] == 9
+
+    def test_upsert_without_wait_sends_no_barrier(self, stub_http_server):
+        url, requests = stub_http_server(lambda m, p, b: (200, {"result": {}}))
+        QdrantHTTP(url).upsert_points("notes", [{"id": 1, "vector": [1.0], "payload": {}}],
+                                      wait=False)
+        assert [path for _, path, _ in requests] == ["/collections/notes/points?wait=false"]
+
+    def test_scroll_requests_only_what_is_asked(self, stub_http_server):
+        url, requests = stub_http_server(lambda m, p, b: (200, {"result": {
+            "points": [{"id": 0, "payload": {"note_id": "a"}}], "next_page_offset": 0}}))
+        client = QdrantHTTP(url)
+        points, offset = client.scroll("notes", limit=2000, with_payload=["note_id"])
+        client.scroll("notes", offset=offset, with_payload=False)
+
+        assert requests[0][2] == {"limit": 2000, "with_payload": ["note_id"], "with_vector": False}
+        assert requests[1][2] == {"limit": 100, "offset": 0, "with_payload": False,
+                                  "with_vector": False}
+
+    def test_indexing_threshold_round_trip(self, stub_http_server):
+        def handler(method, path, body):
+            if method == "GET":
+                return 200, {"result": {"config": {"optimizer_config": {"indexing_threshold": 10000}}}}
+            return 200, {"result": True}
+
+        url, requests = stub_http_server(handler)
+        client = QdrantHTTP(url)
+        assert client.get_indexing_threshold("notes") == 10000
+        client.set_indexing_threshold("notes", 0)
+        assert requests[-1] == ("PATCH", "/collections/notes",
+                                {"optimizers_config": {"indexing_threshold": 0}})
+
 
 @pytest.mark.unit
 @pytest.mark.qdrant
@@ -165,10 +441,12 @@ class TestQdrantNotesManagerSearch:
     def test_search_returns_formatted_results(self):
         with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
              patch('qdrant_integration.get_embeddings', return_value=[[0.1, 0.2, 0.3]]), \
-             patch.object(QdrantHTTP, 'search', return_value=[
+             patch.object(QdrantHTTP, 'search_groups', return_value=[
                  {"score": 0.95, "payload": {
                      "note_id": "123", "notebook": "iCloud-Notes",
-                     "filename": "test-note-123", "created": "", "modified": ""
+                     "filename": "test-note-123", "created": "", "modified": "",
+                     "snippet": "test note text", "source": "md",
+                     "chunk_start": 0, "chunk_end": 14
                  }}
              ]):
             mgr = QdrantNotesManager()
@@ -176,17 +454,20 @@ class TestQdrantNotesManagerSearch:
             assert len(results) == 1
             assert results[0]["score"] == 0.95
             assert results[0]["filename"] == "test-note-123"
+            assert results[0]["snippet"] == "test note text"
+            assert (results[0]["source"], results[0]["chunk_start"],
+                    results[0]["chunk_end"]) == ("md", 0, 14)
 
     def test_search_empty_results(self):
         with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
              patch('qdrant_integration.get_embeddings', return_value=[[0.1, 0.2]]), \
-             patch.object(QdrantHTTP, 'search', return_value=[]):
+             patch.object(QdrantHTTP, 'search_groups', return_value=[]):
             mgr = QdrantNotesManager()
             results = mgr.search("nothing matches")
             assert results == []
 
     def test_search_deduplicates_chunks(self):
-        """Multiple chunks from same note should return only the best score."""
+        """Without server-side grouping, only each note's best chunk is returned."""
         raw_results = [
             {"score": 0.9, "payload": {"note_id": "123", "notebook": "nb",
                 "filename": "note-123", "created": "", "modified": "",
@@ -200,6 +481,7 @@ class TestQdrantNotesManagerSearch:
         ]
         with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
              patch('qdrant_integration.get_embeddings', return_value=[[0.1]]), \
+             patch.object(QdrantHTTP, 'search_groups', side_effect=RuntimeError("400")), \
              patch.object(QdrantHTTP, 'search', return_value=raw_results):
             mgr = QdrantNotesManager()
             results = mgr.search("test", limit=10)
@@ -208,6 +490,57 @@ class TestQdrantNotesManagerSearch:
             assert results[0]["note_id"] == "123"
             assert results[1]["note_id"] == "456"
 
+    def test_repeated_query_uses_query_cache(self, tmp_path, monkeypatch):
+        import output_format
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        monkeypatch.setenv("NOTES_EXPORT_QUERY_CACHE", "true")
+        log = tmp_path / "log.jsonl"
+        output_format.enable_json_mode(str(log))
+        try:
+            with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+                 patch('qdrant_integration.get_embeddings', return_value=[[0.1, 0.2]]) as embed, \
+                 patch.object(QdrantHTTP, 'search_groups', return_value=[]) as search:
+                QdrantNotesManager().search("Paris trip")
+                mgr = QdrantNotesManager()
+                mgr.search("paris   TRIP")
+        finally:
+            output_format.close()
+            monkeypatch.setattr(output_format, "_json_mode", False)
+
+        assert embed.call_count == 1
+        assert search.call_args.args[1] == pytest.approx([0.1, 0.2])
+        assert mgr.last_query_cached
+        records = [json.loads(line) for line in log.read_text().splitlines()]
+        assert [r["query_cache_hit"] for r in records if r["type"] == "summary"] == [False, True]
+
+    def test_search_groups_by_note(self, stub_http_server):
+        url, requests = stub_http_server(lambda m, p, b: (200, {"result": {"groups": [
+            {"id": "123", "hits": [{"id": 7, "score": 0.9, "payload": {"note_id": "123"}}]},
+            {"id": "456", "hits": []},
+        ]}}))
+        hits = QdrantHTTP(url).search_groups("notes", [0.1], limit=2, score_threshold=0.5)
+        assert hits == [{"id": 7, "score": 0.9, "payload": {"note_id": "123"}}]
+        method, path, body = requests[0]
+        assert path == "/collections/notes/points/search/groups"
+        assert body == {"vector": [0.1], "limit": 2, "group_by": "note_id", "group_size": 1,
+                        "with_payload": True, "score_threshold": 0.5}
+
+    def test_fallback_pages_until_enough_notes(self):
+        """One long note filling the first page must not crowd out the others."""
+        def page(collection, vector, limit, score_threshold, query_filter, offset):
+            hits = [{"score": 1 - i / 100, "payload": {"note_id": "long" if i < 40 else str(i)}}
+                    for i in range(offset, min(offset + limit, 60))]
+            return hits
+
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch('qdrant_integration.get_embeddings', return_value=[[0.1]]), \
+             patch.object(QdrantHTTP, 'search_groups', side_effect=RuntimeError("404")), \
+             patch.object(QdrantHTTP, 'search', side_effect=page) as search:
+            results = QdrantNotesManager().search("q", limit=3)
+
+        assert [r["note_id"] for r in results] == ["long", "40", "41"]
+        assert [c.kwargs["offset"] for c in search.call_args_list] == [0, 30]
+
 
 @pytest.mark.unit
 @pytest.mark.qdrant
@@ -323,3 +656,888 @@ class TestQdrantNotesManagerSync:
             # Batch failed, then 3 individual calls succeeded
             assert stats["upserted"] == 3
             assert stats["errors"] == 0
+
+    def test_markup_stripped_before_embedding(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        (tmp_path / "data").mkdir()
+        html_dir = tmp_path / "html" / "nb"
+        html_dir.mkdir(parents=True)
+        (html_dir / "trip.html").write_text(
+            "<html><body><p>Flights <b>booked</b></p>"
+            "<img src=\"data:image/png;base64,iVBORw0KGgoAAAANSUhEUg==\"></body></html>")
+        with open(tmp_path / "data" / "nb.json", "w") as f:
+            json.dump({"1": {"filename": "trip", "lastExported": "e1"}}, f)
+
+        embedded = []
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch('qdrant_integration.get_embeddings',
+                   side_effect=lambda texts, config: embedded.extend(texts) or
+                   [[0.1] for _ in texts]), \
+             patch.object(QdrantHTTP, 'upsert_points'), \
+             patch.object(QdrantHTTP, 'scroll', return_value=([], None)):
+            QdrantNotesManager().sync()
+
+        assert embedded == ["trip\n\nFlights booked"]
+
+    def test_chunk_offsets_and_snippet_in_payload(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        (tmp_path / "data").mkdir()
+        md_dir = tmp_path / "md" / "nb"
+        md_dir.mkdir(parents=True)
+        source = "Ideas from [the workshop](https://example.com/w)\n\n" + "More  detail. " * 5
+        (md_dir / "ideas.md").write_text(source)
+        # A note with no markdown export falls back to its text export
+        (tmp_path / "text" / "nb").mkdir(parents=True)
+        (tmp_path / "text" / "nb" / "plain.txt").write_text("Plain text only")
+        with open(tmp_path / "data" / "nb.json", "w") as f:
+            json.dump({"1": {"filename": "ideas", "lastExported": "e1"},
+                       "2": {"filename": "plain", "lastExported": "e1"}}, f)
+
+        upserted = []
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch('qdrant_integration.get_embeddings',
+                   side_effect=lambda texts, config: [[0.1] for _ in texts]), \
+             patch.object(QdrantHTTP, 'upsert_points',
+                          side_effect=lambda c, points, wait=True: upserted.extend(points)), \
+             patch.object(QdrantHTTP, 'scroll', return_value=([], None)):
+            QdrantNotesManager().sync()
+
+        payloads = {p["payload"]["note_id"]: p["payload"] for p in upserted}
+        payload = payloads["1"]
+        assert payload["snippet"].startswith("ideas Ideas from the workshop More detail.")
+        assert payload["source"] == "md"
+        assert payloads["2"]["source"] == "text"
+        assert payload["chunk_start"] == 0
+        assert source[payload["chunk_start"]:payload["chunk_end"]] == source.rstrip()
+
+    def test_failed_batch_isolates_bad_chunk(self, tmp_path, monkeypatch):
+        """A single bad chunk is skipped without losing the rest of its batch."""
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        md_dir = tmp_path / "md" / "iCloud-Notes"
+        md_dir.mkdir(parents=True)
+
+        notes = {}
+        for i in range(6):
+            notes[str(i)] = {
+                "filename": f"note-{i}", "created": "", "modified": "",
+                "lastExported": "2026-01-01 10:00:00",
+            }
+            (md_dir / f"note-{i}.md").write_text("poison" if i == 4 else f"content {i}")
+
+        json_file = data_dir / "iCloud-Notes.json"
+        with open(json_file, "w") as f:
+            json.dump(notes, f)
+
+        def mock_embed(texts, config):
+            if any("poison" in t for t in texts):
+                raise RuntimeError("bad chunk")
+            return [[0.1, 0.2, 0.3] for _ in texts]
+
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch('qdrant_integration.get_embeddings', side_effect=mock_embed), \
+             patch.object(QdrantHTTP, 'upsert_points'), \
+             patch.object(QdrantHTTP, 'scroll', return_value=([], None)):
+            mgr = QdrantNotesManager()
+            mgr._dim = 3
+            stats = mgr.sync()
+            assert stats["upserted"] == 5
+            assert stats["errors"] == 1
+
+        data = json.load(open(json_file))
+        assert "lastIndexedToQdrant" not in data["4"]
+        assert "lastIndexedToQdrant" in data["0"]
+
+    def test_unavailable_provider_aborts_sync(self, tmp_path, monkeypatch):
+        """With the embedding service down, sync stops instead of skipping every note."""
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        monkeypatch.setenv("NOTES_EXPORT_EMBED_BATCH_SIZE", "2")
+        (tmp_path / "data").mkdir()
+        md_dir = tmp_path / "md" / "nb"
+        md_dir.mkdir(parents=True)
+        notes = {}
+        for i in range(20):
+            notes[str(i)] = {"filename": f"n{i}", "lastExported": "e1"}
+            (md_dir / f"n{i}.md").write_text(f"content {i}")
+        with open(tmp_path / "data" / "nb.json", "w") as f:
+            json.dump(notes, f)
+
+        calls = []
+
+        def down(texts, config):
+            calls.append(len(texts))
+            raise EmbeddingUnavailable("Cannot reach Ollama")
+
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch('qdrant_integration.get_embeddings', side_effect=down), \
+             patch.object(QdrantHTTP, 'upsert_points') as upsert, \
+             patch.object(QdrantHTTP, 'scroll', return_value=([], None)):
+            with pytest.raises(EmbeddingUnavailable):
+                QdrantNotesManager().sync()
+        assert len(calls) == 1
+        upsert.assert_not_called()
+
+    def test_partial_embedding_error_keeps_other_vectors(self, tmp_path, monkeypatch):
+        """The embedder's partial vectors are used as-is, without re-sending the batch."""
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        (tmp_path / "data").mkdir()
+        md_dir = tmp_path / "md" / "nb"
+        md_dir.mkdir(parents=True)
+        notes = {}
+        for i in range(3):
+            notes[str(i)] = {"filename": f"note-{i}", "lastExported": "e1"}
+            (md_dir / f"note-{i}.md").write_text("poison" if i == 1 else f"content {i}")
+        with open(tmp_path / "data" / "nb.json", "w") as f:
+            json.dump(notes, f)
+
+        def mock_embed(texts, config):
+            vectors = [None if "poison" in t else [0.1, 0.2, 0.3] for t in texts]
+            raise EmbeddingError("bad chunk", vectors,
+                                 {i: RuntimeError("bad chunk")
+                                  for i, v in enumerate(vectors) if v is None})
+
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch('qdrant_integration.get_embeddings', side_effect=mock_embed) as embed, \
+             patch.object(QdrantHTTP, 'upsert_points'), \
+             patch.object(QdrantHTTP, 'scroll', return_value=([], None)):
+            mgr = QdrantNotesManager()
+            mgr._dim = 3
+            stats = mgr.sync()
+        assert embed.call_count == 1
+        assert stats["upserted"] == 2
+        assert stats["errors"] == 1
+
+    def test_force_resync_uses_embedding_cache(self, tmp_path, monkeypatch):
+        """Unchanged chunk text is never sent to the provider twice."""
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        md_dir = tmp_path / "md" / "iCloud-Notes"
+        md_dir.mkdir(parents=True)
+
+        notes = {}
+        for i in range(3):
+            notes[str(i)] = {
+                "filename": f"note-{i}", "created": "", "modified": "",
+                "lastExported": "2026-01-01 10:00:00",
+            }
+            (md_dir / f"note-{i}.md").write_text(f"content {i}")
+        with open(data_dir / "iCloud-Notes.json", "w") as f:
+            json.dump(notes, f)
+
+        embedded = []
+
+        def mock_embed(texts, config):
+            embedded.extend(texts)
+            return [[0.5, 0.25, 0.125] for _ in texts]
+
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch('qdrant_integration.get_embeddings', side_effect=mock_embed), \
+             patch.object(QdrantHTTP, 'upsert_points') as mock_upsert, \
+             patch.object(QdrantHTTP, 'scroll', return_value=([], None)):
+            mgr = QdrantNotesManager()
+            mgr.sync()
+            assert len(embedded) == 3
+
+            (md_dir / "note-1.md").write_text("edited content")
+            stats = QdrantNotesManager().sync(force=True)
+            assert embedded[3:] == ["note 1\n\nedited content"]
+            assert stats["cached"] == 2
+            assert stats["upserted"] == 3
+            points = mock_upsert.call_args[0][1]
+            assert all(p["vector"] == [0.5, 0.25, 0.125] for p in points)
+
+
+class FakeQdrant:
+    """In-memory stand-in for the QdrantHTTP methods used by sync."""
+
+    def __init__(self):
+        self.points = {}
+        self.upserted = []
+        self.deleted = []
+        self.payload_updates = []
+        self.scroll_calls = 0
+        self.scroll_kwargs = []
+
+    def upsert_points(self, collection, points, wait=True):
+        self.upserted.extend(p["id"] for p in points)
+        for p in points:
+            self.points[p["id"]] = dict(p)
+
+    def delete_points(self, collection, ids):
+        self.deleted.extend(ids)
+        for pid in ids:
+            self.points.pop(pid, None)
+
+    def set_payload(self, collection, payload, ids):
+        self.payload_updates.append(list(ids))
+        for pid in ids:
+            self.points[pid]["payload"].update(payload)
+
+    def scroll(self, collection, limit=100, offset=None, **kwargs):
+        self.scroll_calls += 1
+        self.scroll_kwargs.append(kwargs)
+        ids = sorted(self.points)
+        start = ids.index(offset) if offset is not None else 0
+        page = [{"id": pid, "payload": self.points[pid]["payload"]}
+                for pid in ids[start:start + limit]]
+        nxt = ids[start + limit] if start + limit < len(ids) else None
+        return page, nxt
+
+    def patches(self):
+        return [patch.object(QdrantHTTP, name, side_effect=getattr(self, name))
+                for name in ("upsert_points", "delete_points", "set_payload", "scroll")]
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestManifestSync:
+    PARAGRAPHS = ["Paragraph %d. " % i + ("filler text %d " % i) * 6 for i in range(4)]
+
+    def _setup(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        monkeypatch.setenv("NOTES_EXPORT_CHUNK_SIZE", "120")
+        monkeypatch.setenv("NOTES_EXPORT_CHUNK_OVERLAP", "0")
+        (tmp_path / "data").mkdir()
+        md_dir = tmp_path / "md" / "nb"
+        md_dir.mkdir(parents=True)
+        notes = {
+            "1": {"filename": "long", "modified": "m1", "lastExported": "e1"},
+            "2": {"filename": "short", "modified": "m1", "lastExported": "e1"},
+        }
+        (md_dir / "long.md").write_text("\n\n".join(self.PARAGRAPHS))
+        (md_dir / "short.md").write_text("short note")
+        self._write_tracking(tmp_path, notes)
+        return md_dir
+
+    def _write_tracking(self, tmp_path, notes):
+        with open(tmp_path / "data" / "nb.json", "w") as f:
+            json.dump(notes, f)
+
+    def _load_tracking(self, tmp_path):
+        return json.load(open(tmp_path / "data" / "nb.json"))
+
+    def _sync(self, fake, **kwargs):
+        embed = lambda texts, config: [[float(len(t)), 1.0] for t in texts]
+        patches = fake.patches() + [
+            patch.object(QdrantHTTP, 'collection_exists', return_value=True),
+            patch('qdrant_integration.get_embeddings', side_effect=embed),
+        ]
+        for p in patches:
+            p.start()
+        try:
+            return QdrantNotesManager().sync(**kwargs)
+        finally:
+            for p in patches:
+                p.stop()
+
+    def _touch(self, tmp_path, note_id, **changes):
+        notes = self._load_tracking(tmp_path)
+        notes[note_id].update(changes)
+        self._write_tracking(tmp_path, notes)
+
+    def test_edit_upserts_only_changed_chunks(self, tmp_path, monkeypatch):
+        md_dir = self._setup(tmp_path, monkeypatch)
+        fake = FakeQdrant()
+        self._sync(fake)
+        long_ids = [pid for pid, p in fake.points.items() if p["payload"]["note_id"] == "1"]
+        assert len(long_ids) > 2
+
+        edited = list(self.PARAGRAPHS)
+        edited[-1] = "Completely new closing paragraph."
+        (md_dir / "long.md").write_text("\n\n".join(edited))
+        self._touch(tmp_path, "1", lastExported="e2", modified="m2")
+        fake.upserted.clear()
+        stats = self._sync(fake)
+
+        assert len(fake.upserted) == 1
+        assert stats["upserted"] == 1
+        assert fake.deleted == []
+        assert fake.scroll_calls == 1  # Only the initial empty-collection probe
+        # Unchanged chunks got the new note metadata without re-embedding
+        assert all(fake.points[pid]["payload"]["modified"] == "m2" for pid in long_ids)
+
+    def test_shrinking_note_deletes_exact_chunks(self, tmp_path, monkeypatch):
+        md_dir = self._setup(tmp_path, monkeypatch)
+        fake = FakeQdrant()
+        self._sync(fake)
+        before = set(fake.points)
+
+        (md_dir / "long.md").write_text(self.PARAGRAPHS[0])
+        self._touch(tmp_path, "1", lastExported="e2")
+        stats = self._sync(fake)
+
+        remaining_long = [pid for pid, p in fake.points.items() if p["payload"]["note_id"] == "1"]
+        assert len(remaining_long) == 1
+        assert set(fake.deleted) == before - set(fake.points)
+        assert stats["deleted"] == len(fake.deleted)
+        assert self._load_tracking(tmp_path)["1"]["qdrantChunkCount"] == 1
+
+    def test_deleted_note_removes_all_points(self, tmp_path, monkeypatch):
+        self._setup(tmp_path, monkeypatch)
+        fake = FakeQdrant()
+        self._sync(fake)
+        long_ids = {pid for pid, p in fake.points.items() if p["payload"]["note_id"] == "1"}
+
+        self._touch(tmp_path, "1", deletedDate="today")
+        fake.upserted.clear()
+        stats = self._sync(fake)
+
+        assert set(fake.deleted) == long_ids
+        assert fake.upserted == []
+        assert stats["unchanged"] == 1
+        assert all(p["payload"]["note_id"] == "2" for p in fake.points.values())
+
+    def test_bootstrap_from_existing_collection(self, tmp_path, monkeypatch):
+        self._setup(tmp_path, monkeypatch)
+        fake = FakeQdrant()
+        self._sync(fake)
+        # Simulate a collection built before the manifest existed, plus an orphan
+        (tmp_path / "vectors" / "manifest.sqlite").unlink()
+        for suffix in ("-wal", "-shm"):
+            stale = tmp_path / "vectors" / f"manifest.sqlite{suffix}"
+            if stale.exists():
+                stale.unlink()
+        fake.points[42] = {"id": 42, "payload": {"note_id": "gone", "notebook": "nb"}}
+        fake.upserted.clear()
+
+        stats = self._sync(fake)
+        assert fake.deleted == [42]
+        assert fake.upserted == []
+        assert stats["deleted"] == 1
+        # The probe and the orphan scan ask for IDs only
+        assert fake.scroll_kwargs
+        assert all(kw.get("with_payload") is False for kw in fake.scroll_kwargs)
+
+    def test_stamped_note_without_manifest_rows_is_reindexed(self, tmp_path, monkeypatch):
+        self._setup(tmp_path, monkeypatch)
+        fake = FakeQdrant()
+        first = self._sync(fake)
+        # Collection and manifest gone, tracking stamps left behind
+        fake.points.clear()
+        QdrantNotesManager()._get_manifest().clear()
+        fake.upserted.clear()
+
+        stats = self._sync(fake)
+        assert stats["unchanged"] == 0
+        assert stats["upserted"] == first["upserted"]
+        assert sorted(fake.upserted) == sorted(fake.points)
+
+    def test_dry_run_reports_removed_notes(self, tmp_path, monkeypatch, capsys):
+        self._setup(tmp_path, monkeypatch)
+        fake = FakeQdrant()
+        self._sync(fake)
+        self._touch(tmp_path, "2", deletedDate="today")
+        fake.deleted.clear()
+        self._sync(fake, dry_run=True)
+        assert fake.deleted == []
+        assert "remove 1 deleted notes" in capsys.readouterr().out
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestSyncPipeline:
+    def test_threaded_producer_is_bounded(self):
+        produced = []
+
+        def source():
+            for i in range(100):
+                produced.append(i)
+                yield i
+
+        items = _threaded(source(), maxsize=3)
+        assert next(items) == 0
+        time.sleep(0.2)
+        assert len(produced) <= 5  # Queue of 3, one taken, one blocked in put
+        assert list(items) == list(range(1, 100))
+
+    def test_threaded_reraises_producer_errors(self):
+        def source():
+            yield 1
+            raise ValueError("boom")
+
+        items = _threaded(source(), maxsize=2)
+        assert next(items) == 1
+        with pytest.raises(ValueError, match="boom"):
+            next(items)
+
+    def test_threaded_merge_interleaves_and_keeps_each_order(self):
+        def source(name, count):
+            for i in range(count):
+                time.sleep(0.001)
+                yield name, i
+
+        sources = [source(name, 20) for name in "abcd"]
+        items = list(_threaded_merge(iter(sources), workers=3, maxsize=4))
+        assert len(items) == 80
+        for name in "abcd":
+            assert [i for n, i in items if n == name] == list(range(20))
+        # The first three sources ran side by side
+        assert {n for n, _ in items[:20]} >= {"a", "b", "c"}
+
+    def test_threaded_merge_reraises_errors(self):
+        def bad():
+            yield 1
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError, match="boom"):
+            list(_threaded_merge(iter([iter(range(5)), bad()]), workers=2, maxsize=2))
+
+    def test_parallel_notebook_workers(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        monkeypatch.setenv("NOTES_EXPORT_EMBED_BATCH_SIZE", "2")
+        monkeypatch.setenv("NOTES_EXPORT_QDRANT_SYNC_WORKERS", "3")
+        (tmp_path / "data").mkdir()
+        for nb in ("nb1", "nb2", "nb3", "nb4"):
+            (tmp_path / "md" / nb).mkdir(parents=True)
+            notes = {f"{nb}-{i}": {"filename": f"n{i}", "lastExported": "e1"} for i in range(5)}
+            notes[f"{nb}-old"] = {"filename": "old", "lastExported": "e1",
+                                  "lastIndexedToQdrant": "e1"}
+            for i in range(5):
+                (tmp_path / "md" / nb / f"n{i}.md").write_text(f"{nb} note {i}")
+            with open(tmp_path / "data" / f"{nb}.json", "w") as f:
+                json.dump(notes, f)
+
+        fake = FakeQdrant()
+        embed = lambda texts, config: [[float(len(t)), 1.0] for t in texts]
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch.object(QdrantHTTP, 'upsert_points',
+                          side_effect=lambda c, pts, wait: fake.upsert_points(c, pts)), \
+             patch.object(QdrantHTTP, 'scroll', side_effect=fake.scroll), \
+             patch('qdrant_integration.get_embeddings', side_effect=embed):
+            mgr = QdrantNotesManager()
+            assert mgr.config["sync_workers"] == 3
+            manifest = mgr._get_manifest()
+            for nb in ("nb1", "nb2", "nb3", "nb4"):
+                manifest.set_chunks(nb, f"{nb}-old",
+                                    [(0, int(_make_point_id(f"{nb}-old", nb, 0)), "")])
+            manifest.commit()
+            stats = mgr.sync()
+
+        assert stats["upserted"] == 20
+        assert stats["unchanged"] == 4
+        for nb in ("nb1", "nb2", "nb3", "nb4"):
+            tracking = json.load(open(tmp_path / "data" / f"{nb}.json"))
+            assert all(n["lastIndexedToQdrant"] == "e1" for n in tracking.values())
+
+    def test_sync_streams_in_batches(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        monkeypatch.setenv("NOTES_EXPORT_EMBED_BATCH_SIZE", "2")
+        monkeypatch.setenv("NOTES_EXPORT_EMBED_CONCURRENCY", "1")
+        self._write_notes(tmp_path, 7)
+
+        fake = FakeQdrant()
+        batches = []
+        fake_upsert = fake.upsert_points
+        embed = lambda texts, config: [[float(len(t)), 1.0] for t in texts]
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch.object(QdrantHTTP, 'upsert_points',
+                          side_effect=lambda c, pts, wait: (batches.append(len(pts)), fake_upsert(c, pts))), \
+             patch.object(QdrantHTTP, 'scroll', side_effect=fake.scroll), \
+             patch('qdrant_integration.get_embeddings', side_effect=embed):
+            stats = QdrantNotesManager().sync()
+
+        assert batches == [2, 2, 2, 1]
+        assert stats["upserted"] == 7
+        tracking = json.load(open(tmp_path / "data" / "nb.json"))
+        assert all(n["lastIndexedToQdrant"] == "e1" for n in tracking.values())
+
+    def _write_notes(self, tmp_path, count):
+        (tmp_path / "data").mkdir()
+        md_dir = tmp_path / "md" / "nb"
+        md_dir.mkdir(parents=True)
+        notes = {}
+        for i in range(count):
+            notes[str(i)] = {"filename": f"n{i}", "lastExported": "e1"}
+            (md_dir / f"n{i}.md").write_text(f"note {i}")
+        with open(tmp_path / "data" / "nb.json", "w") as f:
+            json.dump(notes, f)
+
+    def test_interrupted_sync_resumes_after_last_batch(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        monkeypatch.setenv("NOTES_EXPORT_EMBED_BATCH_SIZE", "2")
+        monkeypatch.setenv("NOTES_EXPORT_EMBED_CONCURRENCY", "1")
+        monkeypatch.setenv("NOTES_EXPORT_EMBEDDING_CACHE", "false")
+        monkeypatch.setenv("NOTES_EXPORT_QDRANT_PARALLEL", "1")
+        self._write_notes(tmp_path, 6)
+
+        fake = FakeQdrant()
+        embedded = []
+
+        def embed(texts, config):
+            embedded.extend(texts)
+            return [[float(len(t)), 1.0] for t in texts]
+
+        def flaky_upsert(collection, points, wait):
+            if len(fake.upserted) >= 2:
+                raise RuntimeError("Qdrant went away")
+            fake.upsert_points(collection, points)
+
+        common = [patch.object(QdrantHTTP, 'collection_exists', return_value=True),
+                  patch.object(QdrantHTTP, 'scroll', side_effect=fake.scroll),
+                  patch('qdrant_integration.get_embeddings', side_effect=embed)]
+        for p in common:
+            p.start()
+        try:
+            with patch.object(QdrantHTTP, 'upsert_points', side_effect=flaky_upsert):
+                with pytest.raises(RuntimeError, match="went away"):
+                    QdrantNotesManager().sync()
+            tracking = json.load(open(tmp_path / "data" / "nb.json"))
+            assert sum(1 for n in tracking.values() if n.get("lastIndexedToQdrant")) == 2
+
+            embedded.clear()
+            with patch.object(QdrantHTTP, 'upsert_points', side_effect=fake.upsert_points):
+                stats = QdrantNotesManager().sync()
+        finally:
+            for p in common:
+                p.stop()
+
+        assert stats["upserted"] == 4
+        assert stats["unchanged"] == 2
+        assert len(embedded) == 4
+        tracking = json.load(open(tmp_path / "data" / "nb.json"))
+        assert all(n["lastIndexedToQdrant"] == "e1" for n in tracking.values())
+
+    def test_progress_record_per_batch(self, tmp_path, monkeypatch):
+        import output_format
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        monkeypatch.setenv("NOTES_EXPORT_EMBED_BATCH_SIZE", "1")
+        monkeypatch.setenv("NOTES_EXPORT_EMBED_CONCURRENCY", "1")
+        self._write_notes(tmp_path, 2)
+
+        log = tmp_path / "log.jsonl"
+        output_format.enable_json_mode(str(log))
+        fake = FakeQdrant()
+        try:
+            with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+                 patch.object(QdrantHTTP, 'upsert_points', side_effect=fake.upsert_points), \
+                 patch.object(QdrantHTTP, 'scroll', side_effect=fake.scroll), \
+                 patch('qdrant_integration.get_embeddings',
+                       side_effect=lambda texts, config: [[1.0, 0.0] for _ in texts]):
+                QdrantNotesManager().sync()
+        finally:
+            output_format.close()
+            monkeypatch.setattr(output_format, "_json_mode", False)
+
+        records = [json.loads(line) for line in log.read_text().splitlines()]
+        progress = [r for r in records if r["type"] == "progress"]
+        assert [(p["batch"], p["upserted"], p["indexed"]) for p in progress] == [(1, 1, 1), (2, 2, 2)]
+        assert records[-1]["type"] == "summary"
+
+    @pytest.mark.parametrize("configured, restored", [
+        (None, qdrant_integration.DEFAULT_INDEXING_THRESHOLD), (0, 0), (5000, 5000)])
+    def test_bulk_load_defers_indexing_and_restores_it(self, tmp_path, monkeypatch,
+                                                       configured, restored):
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        monkeypatch.setenv("NOTES_EXPORT_EMBED_BATCH_SIZE", "2")
+        monkeypatch.setenv("NOTES_EXPORT_EMBED_CONCURRENCY", "1")
+        monkeypatch.setenv("NOTES_EXPORT_QDRANT_BULK_POINTS", "3")
+        self._write_notes(tmp_path, 6)
+
+        fake = FakeQdrant()
+        calls = []
+        waits = []
+        embed = lambda texts, config: [[1.0, 0.0] for _ in texts]
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch.object(QdrantHTTP, 'upsert_points',
+                          side_effect=lambda c, pts, wait: (waits.append(wait),
+                                                            fake.upsert_points(c, pts))), \
+             patch.object(QdrantHTTP, 'scroll', side_effect=fake.scroll), \
+             patch.object(QdrantHTTP, 'get_indexing_threshold', return_value=configured), \
+             patch.object(QdrantHTTP, 'set_indexing_threshold',
+                          side_effect=lambda c, t: calls.append(t)), \
+             patch('qdrant_integration.get_embeddings', side_effect=embed):
+            stats = QdrantNotesManager().sync()
+
+        assert stats["upserted"] == 6
+        assert calls == [0, restored]
+        assert waits == [False, False, True]
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestFilteredSearch:
+    def test_build_filter(self):
+        assert build_search_filter() is None
+        after = datetime(2026, 1, 1)
+        flt = build_search_filter(notebooks=["Work"], modified_after=after)
+        assert flt == {"must": [
+            {"key": "notebook", "match": {"any": ["Work"]}},
+            {"key": "modified_ts", "range": {"gte": int(after.timestamp())}},
+        ]}
+        # An empty notebook list matches nothing rather than everything
+        assert build_search_filter(notebooks=[])["must"][0]["match"] == {"any": []}
+
+    def test_search_pushes_filter_to_qdrant(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch('qdrant_integration.get_embeddings', return_value=[[0.1, 0.2]]), \
+             patch.object(QdrantHTTP, 'search_groups', return_value=[]) as search:
+            QdrantNotesManager().search("q", notebooks=["Work"],
+                                        modified_before=datetime(2026, 2, 1))
+        flt = search.call_args.kwargs["query_filter"]
+        assert flt["must"][0] == {"key": "notebook", "match": {"any": ["Work"]}}
+        assert set(flt["must"][1]["range"]) == {"lte"}
+
+    def test_payload_has_modified_ts(self):
+        payload = QdrantNotesManager._note_payload("1", "nb", {
+            "filename": "f", "modified": "Monday, 1 January 2026 at 10:00:00"})
+        assert payload["modified_ts"] == int(datetime(2026, 1, 1, 10).timestamp())
+        assert "modified_ts" not in QdrantNotesManager._note_payload("1", "nb", {"modified": ""})
+
+    def test_missing_indexes_created_and_dates_backfilled(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        (tmp_path / "data").mkdir()
+        md_dir = tmp_path / "md" / "nb"
+        md_dir.mkdir(parents=True)
+        (md_dir / "a.md").write_text("alpha")
+        with open(tmp_path / "data" / "nb.json", "w") as f:
+            json.dump({"1": {"filename": "a", "lastExported": "e1",
+                             "modified": "Monday, 1 January 2026 at 10:00:00"}}, f)
+
+        fake = FakeQdrant()
+        created = []
+        indexes = [set(PAYLOAD_INDEXES)]
+        patches = fake.patches() + [
+            patch.object(QdrantHTTP, 'collection_exists', return_value=True),
+            patch.object(QdrantHTTP, 'payload_indexes', side_effect=lambda c: indexes[0]),
+            patch.object(QdrantHTTP, 'create_payload_index',
+                         side_effect=lambda c, field, schema: created.append((field, schema))),
+            patch('qdrant_integration.get_embeddings',
+                  side_effect=lambda texts, config: [[1.0, 0.0] for _ in texts]),
+        ]
+        for p in patches:
+            p.start()
+        try:
+            listed = QdrantHTTP.payload_indexes
+            QdrantNotesManager().sync()
+            # Simulate a collection created before modified_ts and note_key existed
+            for point in fake.points.values():
+                point["payload"].pop("modified_ts")
+                point["payload"].pop("note_key")
+            indexes[0] = {"notebook", "note_id"}
+            QdrantNotesManager().sync()
+        finally:
+            for p in patches:
+                p.stop()
+
+        assert created == [("note_key", "keyword"), ("modified_ts", "integer")]
+        # One index listing per sync, not one per field
+        assert listed.call_count == 2
+        assert all("modified_ts" in p["payload"] for p in fake.points.values())
+        assert all(p["payload"]["note_key"] == "nb:1" for p in fake.points.values())
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestCollectionOptions:
+    def test_defaults_create_plain_collection(self, stub_http_server):
+        options = collection_options(_get_config())
+        assert options == {"on_disk": False, "hnsw_config": None, "quantization_config": None}
+        url, requests = stub_http_server(lambda m, p, b: (200, {"result": True}))
+        QdrantHTTP(url).create_collection("notes", 1024, **options)
+        assert requests[0][2] == {"vectors": {"size": 1024, "distance": "Cosine"}}
+
+    def test_env_options_reach_create_and_search(self, stub_http_server, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_QDRANT_QUANTIZATION", "scalar")
+        monkeypatch.setenv("NOTES_EXPORT_QDRANT_ON_DISK", "true")
+        monkeypatch.setenv("NOTES_EXPORT_QDRANT_HNSW_M", "8")
+        config = _get_config()
+        url, requests = stub_http_server(lambda m, p, b: (200, {"result": []}))
+        config["qdrant_url"] = url
+        client = get_vector_client(config)
+        client.create_collection("notes", 1024, **collection_options(config))
+        client.search("notes", [0.1])
+
+        assert requests[0][2] == {
+            "vectors": {"size": 1024, "distance": "Cosine", "on_disk": True},
+            "hnsw_config": {"m": 8},
+            "quantization_config": {"scalar": {"type": "int8", "quantile": 0.99,
+                                               "always_ram": True}},
+        }
+        assert requests[1][2]["params"] == {"quantization": {"rescore": True,
+                                                             "oversampling": 2.0}}
+
+    def test_binary_and_invalid_modes(self):
+        assert collection_options({"quantization": "binary"})["quantization_config"] == {
+            "binary": {"always_ram": True}}
+        with pytest.raises(ValueError, match="quantization"):
+            collection_options({"quantization": "pq"})
+
+    def test_reconfigure_patches_existing_collection(self, stub_http_server, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_QDRANT_ON_DISK", "true")
+        url, requests = stub_http_server(lambda m, p, b: (200, {"result": True}))
+        monkeypatch.setenv("NOTES_EXPORT_QDRANT_URL", url)
+        QdrantNotesManager().reconfigure()
+
+        assert requests[-1] == ("PATCH", "/collections/apple_notes", {
+            "vectors": {"": {"on_disk": True}},
+            "quantization_config": "Disabled",
+        })
+        assert not [r for r in requests if r[0] in ("DELETE", "PUT")]
+
+    def test_reconfigure_missing_collection(self):
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=False), \
+             patch.object(QdrantHTTP, 'update_collection') as update:
+            with pytest.raises(RuntimeError, match="does not exist"):
+                QdrantNotesManager().reconfigure()
+        update.assert_not_called()
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestEmbeddingModelState:
+    def _manager(self, tmp_path, monkeypatch, model="mxbai-embed-large"):
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        monkeypatch.setenv("NOTES_EXPORT_EMBEDDING_PROVIDER", "ollama")
+        monkeypatch.setenv("NOTES_EXPORT_OLLAMA_MODEL", model)
+        return QdrantNotesManager()
+
+    def test_create_records_model_and_later_skips_probe(self, tmp_path, monkeypatch):
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=False), \
+             patch.object(QdrantHTTP, 'create_collection') as create, \
+             patch('qdrant_integration.get_embedding_dimension', return_value=1024) as probe:
+            self._manager(tmp_path, monkeypatch)._ensure_collection()
+            self._manager(tmp_path, monkeypatch)._ensure_collection()
+
+        assert probe.call_count == 1  # The second cold start reads the state file
+        assert create.call_args.args == ("apple_notes", 1024)
+        assert create.call_args.kwargs["metadata"] == {
+            "embedding_provider": "ollama", "embedding_model": "mxbai-embed-large"}
+        state = json.loads((tmp_path / "vectors" / "embedding_model.json").read_text())
+        assert state["apple_notes"]["dimension"] == 1024
+
+    def test_existing_collection_seeds_state_without_embedding(self, tmp_path, monkeypatch):
+        metadata = {"embedding_provider": "ollama", "embedding_model": "mxbai-embed-large",
+                    "dimension": 1024}
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch.object(QdrantHTTP, 'collection_metadata', return_value=metadata), \
+             patch('qdrant_integration.get_embeddings') as embed:
+            mgr = self._manager(tmp_path, monkeypatch)
+            mgr._ensure_collection()
+            assert mgr._get_dim() == 1024
+        embed.assert_not_called()
+
+    def test_model_mismatch_asks_for_rebuild(self, tmp_path, monkeypatch):
+        metadata = {"embedding_provider": "ollama", "embedding_model": "mxbai-embed-large",
+                    "dimension": 1024}
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch.object(QdrantHTTP, 'collection_metadata', return_value=metadata):
+            mgr = self._manager(tmp_path, monkeypatch, model="nomic-embed-text")
+            with pytest.raises(EmbeddingModelMismatch, match="reset"):
+                mgr._ensure_collection()
+
+    def test_state_file_catches_mismatch_without_collection_metadata(self, tmp_path,
+                                                                      monkeypatch):
+        # Created on a server that drops the metadata: only the state file records the model
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=False), \
+             patch.object(QdrantHTTP, 'create_collection'), \
+             patch('qdrant_integration.get_embedding_dimension', return_value=1024):
+            self._manager(tmp_path, monkeypatch)._ensure_collection()
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch.object(QdrantHTTP, 'collection_metadata', return_value={"dimension": 1024}):
+            self._manager(tmp_path, monkeypatch)._ensure_collection()
+            with pytest.raises(EmbeddingModelMismatch, match="mxbai-embed-large"):
+                self._manager(tmp_path, monkeypatch, model="nomic-embed-text")._ensure_collection()
+
+    def test_unrecorded_model_is_probed_but_not_recorded(self, tmp_path, monkeypatch, capsys):
+        state_path = tmp_path / "vectors" / "embedding_model.json"
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch.object(QdrantHTTP, 'collection_metadata', return_value={"dimension": 1024}), \
+             patch('qdrant_integration.get_embedding_dimension', return_value=1024) as probe:
+            mgr = self._manager(tmp_path, monkeypatch)
+            mgr._ensure_collection()
+            assert mgr._get_dim() == 1024
+        assert probe.call_count == 1
+        assert "sync --force" in capsys.readouterr().out
+        assert not state_path.exists()
+
+    def test_unrecorded_model_with_other_dimension(self, tmp_path, monkeypatch):
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch.object(QdrantHTTP, 'collection_metadata', return_value={"dimension": 768}), \
+             patch('qdrant_integration.get_embedding_dimension', return_value=1024):
+            with pytest.raises(EmbeddingModelMismatch, match="768-dimensional.*produces 1024"):
+                self._manager(tmp_path, monkeypatch)._ensure_collection()
+        assert not (tmp_path / "vectors" / "embedding_model.json").exists()
+
+    def test_forced_sync_records_unrecorded_model(self, tmp_path, monkeypatch):
+        (tmp_path / "data").mkdir()
+        (tmp_path / "md" / "nb").mkdir(parents=True)
+        (tmp_path / "md" / "nb" / "a.md").write_text("apples")
+        (tmp_path / "data" / "nb.json").write_text(json.dumps(
+            {"1": {"filename": "a", "lastExported": "e1"}}))
+        fake = FakeQdrant()
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch.object(QdrantHTTP, 'collection_metadata', return_value={"dimension": 2}), \
+             patch('qdrant_integration.get_embedding_dimension', return_value=2), \
+             patch('qdrant_integration.get_embeddings',
+                   side_effect=lambda texts, config: [[1.0, 0.0] for _ in texts]), \
+             patch.object(QdrantHTTP, 'upsert_points', side_effect=fake.upsert_points), \
+             patch.object(QdrantHTTP, 'scroll', side_effect=fake.scroll):
+            self._manager(tmp_path, monkeypatch).sync()
+            assert not (tmp_path / "vectors" / "embedding_model.json").exists()
+            self._manager(tmp_path, monkeypatch).sync(force=True)
+        state = json.loads((tmp_path / "vectors" / "embedding_model.json").read_text())
+        assert state["apple_notes"] == {"embedding_provider": "ollama",
+                                        "embedding_model": "mxbai-embed-large", "dimension": 2}
+
+    def test_reset_then_sync_reindexes_every_note(self, tmp_path, monkeypatch):
+        (tmp_path / "data").mkdir()
+        (tmp_path / "md" / "nb").mkdir(parents=True)
+        notes = {}
+        for i in range(5):
+            notes[str(i)] = {"filename": f"n{i}", "lastExported": "e1"}
+            (tmp_path / "md" / "nb" / f"n{i}.md").write_text(f"note {i}")
+        (tmp_path / "data" / "nb.json").write_text(json.dumps(notes))
+
+        fake = FakeQdrant()
+        exists = [True]
+        with patch.object(QdrantHTTP, 'collection_exists', side_effect=lambda name: exists[0]), \
+             patch.object(QdrantHTTP, 'delete_collection',
+                          side_effect=lambda name: (fake.points.clear(), exists.__setitem__(0, False))), \
+             patch.object(QdrantHTTP, 'create_collection',
+                          side_effect=lambda *a, **kw: exists.__setitem__(0, True)), \
+             patch('qdrant_integration.get_embedding_dimension', return_value=2), \
+             patch('qdrant_integration.get_embeddings',
+                   side_effect=lambda texts, config: [[1.0, 0.0] for _ in texts]), \
+             patch.object(QdrantHTTP, 'upsert_points', side_effect=fake.upsert_points), \
+             patch.object(QdrantHTTP, 'scroll', side_effect=fake.scroll):
+            assert self._manager(tmp_path, monkeypatch).sync()["upserted"] == 5
+            self._manager(tmp_path, monkeypatch).reset()
+            tracking = json.loads((tmp_path / "data" / "nb.json").read_text())
+            assert not any("lastIndexedToQdrant" in n for n in tracking.values())
+            stats = self._manager(tmp_path, monkeypatch).sync()
+
+        assert stats["upserted"] == 5
+        assert stats["unchanged"] == 0
+        assert len(fake.points) == 5
+
+    def test_dimension_mismatch(self, tmp_path, monkeypatch):
+        (tmp_path / "vectors").mkdir()
+        (tmp_path / "vectors" / "embedding_model.json").write_text(json.dumps({"apple_notes": {
+            "embedding_provider": "ollama", "embedding_model": "mxbai-embed-large",
+            "dimension": 1024}}))
+        with patch.object(QdrantHTTP, 'collection_exists', return_value=True), \
+             patch.object(QdrantHTTP, 'collection_metadata', return_value={"dimension": 768}):
+            with pytest.raises(EmbeddingModelMismatch, match="768-dimensional"):
+                self._manager(tmp_path, monkeypatch)._ensure_collection()
+
+    def test_collection_metadata_from_config(self, stub_http_server):
+        url, _ = stub_http_server(lambda m, p, b: (200, {"result": {"config": {
+            "params": {"vectors": {"size": 384, "distance": "Cosine"}},
+            "metadata": {"embedding_model": "all-MiniLM-L6-v2"}}}}))
+        assert _collection_metadata(QdrantHTTP(url), "notes") == {
+            "embedding_model": "all-MiniLM-L6-v2", "dimension": 384}
+
+    def test_create_retries_without_metadata_on_old_servers(self, stub_http_server):
+        def handler(method, path, body):
+            if "metadata" in body:
+                return 400, {"status": {"error": "unknown field `metadata`"}}
+            return 200, {"result": True}
+
+        url, requests = stub_http_server(handler)
+        QdrantHTTP(url).create_collection("notes", 3, metadata={"embedding_model": "m"})
+        assert [("metadata" in body) for _, _, body in requests] == [True, False]
@@ -11,7 +11,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from query_notes import (
     search_file, note_has_images,
     parse_timespan, parse_date_arg, parse_apple_date,
-    passes_date_filter, get_note_dates,
+    passes_date_filter, get_note_dates, load_note_dates,
 )
 
 
@@ -89,6 +89,52 @@ class TestSearchFile:
         matches = search_file(f, pattern)
         assert len(matches) == 1
 
+    def test_context_clipped_at_file_edges(self, tmp_path):
+        f = tmp_path / "note.md"
+        f.write_text("target\nb\nc\ntarget", encoding="utf-8")
+        pattern = re.compile("target")
+        matches = search_file(f, pattern, context_lines=2)
+        assert matches[0]['context'] == (
+            "  >    1 | target\n"
+            "       2 | b\n"
+            "       3 | c")
+        assert matches[1]['context'] == (
+            "       2 | b\n"
+            "       3 | c\n"
+            "  >    4 | target")
+
+    def test_overlapping_context_windows(self, tmp_path):
+        f = tmp_path / "note.md"
+        f.write_text("a\nhit\nhit\nb", encoding="utf-8")
+        pattern = re.compile("hit")
+        matches = search_file(f, pattern, context_lines=1)
+        assert matches[0]['context'].splitlines()[-1] == "       3 | hit"
+        assert matches[1]['context'].splitlines()[0] == "       2 | hit"
+
+    def test_max_matches_keeps_trailing_context(self, tmp_path):
+        f = tmp_path / "note.md"
+        f.write_text("match\nafter\nmatch", encoding="utf-8")
+        pattern = re.compile("match")
+        matches = search_file(f, pattern, context_lines=1, max_matches=1)
+        assert len(matches) == 1
+        assert "after" in matches[0]['context']
+
+    def test_mixed_line_endings(self, tmp_path):
+        f = tmp_path / "note.md"
+        f.write_bytes(b"one\r\ntwo\rthree\nfour")
+        pattern = re.compile("three|four")
+        matches = search_file(f, pattern)
+        assert [m['line_num'] for m in matches] == [3, 4]
+
+    def test_late_decode_error_restarts_scan(self, tmp_path):
+        f = tmp_path / "note.md"
+        # Valid UTF-8 for many lines, then a Latin-1 byte near the end
+        f.write_bytes(b"match\n" + b"filler\n" * 10000 + "caf\xe9".encode('latin-1'))
+        pattern = re.compile("match")
+        matches = search_file(f, pattern)
+        assert len(matches) == 1
+        assert matches[0]['line_num'] == 1
+
 
 @pytest.mark.unit
 @pytest.mark.search
@@ -274,12 +320,29 @@ class TestGetNoteDates:
 
         from notes_export_utils import get_tracker
         tracker = get_tracker()
-        # Clear cache from prior tests
-        get_note_dates.__defaults__[0].clear()
         dates = get_note_dates(note_file, tracker)
         assert dates["created"] == datetime(2021, 8, 26, 19, 38, 15)
         assert dates["modified"] == datetime(2026, 3, 17, 14, 30, 0)
 
+    def test_index_built_once_and_falls_back_to_any_notebook(self, tmp_path, monkeypatch):
+        from unittest.mock import patch
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        monkeypatch.setenv("NOTES_EXPORT_USE_SUBDIRS", "true")
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        (data_dir / "Work.json").write_text(
+            '{"1": {"filename": "plan", "modified": "Monday, 17 March 2026 at 14:30:00"}}')
+
+        from notes_export_utils import get_tracker
+        tracker = get_tracker()
+        index = load_note_dates(tracker)
+        with patch.object(tracker, "load_notebook_data") as load:
+            exact = get_note_dates(tmp_path / "md" / "Work" / "plan.md", tracker, index)
+            moved = get_note_dates(tmp_path / "md" / "Other" / "plan.md", tracker, index)
+        load.assert_not_called()
+        assert exact["modified"] == datetime(2026, 3, 17, 14, 30, 0)
+        assert moved == exact
+
     def test_returns_none_for_unknown_file(self, tmp_path, monkeypatch):
         monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
         data_dir = tmp_path / "data"
@@ -287,7 +350,32 @@ class TestGetNoteDates:
 
         from notes_export_utils import get_tracker
         tracker = get_tracker()
-        get_note_dates.__defaults__[0].clear()
         dates = get_note_dates(tmp_path / "unknown.md", tracker)
         assert dates["created"] is None
         assert dates["modified"] is None
+
+
+@pytest.mark.unit
+@pytest.mark.search
+class TestAiSearchFilters:
+    def test_folder_and_date_filters_passed_to_search(self, tmp_path, monkeypatch):
+        from unittest.mock import patch
+        import query_notes
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        for notebook in ("Work", "Work-Archive", "Home"):
+            (data_dir / f"{notebook}.json").write_text("{}")
+        monkeypatch.setattr(sys, "argv", [
+            "query_notes.py", "--ai-search", "-F", "Work",
+            "--modified-after", "2026-01-01", "plans"])
+
+        with patch("qdrant_integration.QdrantNotesManager") as manager:
+            manager.return_value.search.return_value = []
+            with pytest.raises(SystemExit):
+                query_notes.main()
+
+        kwargs = manager.return_value.search.call_args.kwargs
+        assert sorted(kwargs["notebooks"]) == ["Work", "Work-Archive"]
+        assert kwargs["modified_after"] == datetime(2026, 1, 1)
+        assert kwargs["modified_before"] is None
@@ -2,16 +2,19 @@ import json
 import os
 import sys
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from reconcile import (
+    count_qdrant,
     count_tracking_json,
     count_disk_files,
     get_tracked_notes,
     get_disk_filenames,
+    get_qdrant_note_ids,
     find_specific_discrepancies,
 )
 
@@ -96,6 +99,42 @@ class TestCountDiskFiles:
         assert counts["_totals"]["raw"] == 2
         assert counts["_totals"]["md"] == 2
 
+    def test_flat_layout_ignores_other_files(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        monkeypatch.setenv("NOTES_EXPORT_USE_SUBDIRS", "false")
+        (tmp_path / "md" / "folder.md").mkdir(parents=True)
+        for name in ["a.md", "b.c.md", "notes.txt"]:
+            (tmp_path / "md" / name).write_text("x")
+        from notes_export_utils import get_tracker
+        tracker = get_tracker()
+        assert get_disk_filenames(tracker) == {"(flat)": {"md": {"a", "b.c"}}}
+        assert count_disk_files(tracker)["_totals"] == {"md": 2}
+
+    def test_report_reads_each_directory_and_tracking_file_once(self, tmp_path, monkeypatch,
+                                                                capsys):
+        import reconcile
+        from notes_export_utils import NotesExportTracker
+
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        _setup_export_dir(tmp_path, notes={"1": "note-a", "2": "note-b"},
+                          formats=["raw", "html", "md"])
+        (tmp_path / "raw" / "iCloud-Notes" / "orphan.html").write_text("x")
+        scanned, loaded = [], []
+        real_scandir, real_load = os.scandir, NotesExportTracker.load_notebook_data
+        monkeypatch.setattr(reconcile.os, "scandir",
+                            lambda path: scanned.append(str(path)) or real_scandir(path))
+        monkeypatch.setattr(NotesExportTracker, "load_notebook_data",
+                            lambda self, path: loaded.append(str(path)) or real_load(self, path))
+
+        reconcile.run_reconciliation(show_details=True, skip_apple=True, skip_qdrant=True)
+        out = capsys.readouterr().out
+        assert "raw/: 3 files" in out and "md/: 2 files" in out
+        assert "Orphan raw/ files" in out
+        # Every directory (format dirs, notebook dirs, data/) is listed once
+        assert len(scanned) == len(set(scanned))
+        assert str(tmp_path / "md" / "iCloud-Notes") in scanned
+        assert len(loaded) == 1
+
 
 @pytest.mark.unit
 @pytest.mark.reconcile
@@ -199,3 +238,114 @@ class TestFindSpecificDiscrepancies:
         tracked = get_tracked_notes(tracker)
         details = find_specific_discrepancies(tracker, disk, tracked, qdrant_ids)
         assert len(details) == 0
+
+
+@pytest.mark.unit
+@pytest.mark.reconcile
+class TestQdrantScans:
+    PAGES = {
+        None: ([{"id": 1, "payload": {"notebook": "nb", "note_id": "a"}},
+                {"id": 2, "payload": {"notebook": "nb", "note_id": "a"}}], 3),
+        3: ([{"id": 3, "payload": {"notebook": "other", "note_id": "b"}}], None),
+    }
+
+    def _scroll(self, calls):
+        def scroll(collection, limit=100, offset=None, **kwargs):
+            calls.append(kwargs)
+            return self.PAGES[offset]
+        return scroll
+
+    def test_count_qdrant_fetches_only_note_fields(self):
+        from qdrant_integration import QdrantHTTP, SCROLL_PAGE_SIZE
+        calls = []
+        with patch.object(QdrantHTTP, "collection_exists", return_value=True), \
+             patch.object(QdrantHTTP, "count", return_value=3), \
+             patch.object(QdrantHTTP, "scroll", side_effect=self._scroll(calls)) as scroll:
+            result = count_qdrant()
+        assert result["unique_notes"] == 2
+        assert result["by_notebook"] == {"nb": 1, "other": 1}
+        assert all(c == {"with_payload": ["notebook", "note_id"]} for c in calls)
+        assert scroll.call_args.kwargs["limit"] == SCROLL_PAGE_SIZE
+
+    def test_get_qdrant_note_ids_fetches_only_note_fields(self):
+        from qdrant_integration import QdrantHTTP
+        calls = []
+        with patch.object(QdrantHTTP, "collection_exists", return_value=True), \
+             patch.object(QdrantHTTP, "scroll", side_effect=self._scroll(calls)):
+            result = get_qdrant_note_ids()
+        assert result == {"nb": {"a"}, "other": {"b"}}
+        assert all(c == {"with_payload": ["notebook", "note_id"]} for c in calls)
+
+
+BASE_NOTE = ("Quarterly planning notes: review the budget, hire two engineers, "
+             "migrate the billing service to the new cluster, and schedule the "
+             "offsite for the second week of March with the whole product team.")
+
+
+@pytest.mark.unit
+@pytest.mark.reconcile
+class TestMinHash:
+    def test_numpy_and_pure_python_signatures_match(self, monkeypatch):
+        pytest.importorskip("numpy")
+        import near_duplicates
+        hashes = near_duplicates.shingles(BASE_NOTE)
+        with_numpy = near_duplicates.minhash(hashes)
+        monkeypatch.setattr(near_duplicates, "np", None)
+        assert near_duplicates.minhash(hashes) == with_numpy
+        assert len(with_numpy) == near_duplicates.NUM_PERM
+
+    def test_blocked_numpy_signature_matches_pure_python(self, monkeypatch):
+        pytest.importorskip("numpy")
+        import near_duplicates
+        hashes = near_duplicates.shingles(BASE_NOTE)
+        monkeypatch.setattr(near_duplicates, "_MINHASH_BLOCK", 4)
+        blocked = near_duplicates.minhash(hashes)
+        monkeypatch.setattr(near_duplicates, "np", None)
+        assert near_duplicates.minhash(hashes) == blocked
+
+    def test_similar_texts_paired_and_grouped(self):
+        from near_duplicates import find_near_duplicates, group_pairs, minhash, shingles
+        texts = {
+            "a": BASE_NOTE,
+            "b": BASE_NOTE.replace("two engineers", "2 engineers"),
+            "c": BASE_NOTE.upper() + " ",
+            "d": "Shopping list: eggs, flour, butter, milk and a bag of lemons.",
+        }
+        signatures = {("nb", k): minhash(shingles(t)) for k, t in texts.items()}
+        pairs = find_near_duplicates(signatures, threshold=0.8)
+        assert pairs[0][:2] == (("nb", "a"), ("nb", "c")) and pairs[0][2] == 1.0
+        assert all(("nb", "d") not in pair[:2] for pair in pairs)
+        assert group_pairs(pairs) == [[("nb", "a"), ("nb", "b"), ("nb", "c")]]
+
+
+@pytest.mark.unit
+@pytest.mark.reconcile
+class TestNearDuplicatesReport:
+    def test_reports_groups_and_reuses_cached_signatures(self, tmp_path, monkeypatch, capsys):
+        import near_duplicates
+        import reconcile
+
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        notebook = _setup_export_dir(tmp_path, notes={"1": "plan", "2": "plan-copy",
+                                                      "3": "shopping"}, formats=["md"])
+        md = tmp_path / "md" / notebook
+        (md / "plan.md").write_text(f"# Plan\n\n{BASE_NOTE}")
+        (md / "plan-copy.md").write_text(f"**Plan**\n\n{BASE_NOTE}")
+        (md / "shopping.md").write_text("eggs, flour, butter")
+
+        monkeypatch.setattr(sys, "argv", ["reconcile.py", "--near-duplicates"])
+        reconcile.main()
+        out = capsys.readouterr().out
+        assert "(3 hashed, 0 from cache)" in out
+        assert "Group 1 (2 notes):" in out
+        assert f"{notebook}/plan-copy" in out and "shopping" not in out.split("Group 1")[1]
+
+        # A rerun hashes only the note that changed
+        (md / "shopping.md").write_text("eggs, flour, butter and milk")
+        hashed = []
+        real_minhash = near_duplicates.minhash
+        monkeypatch.setattr(near_duplicates, "minhash",
+                            lambda hashes: hashed.append(hashes) or real_minhash(hashes))
+        reconcile.main()
+        assert "(1 hashed, 2 from cache)" in capsys.readouterr().out
+        assert len(hashed) == 1
@@ -0,0 +1,119 @@
+import json
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+np = pytest.importorskip("numpy")
+
+from related_notes import (
+    NoteVectors, RelatedNotes, block_rows_for, build_graph, collect_note_vectors,
+    nearest_neighbours, save_graph,
+)
+
+
+def _graph(tmp_path, notes):
+    """Save the graph of {(notebook, note_id, filename): [chunk vectors]}."""
+    vectors = NoteVectors()
+    for (notebook, note_id, filename), chunks in notes.items():
+        for chunk in chunks:
+            vectors.add(notebook, note_id, chunk, filename)
+    path = tmp_path / "related.json"
+    save_graph(path, build_graph(vectors, k=2), collection="notes")
+    return RelatedNotes(path)
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestNearestNeighbours:
+    def test_blocked_matches_brute_force(self):
+        rng = np.random.default_rng(3)
+        m = rng.normal(size=(50, 8)).astype(np.float32)
+        m /= np.linalg.norm(m, axis=1, keepdims=True)
+        indexes, scores = nearest_neighbours(m, k=5, block_rows=7)
+
+        sims = m @ m.T
+        np.fill_diagonal(sims, -np.inf)
+        expected = np.argsort(-sims, axis=1)[:, :5]
+        assert (indexes == expected).all()
+        assert scores == pytest.approx(np.take_along_axis(sims, expected, axis=1), abs=1e-5)
+
+    def test_block_rows_fit_byte_budget(self):
+        assert block_rows_for(100000) * 100000 * 12 <= 64 * 1024 * 1024
+        assert block_rows_for(100000, budget=1) == 1
+        assert block_rows_for(10) > 10000
+
+    def test_k_capped_by_note_count(self):
+        m = np.eye(3, dtype=np.float32)
+        indexes, _ = nearest_neighbours(m, k=10)
+        assert indexes.shape == (3, 2)
+        assert nearest_neighbours(m[:1], k=10)[0].shape == (1, 0)
+
+    def test_chunks_averaged_per_note(self):
+        vectors = collect_note_vectors([[
+            {"id": 1, "vector": [2, 0], "payload": {"notebook": "nb", "note_id": "a"}},
+            {"id": 2, "vector": [0, 5], "payload": {"notebook": "nb", "note_id": "a"}},
+            {"id": 3, "vector": [1, 0], "payload": {"notebook": "nb", "note_id": "b"}},
+            {"id": 4, "vector": [1, 0], "payload": {}},
+        ]])
+        keys, m = vectors.matrix()
+        assert keys == [("nb", "a"), ("nb", "b")]
+        assert m[0] == pytest.approx([0.7071, 0.7071], abs=1e-4)
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestRelatedNotes:
+    def test_lookup_by_id_filename_and_notebook(self, tmp_path):
+        graph = _graph(tmp_path, {
+            ("Work", "1", "apples"): [[1, 0, 0]],
+            ("Work", "2", "pears"): [[0.9, 0.1, 0]],
+            ("Home", "3", "apples"): [[0, 1, 0]],
+            ("Home", "4", "plums"): [[0.1, 0.9, 0.1]],
+        })
+        assert graph.find("pears") == graph.find("2")
+        assert graph.notes[graph.find("2")[0]] == ["Work", "2", "pears"]
+        assert len(graph.find("apples")) == 2
+        [home_apples] = graph.find("md/Home/apples.md")
+        assert [r["filename"] for r in graph.related(home_apples)] == ["plums", "pears"]
+        assert graph.related(graph.find("1")[0], limit=1)[0]["note_id"] == "2"
+        assert graph.meta["collection"] == "notes"
+
+    def test_build_from_collection_and_query(self, tmp_path, monkeypatch, capsys):
+        import query_notes
+        from qdrant_integration import QdrantNotesManager, related_graph_path
+
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        monkeypatch.setenv("NOTES_EXPORT_VECTOR_BACKEND", "local")
+        (tmp_path / "data").mkdir()
+        md_dir = tmp_path / "md" / "nb"
+        md_dir.mkdir(parents=True)
+        notes = {"apples": "apples", "pie": "apples and pears", "pears": "pears", "tax": "tax"}
+        for name, text in notes.items():
+            (md_dir / f"{name}.md").write_text(text)
+        with open(tmp_path / "data" / "nb.json", "w") as f:
+            json.dump({name: {"filename": name, "lastExported": "e1"} for name in notes}, f)
+
+        embed = lambda texts, config: [[float("apples" in t), float("pears" in t),
+                                        float("tax" in t) + 0.01] for t in texts]
+        with patch('qdrant_integration.get_embeddings', side_effect=embed), \
+             patch('qdrant_integration.get_embedding_dimension', return_value=3):
+            mgr = QdrantNotesManager()
+            mgr.sync()
+        with patch('qdrant_integration.get_embeddings',
+                   side_effect=AssertionError("the graph reuses stored vectors")):
+            result = mgr.build_related_graph(k=2)
+        assert result["notes"] == 4
+        assert Path(result["path"]) == related_graph_path(mgr.config)
+
+        capsys.readouterr()
+        monkeypatch.setattr(sys, "argv", ["query_notes.py", "--related", "apples", "-n", "1"])
+        query_notes.main()
+        assert capsys.readouterr().out.splitlines() == [
+            "1. \033[1mnb/pie\033[0m  [70.7% similar]"]
+        monkeypatch.setattr(sys, "argv", ["query_notes.py", "--related", "nothing"])
+        with pytest.raises(SystemExit):
+            query_notes.main()
@@ -0,0 +1,39 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sync_manifest import SyncManifest
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestSyncManifest:
+    def test_records_and_reads_chunks(self, tmp_path):
+        m = SyncManifest(tmp_path / "manifest.sqlite", "notes")
+        assert m.is_empty()
+        m.set_chunks("nb", "1", [(0, 100, "h0"), (1, 101, "h1")])
+        m.commit()
+        assert not m.is_empty()
+        assert m.note_chunks("nb", "1") == {0: (100, "h0"), 1: (101, "h1")}
+        assert m.notes() == {("nb", "1")}
+        assert m.point_ids() == {100, 101}
+
+    def test_collections_are_separate(self, tmp_path):
+        a = SyncManifest(tmp_path / "manifest.sqlite", "a")
+        a.set_chunks("nb", "1", [(0, 100, "h")])
+        a.commit()
+        b = SyncManifest(tmp_path / "manifest.sqlite", "b")
+        assert b.is_empty()
+        b.clear()
+        assert not a.is_empty()
+
+    def test_remove_chunks_and_note(self, tmp_path):
+        m = SyncManifest(tmp_path / "manifest.sqlite", "notes")
+        m.set_chunks("nb", "1", [(0, 100, "h0"), (1, 101, "h1"), (2, 102, "h2")])
+        m.remove_chunks("nb", "1", [2])
+        assert set(m.note_chunks("nb", "1")) == {0, 1}
+        assert sorted(m.remove_note("nb", "1")) == [100, 101]
+        assert m.is_empty()
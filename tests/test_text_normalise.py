@@ -0,0 +1,53 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from text_normalise import LONG_URL_CHARS, normalise_text
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestNormaliseText:
+    def test_strips_html(self):
+        source = ("<html><head><style>p {color: red}</style></head>"
+                  "<body><p>Fish &amp; chips</p><div>on <b>Friday</b></div></body></html>")
+        assert normalise_text(source).text.strip() == "Fish & chips\n\non Friday"
+
+    def test_markdown_links_and_images_keep_their_text(self):
+        source = "See [the plan](https://example.com/plan) ![diagram](attachments/d.png)"
+        assert normalise_text(source).text == "See the plan diagram"
+
+    def test_data_uris_removed(self):
+        source = "Before <img src=\"data:image/png;base64,iVBORw0KGgoAAAANSUhEUg==\"> after"
+        assert normalise_text(source).text == "Before after"
+
+    def test_long_urls_reduced_to_host(self):
+        long_url = "https://tracker.example.net/click?id=" + "x" * LONG_URL_CHARS
+        short_url = "https://example.com/a"
+        assert normalise_text(f"{long_url} and {short_url}").text == \
+            f"tracker.example.net and {short_url}"
+
+    def test_tables_and_whitespace(self):
+        source = "| Item | Qty |\n|------|----:|\n| Pears  |  3 |\n\n\n\nTotal:   3  \n"
+        assert normalise_text(source).text == " Item Qty\nPears 3\n\nTotal: 3\n"
+
+    def test_plain_text_unchanged(self):
+        source = "Just a note.\n\nWith two paragraphs."
+        normalised = normalise_text(source)
+        assert normalised.text == source
+        assert normalised.source_offset(10) == 10
+
+    def test_offsets_map_back_to_source(self):
+        source = ("<p>Meet <i>Alice</i> at the caf&eacute; [on the corner](https://maps."
+                  "example.com/q?x=" + "y" * 60 + ")</p>\n\n\n<p>Bring   the   notes</p>")
+        normalised = normalise_text(source)
+        for word in ["Alice", "on the corner", "notes"]:
+            start = normalised.text.index(word)
+            src_start, src_end = normalised.source_span(start, start + len(word))
+            assert source[src_start:src_end] == word
+        # A decoded entity maps onto the entity it came from
+        start = normalised.text.index("é")
+        assert source[slice(*normalised.source_span(start, start + 1))].startswith("&")
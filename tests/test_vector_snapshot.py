@@ -0,0 +1,173 @@
+import gzip
+import json
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from vector_snapshot import SnapshotWriter, read_snapshot, validate_snapshot
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestSnapshotFile:
+    def test_round_trip(self, tmp_path):
+        path = tmp_path / "snap.jsonl.gz"
+        with SnapshotWriter(path, {"collection": "notes", "dimension": 2}) as writer:
+            writer.point({"id": 7, "vector": [0.5, -1.0], "payload": {"note_id": "a"}})
+            writer.manifest("nb", "a", [(0, 7, "hash")])
+            writer.stamps("nb", {"a": {"lastIndexedToQdrant": "e1"}})
+        assert not (tmp_path / "snap.jsonl.gz.tmp").exists()
+
+        header, records = read_snapshot(path)
+        assert header["collection"] == "notes" and header["dimension"] == 2
+        records = list(records)
+        assert [r["kind"] for r in records] == ["point", "manifest", "stamps", "end"]
+        assert records[0]["vector"] == [0.5, -1.0]
+        assert records[1]["chunks"] == [[0, 7, "hash"]]
+        assert records[-1] == {"kind": "end", "points": 1, "notes": 1, "notebooks": 1}
+
+    def test_failed_write_leaves_no_file(self, tmp_path):
+        path = tmp_path / "snap.jsonl.gz"
+        with pytest.raises(RuntimeError):
+            with SnapshotWriter(path, {}) as writer:
+                writer.point({"id": 1, "vector": [1.0]})
+                raise RuntimeError("scroll failed")
+        assert list(tmp_path.iterdir()) == []
+
+    def test_truncated_and_foreign_files_rejected(self, tmp_path):
+        path = tmp_path / "snap.jsonl.gz"
+        with SnapshotWriter(path, {}) as writer:
+            writer.point({"id": 1, "vector": [1.0]})
+        lines = gzip.open(path, "rt").read().splitlines()
+        with gzip.open(tmp_path / "cut.gz", "wt") as f:
+            f.write("\n".join(lines[:-1]) + "\n")
+        _, records = read_snapshot(tmp_path / "cut.gz")
+        with pytest.raises(ValueError, match="truncated"):
+            list(records)
+
+        with pytest.raises(ValueError, match="truncated"):
+            validate_snapshot(tmp_path / "cut.gz")
+        # Cut mid-stream, as by an interrupted copy
+        (tmp_path / "partial.gz").write_bytes(path.read_bytes()[:-12])
+        with pytest.raises(ValueError, match="truncated"):
+            validate_snapshot(tmp_path / "partial.gz")
+
+        (tmp_path / "other.json").write_text("{}")
+        with pytest.raises(ValueError, match="not a notes snapshot"):
+            read_snapshot(tmp_path / "other.json")
+
+    def test_validate_checks_counts_and_dimension(self, tmp_path):
+        path = tmp_path / "snap.jsonl.gz"
+        with SnapshotWriter(path, {"dimension": 2}) as writer:
+            writer.point({"id": 1, "vector": [1.0, 0.0]})
+            writer.point({"id": 2, "vector": [0.0, 1.0]})
+        assert validate_snapshot(path)["dimension"] == 2
+
+        lines = gzip.open(path, "rt").read().splitlines()
+        with gzip.open(tmp_path / "dropped.gz", "wt") as f:
+            f.write("\n".join(lines[:1] + lines[2:]) + "\n")
+        with pytest.raises(ValueError, match="incomplete"):
+            validate_snapshot(tmp_path / "dropped.gz")
+
+        with SnapshotWriter(tmp_path / "wide.gz", {"dimension": 3}) as writer:
+            writer.point({"id": 1, "vector": [1.0, 0.0]})
+        with pytest.raises(ValueError, match="2-dimensional"):
+            validate_snapshot(tmp_path / "wide.gz")
+
+
+def _export(root, notes):
+    (root / "data").mkdir(parents=True, exist_ok=True)
+    (root / "md" / "nb").mkdir(parents=True, exist_ok=True)
+    tracking = {}
+    for note_id, (text, exported) in notes.items():
+        (root / "md" / "nb" / f"{note_id}.md").write_text(text)
+        tracking[note_id] = {"filename": note_id, "lastExported": exported}
+    with open(root / "data" / "nb.json", "w") as f:
+        json.dump(tracking, f)
+
+
+def _embed(texts, config):
+    return [[float("apples" in t), float("pears" in t), 0.1] for t in texts]
+
+
+@pytest.mark.unit
+@pytest.mark.qdrant
+class TestSnapshotRestore:
+    @pytest.fixture(autouse=True)
+    def _local_backend(self, monkeypatch):
+        pytest.importorskip("numpy")
+        monkeypatch.setenv("NOTES_EXPORT_VECTOR_BACKEND", "local")
+        monkeypatch.setenv("NOTES_EXPORT_QUERY_CACHE", "false")
+        monkeypatch.setenv("NOTES_EXPORT_EMBEDDING_CACHE", "false")
+
+    def test_restore_rebuilds_without_embedding(self, tmp_path, monkeypatch):
+        from qdrant_integration import QdrantNotesManager
+
+        old, new = tmp_path / "old", tmp_path / "new"
+        _export(old, {"a": ("apples", "e1"), "b": ("pears", "e1"), "c": ("plums", "e1")})
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(old))
+        with patch('qdrant_integration.get_embeddings', side_effect=_embed), \
+             patch('qdrant_integration.get_embedding_dimension', return_value=3):
+            QdrantNotesManager().sync()
+            counts = QdrantNotesManager().create_snapshot(tmp_path / "notes.jsonl.gz")
+        assert counts == {"points": 3, "notes": 3, "notebooks": 1}
+
+        # The new machine has the same export, except that note c changed since
+        _export(new, {"a": ("apples", "e1"), "b": ("pears", "e1"), "c": ("plums!", "e2")})
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(new))
+        with patch('qdrant_integration.get_embeddings',
+                   side_effect=AssertionError("restore must not embed")), \
+             patch('qdrant_integration.get_embedding_dimension',
+                   side_effect=AssertionError("restore must not probe")):
+            restored = QdrantNotesManager().restore_snapshot(tmp_path / "notes.jsonl.gz")
+        assert restored == {"points": 3, "notes": 3, "stamped": 2, "unstamped": 1}
+        tracking = json.load(open(new / "data" / "nb.json"))
+        assert tracking["a"]["lastIndexedToQdrant"] == "e1"
+        assert tracking["a"]["qdrantChunkCount"] == 1
+        assert "lastIndexedToQdrant" not in tracking["c"]
+
+        embedded = []
+        with patch('qdrant_integration.get_embeddings',
+                   side_effect=lambda texts, config: embedded.extend(texts) or _embed(texts, config)):
+            mgr = QdrantNotesManager()
+            stats = mgr.sync()
+            assert mgr.search("pears", limit=1)[0]["note_id"] == "b"
+        # Only the note that changed since the snapshot is embedded
+        assert len(embedded) == 2  # The changed chunk and the search query
+        assert stats["upserted"] == 1 and stats["unchanged"] == 2
+
+    def test_restore_refuses_other_model(self, tmp_path, monkeypatch):
+        from qdrant_integration import EmbeddingModelMismatch, QdrantNotesManager
+
+        _export(tmp_path, {"a": ("apples", "e1")})
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        with SnapshotWriter(tmp_path / "s.jsonl.gz", {
+                "collection": "apple_notes", "embedding_provider": "ollama",
+                "embedding_model": "some-other-model", "dimension": 3}):
+            pass
+        with pytest.raises(EmbeddingModelMismatch, match="some-other-model"):
+            QdrantNotesManager().restore_snapshot(tmp_path / "s.jsonl.gz")
+
+    def test_truncated_snapshot_leaves_collection_intact(self, tmp_path, monkeypatch):
+        from qdrant_integration import QdrantNotesManager
+
+        _export(tmp_path, {"a": ("apples", "e1"), "b": ("pears", "e1")})
+        monkeypatch.setenv("NOTES_EXPORT_ROOT_DIR", str(tmp_path))
+        with patch('qdrant_integration.get_embeddings', side_effect=_embed), \
+             patch('qdrant_integration.get_embedding_dimension', return_value=3):
+            QdrantNotesManager().sync()
+            QdrantNotesManager().create_snapshot(tmp_path / "notes.jsonl.gz")
+        data = (tmp_path / "notes.jsonl.gz").read_bytes()
+        (tmp_path / "cut.jsonl.gz").write_bytes(data[:len(data) // 2])
+        tracking_before = (tmp_path / "data" / "nb.json").read_text()
+
+        mgr = QdrantNotesManager()
+        with pytest.raises(ValueError, match="truncated"):
+            mgr.restore_snapshot(tmp_path / "cut.jsonl.gz")
+        assert mgr.client.count(mgr.collection) == 2
+        assert len(mgr._get_manifest().notes()) == 2
+        assert (tmp_path / "data" / "nb.json").read_text() == tracking_before
@@ -0,0 +1,127 @@
+"""Strip markup from note text before it is chunked and embedded.
+
+Exported notes carry HTML tags (the html/ fallback), markdown link and
+image syntax, embedded data URIs, long tracking URLs and table pipes. None
+of it helps semantic search, but all of it costs embedding tokens. The
+normaliser removes it in a few regex passes and keeps a compact map from
+positions in the normalised text back to positions in the source, so a
+chunk can still be located in the original file.
+"""
+
+import html
+import re
+from bisect import bisect_right
+from typing import Callable, List, Match, Pattern, Tuple
+
+
+LONG_URL_CHARS = 40  # URLs longer than this are reduced to their host
+
+# One segment per copied or replaced span: (normalised start, source start, source end)
+Segments = List[Tuple[int, int, int]]
+
+_BLOCK_TAGS = r"br|p|div|li|tr|h[1-6]|ul|ol|table|blockquote|pre"
+
+_MARKUP = re.compile(
+    r"(?P<script><(script|style)\b.*?</\2\s*>)"
+    r"|(?P<block></?(?:" + _BLOCK_TAGS + r")\b[^>]*>)"
+    r"|(?P<tag></?[a-zA-Z][^>]*>|<!--.*?-->)"
+    r"|(?P<image>!\[(?P<alt>[^\]]*)\]\([^)]*\))"
+    r"|(?P<link>\[(?P<label>[^\]]+)\]\([^)]*\))"
+    r"|(?P<data>data:[\w/+.-]+;base64,[A-Za-z0-9+/=]+)"
+    r"|(?P<url>https?://(?P<host>[^/\s)\]>\"']+)[^\s)\]>\"']*)"
+    r"|(?P<entity>&(?:#\d+|#x[0-9a-fA-F]+|[a-zA-Z]+);)"
+    r"|(?P<rule>^[ \t]*\|?(?:[ \t]*:?-{3,}:?[ \t]*\|)+[ \t]*(?::?-{3,}:?[ \t]*)?(?:\n|$))"
+    r"|(?P<pipe>[ \t]*\|[ \t]*)",
+    re.DOTALL | re.MULTILINE | re.IGNORECASE,
+)
+
+_SPACE = r"[ \t\r\f\v\u00a0]"
+_WHITESPACE = re.compile(
+    rf"(?P<blank>{_SPACE}*\n(?:{_SPACE}*\n)+{_SPACE}*)"   # Blank lines: keep one
+    rf"|(?P<newline>{_SPACE}*\n{_SPACE}*)"                 # Line edges: trim
+    rf"|(?P<run>{_SPACE}+)"                                # Runs inside a line
+)
+
+
+def _markup_replacement(m: Match) -> Tuple[str, int]:
+    kind = m.lastgroup
+    if kind in ("script", "tag", "data", "rule"):
+        return "", m.start()
+    if kind == "block":
+        return "\n", m.start()
+    if kind == "image":
+        return m.group("alt"), m.start("alt")
+    if kind == "link":
+        return m.group("label"), m.start("label")
+    if kind == "url":
+        if len(m.group(0)) <= LONG_URL_CHARS:
+            return m.group(0), m.start()
+        return m.group("host"), m.start("host")
+    if kind == "entity":
+        return html.unescape(m.group(0)), m.start()
+    # Table cell separator
+    return " ", m.start()
+
+
+def _whitespace_replacement(m: Match) -> Tuple[str, int]:
+    return {"blank": "\n\n", "newline": "\n", "run": " "}[m.lastgroup], m.start()
+
+
+def _substitute(text: str, pattern: Pattern,
+                replace: Callable[[Match], Tuple[str, int]]) -> Tuple[str, Segments]:
+    """re.sub that also records where each piece of the output came from.
+
+    `replace` returns the replacement and the source position it maps to,
+    so text kept from inside a match (a link label, say) maps exactly.
+    """
+    parts, segments, out, last = [], [], 0, 0
+    for m in pattern.finditer(text):
+        start, end = m.span()
+        if start > last:
+            parts.append(text[last:start])
+            segments.append((out, last, start))
+            out += start - last
+        replacement, origin = replace(m)
+        parts.append(replacement)
+        segments.append((out, origin, end))
+        out += len(replacement)
+        last = end
+    if last < len(text) or not segments:
+        parts.append(text[last:])
+        segments.append((out, last, len(text)))
+    return "".join(parts), segments
+
+
+class NormalisedText:
+    """Markup-free text plus the map back to the source it came from."""
+
+    def __init__(self, source: str):
+        self.source = source
+        text, markup = _substitute(source, _MARKUP, _markup_replacement)
+        text, spacing = _substitute(text, _WHITESPACE, _whitespace_replacement)
+        self.text = text
+        self._passes = [markup, spacing]
+
+    def source_offset(self, offset: int) -> int:
+        """Position in the source of the character at `offset` in the normalised text.
+
+        Offsets inside a replacement map into the replaced span, clamped to
+        its end; offsets in copied text map exactly.
+        """
+        for segments in reversed(self._passes):
+            i = bisect_right(segments, (offset, float("inf"), 0)) - 1
+            out_start, src_start, src_end = segments[max(i, 0)]
+            offset = min(src_start + max(offset - out_start, 0), src_end)
+        return offset
+
+    def source_span(self, start: int, end: int) -> Tuple[int, int]:
+        """Source span covering the normalised text[start:end]."""
+        return self.source_offset(start), self.source_offset(max(end - 1, start)) + 1
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+
+def normalise_text(source: str) -> NormalisedText:
+    """Strip tags, data URIs, link/image syntax, long URLs, table pipes and extra whitespace."""
+    return NormalisedText(source)
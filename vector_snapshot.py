@@ -0,0 +1,156 @@
+"""Portable snapshots of a notes vector collection.
+
+A snapshot is a single gzip-compressed JSON Lines file: a header naming the
+collection, embedding model and vector size, then every point (with its
+vector as base64-encoded float32), the sync manifest of each note and each
+notebook's tracking stamps, and finally an end record with the counts.
+Restoring one rebuilds the collection, the manifest and the stamps without
+calling the embedding provider, on any backend (Qdrant or the local index).
+
+Records are written and read one at a time, so neither side holds the
+vectors in memory. A restore reads the file twice: validate_snapshot()
+checks it end to end before anything is replaced.
+"""
+
+import base64
+import gzip
+import json
+import os
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from embedding_cache import pack_vector, unpack_vector
+
+
+SNAPSHOT_FORMAT = "notes-exporter-snapshot"
+SNAPSHOT_VERSION = 1
+
+
+def encode_vector(vector: Sequence[float]) -> str:
+    return base64.b64encode(pack_vector(vector)).decode("ascii")
+
+
+def decode_vector(data: str) -> List[float]:
+    return unpack_vector(base64.b64decode(data))
+
+
+class SnapshotWriter:
+    """Write a snapshot file record by record.
+
+    The file is written under a temporary name and only moved into place by
+    close(), so an interrupted snapshot never leaves a truncated file behind.
+    """
+
+    def __init__(self, path: Path, header: Dict[str, Any]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self._file = gzip.open(self._tmp_path, "wt", encoding="utf-8")
+        self.counts = {"points": 0, "notes": 0, "notebooks": 0}
+        self._write({"kind": "header", "format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION,
+                     "created": datetime.now().isoformat(timespec="seconds"), **header})
+
+    def _write(self, record: Dict):
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def point(self, point: Dict):
+        self._write({"kind": "point", "id": point["id"],
+                     "vector": encode_vector(point["vector"]),
+                     "payload": point.get("payload", {})})
+        self.counts["points"] += 1
+
+    def manifest(self, notebook: str, note_id: str, chunks: List[Tuple[int, int, str]]):
+        """Manifest rows of one note: (chunk_index, point_id, text_hash)."""
+        self._write({"kind": "manifest", "notebook": notebook, "note_id": note_id,
+                     "chunks": [list(c) for c in chunks]})
+        self.counts["notes"] += 1
+
+    def stamps(self, notebook: str, stamps: Dict[str, Dict]):
+        """Tracking stamps of one notebook: {note_id: {lastIndexedToQdrant, ...}}."""
+        self._write({"kind": "stamps", "notebook": notebook, "notes": stamps})
+        self.counts["notebooks"] += 1
+
+    def close(self):
+        self._write({"kind": "end", **self.counts})
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def read_snapshot(path: Path) -> Tuple[Dict[str, Any], Iterator[Dict]]:
+    """Open a snapshot; return its header and an iterator over the remaining records.
+
+    Point vectors are decoded. The iterator raises ValueError if the file
+    ends before its end record or cannot be decoded.
+    """
+    f = gzip.open(path, "rt", encoding="utf-8")
+    try:
+        header = json.loads(f.readline() or "{}")
+    except (OSError, EOFError, ValueError):  # Not gzip, or not JSON
+        header = {}
+    if header.get("format") != SNAPSHOT_FORMAT:
+        f.close()
+        raise ValueError(f"{path} is not a notes snapshot")
+    if header.get("version", 0) > SNAPSHOT_VERSION:
+        f.close()
+        raise ValueError(f"{path} is snapshot version {header['version']}; "
+                         f"this version reads up to {SNAPSHOT_VERSION}")
+
+    def records() -> Iterator[Dict]:
+        with f:
+            try:
+                for line in f:
+                    record = json.loads(line)
+                    if record["kind"] == "point":
+                        record["vector"] = decode_vector(record["vector"])
+                    yield record
+                    if record["kind"] == "end":
+                        return
+            except (EOFError, OSError, zlib.error, ValueError, KeyError, TypeError):
+                pass
+        raise ValueError(f"{path} is truncated or corrupt (no end record)")
+
+    return header, records()
+
+
+def validate_snapshot(path: Path) -> Dict[str, Any]:
+    """Read a whole snapshot and check it is complete; return its header.
+
+    Raises ValueError if the file is not a snapshot, is truncated or
+    corrupt, has counts that disagree with its end record, or holds a
+    vector whose size is not the header's dimension.
+    """
+    header, records = read_snapshot(path)
+    dim = header.get("dimension")
+    if not isinstance(dim, int) or dim <= 0:
+        raise ValueError(f"{path} has no vector dimension in its header")
+    counts = {"points": 0, "notes": 0, "notebooks": 0}
+    kinds = {"point": "points", "manifest": "notes", "stamps": "notebooks"}
+    for record in records:
+        if record["kind"] == "end":
+            listed = {k: record.get(k) for k in counts}
+            if listed != counts:
+                raise ValueError(f"{path} is incomplete: its end record lists {listed}, "
+                                 f"found {counts}")
+            return header
+        if record["kind"] not in kinds:
+            raise ValueError(f"{path} has an unknown record kind {record['kind']!r}")
+        if record["kind"] == "point" and len(record["vector"]) != dim:
+            raise ValueError(f"{path} has a {len(record['vector'])}-dimensional vector "
+                             f"(point {record.get('id')}); the header says {dim}")
+        counts[kinds[record["kind"]]] += 1
+    raise ValueError(f"{path} is truncated or corrupt (no end record)")  # pragma: no cover